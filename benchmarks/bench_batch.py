@@ -0,0 +1,117 @@
+"""Пакетный разбор на NumPy против ElehantData по одному пакету.
+
+Поток содержит испорченные пакеты, чужие адреса и несовпадения типа,
+результаты пакетного разбора сверяются со скалярным по каждому пакету.
+Разбор файла записи замеряется на том же потоке.
+
+    python benchmarks/bench_batch.py --packets 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import os
+import random
+import tempfile
+import time
+
+from bench_pipeline import FakeAdvertisement, FakeDevice, build_fleet, build_payload, load_component
+
+FIELDS = ("packet_ver", "mtype", "model", "serial", "count", "battery", "temperature", "fw")
+
+
+def build_archive(const, fleet_size: int, packets: int, bad_ratio: float, rng: random.Random):
+    """Адреса и данные производителя, bad_ratio - доля испорченных пакетов."""
+
+    fleet = build_fleet(const, fleet_size, rng)
+    addresses, payloads = [], []
+    for _ in range(packets):
+        meter = fleet[rng.randrange(len(fleet))]
+        address = meter.address
+        payload = build_payload(
+            meter.mtype, meter.model, meter.num, rng.randrange(2**32), rng.randrange(3000), rng.randrange(256)
+        )
+        if rng.random() < bad_ratio:
+            kind = rng.randrange(4)
+            if kind == 0:
+                payload = payload[: rng.randrange(17)]
+            elif kind == 1:
+                payload = payload[:3] + bytes((rng.randrange(2, 256),)) + payload[4:]
+            elif kind == 2:
+                payload = payload[:4] + bytes((payload[4] % 4 + 1,)) + payload[5:]
+            else:
+                address = "B1" + address[2:]
+        addresses.append(address)
+        payloads.append(payload)
+    return addresses, payloads
+
+
+def scalar_fields(data) -> tuple:
+    return (data.packet_ver, data.mtype, data.model, data.serial, data.count, data.battery, data.raw_temperature, data.fw)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleet", type=int, default=1000, help="размер парка")
+    parser.add_argument("--packets", type=int, default=1000000, help="пакетов в архиве")
+    parser.add_argument("--bad-ratio", type=float, default=0.05, help="доля испорченных пакетов")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    package, _ = load_component()
+    const = importlib.import_module(f"{package}.const")
+    capture = importlib.import_module(f"{package}.capture")
+    batch = importlib.import_module(f"{package}.batch")
+
+    addresses, payloads = build_archive(const, args.fleet, args.packets, args.bad_ratio, random.Random(args.seed))
+    devices = {address: FakeDevice(address) for address in addresses}
+    advertisements = [FakeAdvertisement({const.MANUFACTURER_ID: payload}, -70) for payload in payloads]
+
+    start = time.perf_counter()
+    scalar = [
+        const.ElehantData(devices[address], advertisement)
+        for address, advertisement in zip(addresses, advertisements)
+    ]
+    scalar_time = time.perf_counter() - start
+
+    # Импорт numpy не входит в замер
+    batch.decode_batch(addresses[:1000], payloads[:1000])
+
+    start = time.perf_counter()
+    readings = batch.decode_batch(addresses, payloads)
+    batch_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "archive.bin")
+        writer = capture.CaptureWriter(path, 1 << 40, 0)
+        for address, payload in zip(addresses, payloads):
+            writer.append(0.0, address, -70, "bench", payload)
+        writer.write(writer.take())
+        writer.close()
+
+        start = time.perf_counter()
+        _, _, _, captured = batch.decode_capture(path)
+        capture_time = time.perf_counter() - start
+
+    # Сверка со скалярным разбором
+    for name, result in (("decode_batch", readings), ("decode_capture", captured)):
+        reasons = result.reasons()
+        columns = [getattr(result, field).tolist() for field in FIELDS]
+        errors = 0
+        for index, data in enumerate(scalar):
+            if data.reject != reasons[index]:
+                errors += 1
+            elif data.reject is None and scalar_fields(data) != tuple(column[index] for column in columns):
+                errors += 1
+        print(f"{name}: расхождений со скалярным разбором {errors}")
+
+    per_packet = args.packets / 1e9
+    print()
+    print(f"ElehantData:    {scalar_time / per_packet:8.1f} нс/пакет")
+    print(f"decode_batch:   {batch_time / per_packet:8.1f} нс/пакет, x{scalar_time / batch_time:.0f}")
+    print(f"decode_capture: {capture_time / per_packet:8.1f} нс/пакет, x{scalar_time / capture_time:.0f}")
+    print(f"действительных: {int(readings.valid.sum())} из {args.packets}")
+
+
+if __name__ == "__main__":
+    main()
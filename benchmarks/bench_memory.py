@@ -0,0 +1,146 @@
+"""Память состояния интеграции на счетчик для парка в 1 000 и 10 000 счетчиков.
+
+Каждая часть состояния строится для всего парка отдельно, объем считается
+tracemalloc по блокам, оставшимся после сборки мусора. BLEDevice и
+объявление создаются заново для каждого пакета, как в bleak, поэтому
+удержанные ими блоки тоже попадают в замер. Кэш пакетов и обновления
+сенсоров замеряются при установленном Home Assistant.
+
+    python benchmarks/bench_memory.py --fleet 1000,10000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import importlib
+import random
+import tracemalloc
+
+from bench_pipeline import (
+    FakeAdvertisement,
+    FakeDevice,
+    FakeServiceInfo,
+    build_fleet,
+    build_payload,
+    load_component,
+)
+
+
+def retained(build) -> int:
+    """Байт, удерживаемых результатом build()."""
+
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleet", default="1000,10000", help="размеры парка через запятую")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    package, has_ha = load_component()
+    if not has_ha:
+        print("Home Assistant не установлен: кэш и обновления сенсоров пропущены\n")
+
+    const = importlib.import_module(f"{package}.const")
+    buffers = importlib.import_module(f"{package}.buffers")
+    estimators = importlib.import_module(f"{package}.estimators")
+    dedup_module = importlib.import_module(f"{package}.dedup")
+    ElehantData = const.ElehantData
+
+    print(f"{'fleet':>6} {'state':<18} {'total KiB':>11} {'B/meter':>9}")
+    print("-" * 47)
+
+    for size in (int(value) for value in args.fleet.split(",")):
+        rng = random.Random(args.seed)
+        fleet = build_fleet(const, size, rng)
+
+        def service_info(meter, count: int) -> FakeServiceInfo:
+            payload = build_payload(meter.mtype, meter.model, meter.num, count, meter.temp)
+            return FakeServiceInfo(
+                FakeDevice(meter.address), FakeAdvertisement({const.MANUFACTURER_ID: payload}, -70), "proxy"
+            )
+
+        def readings() -> dict:
+            result = {}
+            for meter in fleet:
+                info = service_info(meter, meter.count)
+                result[meter.address] = ElehantData(info.device, info.advertisement).seen(info.rssi, info.time)
+            return result
+
+        def packets() -> dict:
+            result = {}
+            for meter in fleet:
+                ring = result[meter.address] = buffers.PacketRing(const.DIAGNOSTICS_PACKETS)
+                for step in range(const.DIAGNOSTICS_PACKETS):
+                    info = service_info(meter, meter.count + step)
+                    ring.append(info.time, info.rssi, info.source, info.manufacturer_data[const.MANUFACTURER_ID])
+            return result
+
+        def history(readings: int) -> dict:
+            result = {}
+            for meter in fleet:
+                ring = result[meter.address] = buffers.ReadingHistory(const.HISTORY_SIZE)
+                for step in range(readings):
+                    ring.append(step, meter.count + step, meter.temp)
+            return result
+
+        def flows() -> dict:
+            result = {}
+            for meter in fleet:
+                flow = result[meter.address] = estimators.FlowEstimator()
+                for step in range(const.FLOW_BUCKETS * 2):
+                    flow.update(meter.count + step, step * const.FLOW_WINDOW / const.FLOW_BUCKETS)
+            return result
+
+        def dedup() -> object:
+            result = dedup_module.Deduplicator()
+            for meter in fleet:
+                payload = build_payload(meter.mtype, meter.model, meter.num, meter.count, meter.temp)
+                for source in ("proxy-1", "proxy-2"):
+                    result.accept(meter.address, payload, source, -70, 0.0)
+            return result
+
+        states = [
+            ("ElehantData", readings),
+            ("PacketRing", packets),
+            ("ReadingHistory 1", lambda: history(1)),
+            ("ReadingHistory max", lambda: history(const.HISTORY_SIZE)),
+            ("FlowEstimator", flows),
+            ("Deduplicator", dedup),
+        ]
+
+        if has_ha:
+            cache_module = importlib.import_module(f"{package}.cache")
+            sensor = importlib.import_module(f"{package}.sensor")
+
+            def cache() -> object:
+                result = cache_module.AdvertisementCache(lambda info: ElehantData(info.device, info.advertisement))
+                for meter in fleet:
+                    result.async_get(service_info(meter, meter.count))
+                return result
+
+            def updates() -> object:
+                result = sensor.ElehantSensorUpdater()
+                for meter in fleet:
+                    info = service_info(meter, meter.count)
+                    result(ElehantData(info.device, info.advertisement))
+                return result
+
+            states += [("AdvertisementCache", cache), ("SensorUpdater", updates)]
+
+        for name, build in states:
+            used = retained(build)
+            print(f"{size:>6} {name:<18} {used / 1024:>11.1f} {used / size:>9.0f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
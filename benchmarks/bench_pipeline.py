@@ -0,0 +1,258 @@
+"""Замер конвейера декодирования Элехант на синтетическом парке счетчиков.
+
+Работает без Bluetooth: объявления формируются заглушками BLEDevice и
+AdvertisementData. Этапы parse_mac и ElehantData замеряются всегда, этап
+построения обновлений сенсоров - при установленном Home Assistant.
+
+    python benchmarks/bench_pipeline.py --fleet 10,1000,10000 --packets 200000
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+import importlib
+from pathlib import Path
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+ROOT = Path(__file__).resolve().parents[1]
+COMPONENT = ROOT / "custom_components" / "elehant_meter"
+
+
+def load_component() -> tuple[str, bool]:
+    """Имя пакета интеграции и признак наличия Home Assistant."""
+
+    try:
+        import homeassistant  # noqa: F401
+    except ImportError:
+        # Без Home Assistant __init__ интеграции не выполняется
+        package = types.ModuleType("elehant_meter")
+        package.__path__ = [str(COMPONENT)]
+        sys.modules["elehant_meter"] = package
+        return "elehant_meter", False
+
+    sys.path.insert(0, str(ROOT))
+    return "custom_components.elehant_meter", True
+
+
+class FakeDevice:
+    """Заглушка BLEDevice."""
+
+    __slots__ = ("address", "name")
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.name = address
+
+
+class FakeAdvertisement:
+    """Заглушка AdvertisementData."""
+
+    __slots__ = ("manufacturer_data", "rssi")
+
+    def __init__(self, manufacturer_data: dict[int, bytes], rssi: int) -> None:
+        self.manufacturer_data = manufacturer_data
+        self.rssi = rssi
+
+
+class FakeServiceInfo:
+    """Заглушка BluetoothServiceInfoBleak с полями, которые читает интеграция."""
+
+    __slots__ = ("device", "advertisement", "address", "rssi", "source", "manufacturer_data", "time")
+
+    def __init__(self, device: FakeDevice, advertisement: FakeAdvertisement, source: str) -> None:
+        self.device = device
+        self.advertisement = advertisement
+        self.address = device.address
+        self.rssi = advertisement.rssi
+        self.source = source
+        self.manufacturer_data = advertisement.manufacturer_data
+        self.time = time.monotonic()
+
+
+def build_payload(mtype: int, model: int, num: int, count: int, temp: int, battery: int = 100, fw: int = 12) -> bytes:
+    """Данные производителя версии 1."""
+
+    return (
+        b"\x80\x00\x00\x01"
+        + bytes((mtype, model))
+        + num.to_bytes(3, "little")
+        + count.to_bytes(4, "little")
+        + bytes((battery,))
+        + temp.to_bytes(2, "little")
+        + bytes((fw,))
+    )
+
+
+@dataclass
+class Meter:
+    mtype: int
+    model: int
+    num: int
+    address: str
+    count: int
+    temp: int
+    device: FakeDevice = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.device = FakeDevice(self.address)
+
+
+def build_fleet(const, size: int, rng: random.Random) -> list[Meter]:
+    """Парк счетчиков по всем поддерживаемым моделям METER."""
+
+    models = [
+        (mtype, model)
+        for key in const.METER
+        for mtype, model in [map(int, key.split("-"))]
+        if const.parse_mac(f"b0:{model:02x}:{mtype:02x}:00:00:00").signValid
+    ]
+    fleet = []
+    for num in range(size):
+        mtype, model = models[num % len(models)]
+        address = f"B0:{model:02X}:{mtype:02X}:{num >> 16 & 0xFF:02X}:{num >> 8 & 0xFF:02X}:{num & 0xFF:02X}"
+        fleet.append(Meter(mtype, model, num, address, rng.randrange(10**8), rng.randrange(500, 3000)))
+    return fleet
+
+
+def build_stream(fleet: list[Meter], packets: int, dup_ratio: float, rng: random.Random) -> list[FakeServiceInfo]:
+    """Поток объявлений, dup_ratio - доля повторов последнего пакета счетчика."""
+
+    last: dict[str, bytes] = {}
+    stream = []
+    for _ in range(packets):
+        meter = fleet[rng.randrange(len(fleet))]
+        payload = last.get(meter.address)
+        if payload is None or rng.random() >= dup_ratio:
+            meter.count += rng.randrange(1, 50)
+            payload = last[meter.address] = build_payload(
+                meter.mtype, meter.model, meter.num, meter.count, meter.temp
+            )
+        stream.append(
+            FakeServiceInfo(
+                meter.device,
+                FakeAdvertisement({0xFFFF: payload}, -rng.randrange(40, 95)),
+                "proxy",
+            )
+        )
+    return stream
+
+
+def percentile(sorted_values: list[int], fraction: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def measure(name: str, func, items: list) -> dict[str, float | str]:
+    """Пакетов в секунду, перцентили задержки и память на пакет для этапа."""
+
+    perf_counter_ns = time.perf_counter_ns
+    latencies = []
+    append = latencies.append
+
+    for item in items[:1000]:
+        func(item)
+
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - start
+
+    for item in items:
+        t0 = perf_counter_ns()
+        func(item)
+        append(perf_counter_ns() - t0)
+    latencies.sort()
+
+    # Память на пакет: пик выделений за вызов и блоки, удерживаемые результатом
+    sample = items[: min(len(items), 2000)]
+    tracemalloc.start()
+    peak_total = 0
+    for item in sample:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func(item)
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - before
+    tracemalloc.stop()
+
+    blocks = sys.getallocatedblocks()
+    kept = [func(item) for item in sample]
+    retained = sys.getallocatedblocks() - blocks - 1
+    del kept
+
+    return {
+        "stage": name,
+        "pps": len(items) / elapsed,
+        "p50": percentile(latencies, 0.50) / 1000,
+        "p95": percentile(latencies, 0.95) / 1000,
+        "p99": percentile(latencies, 0.99) / 1000,
+        "peak_bytes": peak_total / len(sample),
+        "retained_blocks": retained / len(sample),
+    }
+
+
+def run(fleet_size: int, packets: int, dup_ratio: float, seed: int, package: str, has_ha: bool) -> list[dict]:
+    const = importlib.import_module(f"{package}.const")
+    rng = random.Random(seed)
+    fleet = build_fleet(const, fleet_size, rng)
+    stream = build_stream(fleet, packets, dup_ratio, rng)
+    const.parse_mac.cache_clear()
+
+    ElehantData = const.ElehantData
+    parse_mac = const.parse_mac
+    results = [
+        measure("parse_mac", lambda info: parse_mac(info.address), stream),
+        measure("ElehantData", lambda info: ElehantData(info.device, info.advertisement), stream),
+    ]
+
+    if has_ha:
+        cache_module = importlib.import_module(f"{package}.cache")
+        sensor = importlib.import_module(f"{package}.sensor")
+
+        cache = cache_module.AdvertisementCache(
+            lambda info: ElehantData(info.device, info.advertisement)
+        )
+        results.append(measure("cache", cache.async_get, stream))
+
+        advs = [ElehantData(info.device, info.advertisement) for info in stream]
+        results.append(measure("sensor_update (full)", sensor.sensor_update_to_bluetooth_data_update, advs))
+
+        updater = sensor.ElehantSensorUpdater()
+        cached = cache_module.AdvertisementCache(
+            lambda info: ElehantData(info.device, info.advertisement)
+        )
+        results.append(
+            measure("decode+update", lambda info: updater(cached.async_get(info)), stream)
+        )
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleet", default="10,1000,10000", help="размеры парка через запятую")
+    parser.add_argument("--packets", type=int, default=100000, help="объявлений на прогон")
+    parser.add_argument("--dup-ratio", type=float, default=0.9, help="доля повторяющихся пакетов")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    package, has_ha = load_component()
+    if not has_ha:
+        print("Home Assistant не установлен: этапы cache и sensor_update пропущены\n")
+
+    header = f"{'fleet':>6} {'stage':<22} {'pkt/s':>12} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8} {'peak B/pkt':>11} {'kept blk/pkt':>12}"
+    print(header)
+    print("-" * len(header))
+    for size in (int(value) for value in args.fleet.split(",")):
+        for row in run(size, args.packets, args.dup_ratio, args.seed, package, has_ha):
+            print(
+                f"{size:>6} {row['stage']:<22} {row['pps']:>12,.0f} {row['p50']:>8.2f} {row['p95']:>8.2f}"
+                f" {row['p99']:>8.2f} {row['peak_bytes']:>11.1f} {row['retained_blocks']:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Время запуска интеграции: запись на каждый счетчик против одной записи парка.
+
+Для каждого размера парка создается чистая папка конфигурации с записями
+конфигурации и снимками показаний всех счетчиков, поэтому сенсоры создаются
+при запуске, без объявлений. Замеряется установка интеграции со всеми ее
+записями до создания всех сенсоров при повторном запуске, когда сущности
+уже есть в реестрах. Интеграция загружается из custom_components репозитория,
+Bluetooth запускается без адаптеров. Нужен установленный Home Assistant.
+
+    python benchmarks/bench_startup.py --fleet 10,100,500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from bench_pipeline import build_fleet, build_payload, load_component
+
+MODES = ("entries", "fleet")
+
+
+def write_storage(config_dir: str, name: str, data: dict, version: int = 1) -> None:
+    os.makedirs(os.path.join(config_dir, ".storage"), exist_ok=True)
+    with open(os.path.join(config_dir, ".storage", name), "w", encoding="utf-8") as file:
+        json.dump({"version": version, "minor_version": 1, "key": name, "data": data}, file)
+
+
+def build_config(const, config_dir: str, fleet, mode: str) -> None:
+    """Записи конфигурации и снимки показаний парка."""
+
+    def entry(title: str, unique_id: str, data: dict, options: dict) -> dict:
+        return {
+            "entry_id": uuid.uuid4().hex,
+            "version": 1,
+            "minor_version": 1,
+            "domain": const.DOMAIN,
+            "title": title,
+            "data": data,
+            "options": options,
+            "pref_disable_new_entities": False,
+            "pref_disable_polling": False,
+            "source": "user",
+            "unique_id": unique_id,
+            "disabled_by": None,
+        }
+
+    addresses = [meter.address for meter in fleet]
+    if mode == "fleet":
+        entries = [
+            entry(
+                "fleet",
+                const.FLEET_UNIQUE_ID,
+                {const.CONF_FLEET: True},
+                {"address": addresses, const.CONF_AUTO_ADOPT: False},
+            )
+        ]
+    else:
+        entries = [entry(address, address, {}, {}) for address in addresses]
+    write_storage(config_dir, "core.config_entries", {"entries": entries})
+
+    now = time.time()
+    write_storage(
+        config_dir,
+        f"{const.DOMAIN}.snapshot",
+        {
+            meter.address: [
+                build_payload(meter.mtype, meter.model, meter.num, meter.count, meter.temp).hex(),
+                now,
+                -70,
+            ]
+            for meter in fleet
+        },
+    )
+
+
+async def measure(const, fleet, mode: str, repeat: int = 1) -> tuple[float, int]:
+    """Секунды установки интеграции и число созданных сенсоров."""
+
+    from homeassistant import bootstrap, config_entries, core, loader
+    from homeassistant.setup import async_setup_component
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        build_config(const, config_dir, fleet, mode)
+        # Первый запуск создает сущности и устройства в реестрах, замеряются
+        # повторные запуски с заполненными реестрами
+        best = float("inf")
+        for _ in range(repeat + 1):
+            hass = core.HomeAssistant(config_dir)
+            hass.config.skip_pip = True
+            hass.config_entries = config_entries.ConfigEntries(hass, {})
+            loader.async_setup(hass)
+            await bootstrap.async_load_base_functionality(hass)
+            # Зависимости bluetooth для веб-интерфейса и USB не нужны
+            hass.config.components.update({"http", "websocket_api", "usb"})
+            await hass.async_start()
+            await async_setup_component(hass, "bluetooth", {})
+            await hass.async_block_till_done()
+
+            start = time.perf_counter()
+            await async_setup_component(hass, const.DOMAIN, {})
+            await hass.async_block_till_done()
+            best = min(best, time.perf_counter() - start)
+
+            sensors = len(hass.states.async_entity_ids("sensor"))
+            await hass.async_stop()
+    return best, sensors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleet", default="10,100,500", help="размеры парка через запятую")
+    parser.add_argument("--repeat", type=int, default=3, help="повторных запусков, выводится лучший")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    package, has_ha = load_component()
+    if not has_ha:
+        sys.exit("Для замера запуска нужен Home Assistant")
+    logging.basicConfig(level=logging.CRITICAL)
+
+    const = importlib.import_module(f"{package}.const")
+
+    # Все замеры идут в одном цикле событий, как в одном запуске Home Assistant
+    asyncio.run(run(const, args))
+
+
+async def run(const, args: argparse.Namespace) -> None:
+    # Импорт модулей Home Assistant и интеграции не входит в замер
+    await measure(const, build_fleet(const, 1, random.Random(args.seed)), "fleet")
+
+    print(f"{'fleet':>6} {'mode':<8} {'setup, ms':>10} {'ms/meter':>9} {'sensors':>8}")
+    print("-" * 45)
+    for size in (int(value) for value in args.fleet.split(",")):
+        fleet = build_fleet(const, size, random.Random(args.seed))
+        for mode in MODES:
+            elapsed, sensors = await measure(const, fleet, mode, args.repeat)
+            print(f"{size:>6} {mode:<8} {elapsed * 1000:>10.1f} {elapsed * 1000 / size:>9.2f} {sensors:>8}")
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Накладные расходы счетчиков этапов на декодировании пакетов.
+
+Сравнивает ElehantData без учета времени и с учетом, как в координаторе:
+StageStats.sample на каждый пакет, perf_counter_ns и StageStats.record
+на выборку пакетов.
+
+    python benchmarks/bench_stats.py --packets 200000
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import random
+import time
+from time import perf_counter_ns
+
+from bench_pipeline import build_fleet, build_stream, load_component
+
+
+def best_of(runs: int, *funcs) -> list[float]:
+    """Лучшее время каждой функции; прогоны чередуются, чтобы шум машины делился поровну."""
+
+    best = [float("inf")] * len(funcs)
+    for _ in range(runs):
+        for index, func in enumerate(funcs):
+            best[index] = min(best[index], func())
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fleet", type=int, default=1000, help="размер парка")
+    parser.add_argument("--packets", type=int, default=200000, help="объявлений на прогон")
+    parser.add_argument("--runs", type=int, default=5, help="прогонов, берется лучший")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    package, _ = load_component()
+    const = importlib.import_module(f"{package}.const")
+    stats_module = importlib.import_module(f"{package}.stats")
+
+    rng = random.Random(args.seed)
+    stream = build_stream(build_fleet(const, args.fleet, rng), args.packets, 0.0, rng)
+    ElehantData = const.ElehantData
+    parse_mac = const.parse_mac
+    stats = stats_module.PipelineStats()
+
+    def plain() -> float:
+        start = time.perf_counter()
+        for info in stream:
+            ElehantData(info.device, info.advertisement)
+        return time.perf_counter() - start
+
+    def instrumented() -> float:
+        start = time.perf_counter()
+        for info in stream:
+            stats.classify.sample()
+            if stats.decode.sample():
+                t0 = perf_counter_ns()
+                macdata = parse_mac(info.address)
+                t1 = perf_counter_ns()
+                adv = ElehantData(info.device, info.advertisement, macdata)
+                stats.decode.record(perf_counter_ns() - t1)
+                stats.classify.record(t1 - t0)
+            else:
+                adv = ElehantData(info.device, info.advertisement)
+            if adv.reject is not None:
+                stats.reject(adv.reject)
+        return time.perf_counter() - start
+
+    def record_only() -> float:
+        stage = stats_module.StageStats()
+        start = time.perf_counter()
+        for _ in range(args.packets):
+            t0 = perf_counter_ns()
+            stage.record(perf_counter_ns() - t0)
+        return time.perf_counter() - start
+
+    base, timed, record = best_of(args.runs, plain, instrumented, record_only)
+    per_packet = args.packets / 1e9
+
+    print(f"декодирование:          {base / per_packet:8.1f} нс/пакет")
+    print(f"декодирование + учет:   {timed / per_packet:8.1f} нс/пакет")
+    print(f"накладные расходы:      {(timed - base) / per_packet:8.1f} нс/пакет ({(timed / base - 1) * 100:.1f}%)")
+    print(f"perf_counter_ns+record: {record / per_packet:8.1f} нс/замер")
+    print()
+    print("classify:", stats.classify.as_dict())
+    print("decode:", stats.decode.as_dict())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,60 @@
 from __future__ import annotations
 
+from collections.abc import Mapping
+from functools import partial
 import logging
+import time
+from time import perf_counter_ns
+from typing import Any
 
-from .const import ElehantData
+from .const import ElehantData, parse_mac
 
-from homeassistant.components.bluetooth import BluetoothScanningMode
+from homeassistant.components.bluetooth import (
+    BluetoothChange,
+    BluetoothScanningMode,
+    async_track_unavailable,
+)
 from homeassistant.components.bluetooth.models import BluetoothServiceInfoBleak
 from homeassistant.components.bluetooth.passive_update_processor import (
     PassiveBluetoothProcessorCoordinator,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.const import CONF_ADDRESS, Platform
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.typing import ConfigType
 
-from .const import DOMAIN
+from .buffers import PacketRing, ReadingHistory
+from .cache import AdvertisementCache
+from .capture import ReplayAdvertisement, ReplayDevice
+from .coalesce import async_get_coalescer
+from .export import async_get_billing_exporter
+from .const import (
+    CONF_FLEET,
+    CONF_FLEET_TOTALS,
+    CONF_PIPELINE_STATS,
+    CONF_WRITE_WINDOW,
+    DATA_FLEET,
+    DEFAULT_WRITE_WINDOW,
+    DIAGNOSTICS_PACKETS,
+    DOMAIN,
+    EVENT_METER_SILENT,
+    HISTORY_SIZE,
+    MANUFACTURER_ID,
+    default_stale_timeout,
+    stale_timeout_option,
+)
+from .discovery import async_get_discovery_filter
+from .fleet import ElehantFleet
+from .hub import ElehantHub, async_get_hub
+from .services import async_setup_services
+from .snapshot import Snapshot, SnapshotStore, async_get_snapshot_store
+from .throttle import build_write_policies
 
 PLATFORMS: list[Platform] = [Platform.SENSOR]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
 _LOGGER = logging.getLogger(__name__)
 
 def _service_info_to_adv(
@@ -26,32 +64,293 @@ def _service_info_to_adv(
     return ElehantData(service_info.device, service_info.advertisement)
 
 
+class ElehantCoordinator(PassiveBluetoothProcessorCoordinator[ElehantData]):
+    """Coordinator that skips decoding of repeated advertisements and keeps recent packets.
+
+    Advertisements are delivered by the shared ElehantHub instead of a
+    per-address Bluetooth callback. Until the first live advertisement the
+    coordinator may serve a stale reading restored from a snapshot. A meter
+    that stays silent longer than stale_timeout becomes unavailable.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        address: str,
+        hub: ElehantHub,
+        snapshots: SnapshotStore,
+    ) -> None:
+        self.hub = hub
+        self.snapshots = snapshots
+        self.restored: ElehantData | None = None
+        self.stale = False
+        self.silent = False
+        self.stale_timeout = default_stale_timeout(address) * 60
+        self._untrack_silence: CALLBACK_TYPE | None = None
+        self.cache = AdvertisementCache(self._decode)
+        self.packets = PacketRing(DIAGNOSTICS_PACKETS)
+        self.history = ReadingHistory(HISTORY_SIZE)
+        self._last_adv: ElehantData | None = None
+        self.write_policies = build_write_policies({})
+        self.write_window = DEFAULT_WRITE_WINDOW
+        self.coalescer = async_get_coalescer(hass)
+        super().__init__(
+            hass,
+            _LOGGER,
+            address=address,
+            mode=BluetoothScanningMode.PASSIVE,
+            update_method=self._async_update,
+        )
+
+    @property
+    def available(self) -> bool:
+        """Restored data keeps the device available until it is seen or times out."""
+        return (super().available or self.stale) and not self.silent
+
+    @property
+    def reading(self) -> ElehantData | None:
+        """Last decoded reading, live or restored from the snapshot."""
+        return self._last_adv or self.restored
+
+    @callback
+    def async_restore(self, snapshot: Snapshot) -> None:
+        """Serve the snapshot reading until a live advertisement arrives."""
+
+        adv = ElehantData(
+            ReplayDevice(self.address, self.address),
+            ReplayAdvertisement({MANUFACTURER_ID: snapshot.payload}, snapshot.rssi),
+        )
+        if not adv.macdata.signValid:
+            return
+        self.restored = adv.seen(snapshot.rssi, snapshot.time)
+        self.hub.totals.update(self.address, adv.template.group, adv.count)
+        self.stale = True
+
+    @callback
+    def _async_handle_bluetooth_event(
+        self, service_info: BluetoothServiceInfoBleak, change: BluetoothChange
+    ) -> None:
+        self.hub.staleness.async_touch(self.address)
+        refresh = self.stale or self.silent
+        self.stale = self.silent = False
+        super()._async_handle_bluetooth_event(service_info, change)
+        if refresh:
+            # Сброс признаков устаревших данных и молчания у всех сенсоров
+            self._async_update_all_listeners()
+
+    @callback
+    def _async_handle_silent(self) -> None:
+        """The meter sent nothing for stale_timeout seconds."""
+
+        self.silent = True
+        _LOGGER.info("Счетчик %s молчит %s с", self.address, self.stale_timeout)
+        self.hass.bus.async_fire(
+            EVENT_METER_SILENT,
+            {
+                "address": self.address,
+                "name": adv.name if (adv := self.reading) else None,
+                "timeout": self.stale_timeout,
+            },
+        )
+        self._async_update_all_listeners()
+
+    @callback
+    def _async_update_all_listeners(self) -> None:
+        for processor in self._processors:
+            processor.async_update_listeners(None)
+
+    @callback
+    def async_apply_options(self, options: Mapping[str, Any]) -> None:
+        """Apply write throttling, coalescing and silence timeout options."""
+
+        self.write_policies = build_write_policies(options)
+        self.write_window = options.get(CONF_WRITE_WINDOW, DEFAULT_WRITE_WINDOW)
+        self.async_set_stale_timeout(
+            stale_timeout_option(options, parse_mac(self.address).mtype) * 60
+        )
+
+    @callback
+    def async_set_stale_timeout(self, timeout: float) -> None:
+        """Change the silence timeout, 0 disables it."""
+
+        self.stale_timeout = timeout
+        if self._untrack_silence is not None:
+            self.hub.staleness.async_set_timeout(self.address, timeout)
+
+    def _decode(self, service_info: BluetoothServiceInfoBleak) -> ElehantData:
+        stats = self.hub.stats
+        # Оба этапа идут на каждом пакете, выборки замеров совпадают
+        stats.classify.sample()
+        if stats.decode.sample():
+            # Разобранный адрес передается в ElehantData, чтобы этапы не пересекались
+            start = perf_counter_ns()
+            macdata = parse_mac(service_info.address)
+            classified = perf_counter_ns()
+            adv = ElehantData(service_info.device, service_info.advertisement, macdata)
+            stats.decode.record(perf_counter_ns() - classified)
+            stats.classify.record(classified - start)
+        else:
+            adv = _service_info_to_adv(service_info)
+        if adv.reject is not None:
+            stats.reject(adv.reject)
+        return adv
+
+    def _async_update(self, service_info: BluetoothServiceInfoBleak) -> ElehantData:
+        now = time.time()
+        raw_bytes = service_info.manufacturer_data.get(MANUFACTURER_ID)
+        self.packets.append(now, service_info.rssi, service_info.source, raw_bytes)
+        adv = self.cache.async_get(service_info)
+        if adv.macdata.signValid:
+            self.snapshots.async_record(self.address, now, service_info.rssi, raw_bytes)
+            # Повторный пакет возвращается из кэша тем же объектом
+            if adv is not self._last_adv:
+                self._last_adv = adv
+                self.history.append(int(now), adv.count, adv.raw_temperature)
+                self.hub.totals.update(self.address, adv.template.group, adv.count)
+            # Сигнал лучшего прокси вместо сигнала первой принятой копии
+            best = self.hub.dedup.best(self.address)
+            adv = adv.seen(best[1] if best is not None else service_info.rssi, now)
+        return adv
+
+    @callback
+    def _async_start(self) -> None:
+        self._on_stop.append(self.hub.async_register(self))
+        self._untrack_silence = self.hub.staleness.async_track(
+            self.address, self.stale_timeout, self._async_handle_silent
+        )
+        self._on_stop.append(self._async_stop_silence_tracking)
+        self._on_stop.append(partial(self.hub.totals.remove, self.address))
+        self._on_stop.append(
+            async_track_unavailable(
+                self.hass,
+                self._async_handle_unavailable,
+                self.address,
+                self.connectable,
+            )
+        )
+
+    @callback
+    def _async_stop_silence_tracking(self) -> None:
+        if self._untrack_silence is not None:
+            self._untrack_silence()
+            self._untrack_silence = None
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the Elehant integration."""
+
+    async_setup_services(hass)
+    await async_get_billing_exporter(hass)
+    return True
+
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Elehant from a config entry."""
 
-    
+    if entry.data.get(CONF_FLEET):
+        return await _async_setup_fleet(hass, entry)
+
     address = entry.unique_id
     assert address is not None
+    snapshots = await async_get_snapshot_store(hass)
     coordinator = hass.data.setdefault(DOMAIN, {})[
         entry.entry_id
-    ] = PassiveBluetoothProcessorCoordinator(
-        hass,
-        _LOGGER,
-        address=address,
-        mode=BluetoothScanningMode.PASSIVE,
-        update_method=_service_info_to_adv,
-    )
+    ] = _async_create_coordinator(hass, async_get_hub(hass), snapshots, entry, address)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     entry.async_on_unload(
         coordinator.async_start()
-    ) 
+    )
+    return True
+
+
+async def _async_setup_fleet(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Set up every meter of a fleet entry with a single platform setup."""
+
+    hub = async_get_hub(hass)
+    snapshots = await async_get_snapshot_store(hass)
+    coordinators = hass.data.setdefault(DOMAIN, {})
+
+    @callback
+    def _async_create(address: str) -> ElehantCoordinator:
+        # Координаторы парка хранятся по адресу рядом с координаторами отдельных записей
+        coordinator = coordinators[address] = _async_create_coordinator(
+            hass, hub, snapshots, entry, address
+        )
+        return coordinator
+
+    fleet = hass.data[DATA_FLEET] = ElehantFleet(
+        hass, entry, hub, await async_get_discovery_filter(hass), _async_create
+    )
+    for address in fleet.addresses:
+        fleet.async_add(address)
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    fleet.async_remove_excluded_devices()
+    entry.async_on_unload(fleet.async_start())
     return True
 
 
+@callback
+def _async_create_coordinator(
+    hass: HomeAssistant,
+    hub: ElehantHub,
+    snapshots: SnapshotStore,
+    entry: ConfigEntry,
+    address: str,
+) -> ElehantCoordinator:
+    coordinator = ElehantCoordinator(hass, address, hub, snapshots)
+    if (snapshot := snapshots.async_get(address)) is not None:
+        coordinator.async_restore(snapshot)
+    coordinator.async_apply_options(entry.options)
+    return coordinator
+
+
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Apply changed options."""
+
+    hub = async_get_hub(hass)
+    for owner, option in (
+        (hub.stats_entry_id, CONF_PIPELINE_STATS),
+        (hub.totals_entry_id, CONF_FLEET_TOTALS),
+    ):
+        owns = owner == entry.entry_id
+        wants = entry.options.get(option, False)
+        if owns != wants and (owns or owner is None):
+            # Общие сенсоры интеграции добавляются и удаляются перезагрузкой записи
+            await hass.config_entries.async_reload(entry.entry_id)
+            return
+
+    if entry.data.get(CONF_FLEET):
+        fleet: ElehantFleet = hass.data[DATA_FLEET]
+        if not fleet.async_update_options():
+            await hass.config_entries.async_reload(entry.entry_id)
+        return
+
+    coordinator: ElehantCoordinator = hass.data[DOMAIN][entry.entry_id]
+    coordinator.async_apply_options(entry.options)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
 
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
+        if entry.data.get(CONF_FLEET):
+            fleet: ElehantFleet = hass.data.pop(DATA_FLEET)
+            for address in fleet.coordinators:
+                hass.data[DOMAIN].pop(address)
+        else:
+            hass.data[DOMAIN].pop(entry.entry_id)
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Forget the snapshots of a removed meter or fleet."""
+
+    snapshots = await async_get_snapshot_store(hass)
+    if entry.data.get(CONF_FLEET):
+        for address in entry.options.get(CONF_ADDRESS, []):
+            snapshots.async_remove(address)
+    elif entry.unique_id is not None:
+        snapshots.async_remove(entry.unique_id)
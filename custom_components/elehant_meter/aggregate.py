@@ -0,0 +1,85 @@
+"""Суммы показаний парка счетчиков Элехант по группам."""
+from __future__ import annotations
+
+from collections.abc import Callable, Mapping
+from decimal import Decimal
+
+# Показания в пакете - целое число десятитысячных долей
+READING_EXPONENT = -4
+
+
+class FleetTotals:
+    """Суммы показаний по группам в фиксированной точке.
+
+    Показания и суммы хранятся целыми числами в единицах пакета. Новое
+    показание счетчика меняет сумму его группы на разницу с прошлым, поэтому
+    обновление - O(1) и сумма не накапливает ошибку округления. Показание
+    счетчика входит и в сумму родительской группы из parents.
+    """
+
+    __slots__ = ("totals", "meters", "_parents", "_readings", "_listeners")
+
+    def __init__(self, parents: Mapping[str, str] | None = None) -> None:
+        self.totals: dict[str, int] = {}
+        self.meters: dict[str, int] = {}
+        self._parents = dict(parents or {})
+        self._readings: dict[str, tuple[str, int]] = {}
+        self._listeners: dict[str, list[Callable[[], None]]] = {}
+
+    def update(self, address: str, group: str, count: int) -> None:
+        """Новое показание счетчика."""
+
+        last = self._readings.get(address)
+        self._readings[address] = (group, count)
+        if last is not None and last[0] == group:
+            if last[1] == count:
+                return
+            for name in self._groups(group):
+                self.totals[name] += count - last[1]
+        else:
+            if last is not None:
+                self._subtract(*last)
+            for name in self._groups(group):
+                self.totals[name] = self.totals.get(name, 0) + count
+                self.meters[name] = self.meters.get(name, 0) + 1
+        self._notify(group)
+
+    def remove(self, address: str) -> None:
+        """Исключить счетчик из сумм."""
+
+        if (last := self._readings.pop(address, None)) is not None:
+            self._subtract(*last)
+
+    def value(self, group: str) -> Decimal | None:
+        """Точная сумма показаний группы, None - в группе нет счетчиков."""
+
+        if not self.meters.get(group):
+            return None
+        return Decimal(self.totals[group]).scaleb(READING_EXPONENT)
+
+    def add_listener(self, group: str, listener: Callable[[], None]) -> Callable[[], None]:
+        """Вызывать listener при изменении суммы группы, возвращает отписку."""
+
+        listeners = self._listeners.setdefault(group, [])
+        listeners.append(listener)
+
+        def _remove() -> None:
+            listeners.remove(listener)
+
+        return _remove
+
+    def _groups(self, group: str) -> tuple[str, ...]:
+        if (parent := self._parents.get(group)) is None:
+            return (group,)
+        return (group, parent)
+
+    def _subtract(self, group: str, count: int) -> None:
+        for name in self._groups(group):
+            self.totals[name] -= count
+            self.meters[name] -= 1
+        self._notify(group)
+
+    def _notify(self, group: str) -> None:
+        for name in self._groups(group):
+            for listener in self._listeners.get(name, ()):
+                listener()
@@ -0,0 +1,213 @@
+"""Пакетный разбор данных производителя Элехант на NumPy.
+
+Для разбора больших архивов объявлений вне Home Assistant. Пакеты версии 1
+раскладываются в буфер строк фиксированной ширины и разбираются
+представлениями NumPy, пакеты других известных версий - скалярным
+декодером. Результат совпадает с ElehantData по полям и причинам отказа.
+
+NumPy - необязательная зависимость, нужна только этому модулю.
+"""
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from .capture import CAPTURE_MAGIC, MAX_PAYLOAD, RECORD
+from .const import MAC_INDEX, parse_mac
+from .decoder import PACKET_DECODERS, PACKET_VER_OFFSET, decode_packet
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Коды причин отказа в BatchReadings.reject
+REJECT_REASONS: tuple[str | None, ...] = (None, "mac", "payload", "mismatch")
+REJECT_MAC = 1
+REJECT_PAYLOAD = 2
+REJECT_MISMATCH = 3
+
+# Ширина пакета версии 1, см. decoder._PACKET_V1
+WIDTH_V1 = 17
+
+
+def _numpy() -> Any:
+    try:
+        import numpy
+    except ImportError as err:
+        raise ImportError("Для пакетного разбора нужен пакет numpy: pip install numpy") from err
+    return numpy
+
+
+class BatchReadings(NamedTuple):
+    """Поля пакетов в массивах, значения недействительных строк - нули."""
+
+    reject: np.ndarray
+    packet_ver: np.ndarray
+    mtype: np.ndarray
+    model: np.ndarray
+    serial: np.ndarray
+    count: np.ndarray
+    battery: np.ndarray
+    temperature: np.ndarray
+    fw: np.ndarray
+
+    @property
+    def valid(self) -> np.ndarray:
+        """Маска действительных пакетов."""
+        return self.reject == 0
+
+    def reasons(self) -> list[str | None]:
+        """Причины отказа строками, как ElehantData.reject."""
+        return [REJECT_REASONS[code] for code in self.reject.tolist()]
+
+
+def _v1_dtype(np) -> Any:
+    return np.dtype(
+        [
+            ("head", "V3"),
+            ("packet_ver", "u1"),
+            ("mtype", "u1"),
+            ("model", "u1"),
+            ("num_lo", "<u2"),
+            ("num_hi", "u1"),
+            ("count", "<u4"),
+            ("battery", "u1"),
+            ("temperature", "<u2"),
+            ("fw", "u1"),
+        ]
+    )
+
+
+def _stack(np, payloads: Sequence[bytes | None], width: int) -> tuple[Any, Any]:
+    """Буфер n x width с данными, обрезанными или дополненными нулями, и длины."""
+
+    payloads = [payload or b"" for payload in payloads]
+    lengths = np.fromiter(map(len, payloads), dtype=np.intp, count=len(payloads))
+    if len(payloads) and (lengths == width).all():
+        data = b"".join(payloads)
+    else:
+        data = b"".join(payload[:width].ljust(width, b"\0") for payload in payloads)
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(payloads), width), lengths
+
+
+def _decode(
+    np,
+    mac_valid: Any,
+    mac_mtype: Any,
+    mac_model: Any,
+    buffer: Any,
+    lengths: Any,
+    payloads: Sequence[bytes | None] | None,
+) -> BatchReadings:
+    size = len(lengths)
+    fields = buffer[:, :WIDTH_V1].copy().view(_v1_dtype(np)).reshape(size)
+
+    packet_ver = np.where(lengths > PACKET_VER_OFFSET, buffer[:, PACKET_VER_OFFSET], 0)
+    # Разобранные пакеты: сначала версии 1, затем других версий
+    decoded = (packet_ver == 1) & (lengths >= WIDTH_V1)
+
+    result = BatchReadings(
+        reject=np.full(size, REJECT_PAYLOAD, dtype=np.uint8),
+        packet_ver=np.where(decoded, fields["packet_ver"], 0).astype(np.uint8),
+        mtype=np.where(decoded, fields["mtype"], 0).astype(np.uint8),
+        model=np.where(decoded, fields["model"], 0).astype(np.uint8),
+        serial=np.where(
+            decoded, fields["num_lo"].astype(np.uint32) | fields["num_hi"].astype(np.uint32) << 16, 0
+        ).astype(np.uint32),
+        count=np.where(decoded, fields["count"], 0).astype(np.uint32),
+        battery=np.where(decoded, np.minimum(fields["battery"], 100), 0).astype(np.uint8),
+        temperature=np.where(decoded, fields["temperature"], 0).astype(np.uint16),
+        fw=np.where(decoded, fields["fw"], 0).astype(np.uint8),
+    )
+
+    # Прочие известные версии - скалярным декодером
+    other = mac_valid & ~decoded & (lengths > PACKET_VER_OFFSET)
+    other &= np.isin(packet_ver, [ver for ver in PACKET_DECODERS if ver != 1])
+    if payloads is not None:
+        for index in np.flatnonzero(other).tolist():
+            if (packet := decode_packet(payloads[index])) is None:
+                continue
+            decoded[index] = True
+            result.packet_ver[index] = packet.packet_ver
+            result.mtype[index] = packet.mtype
+            result.model[index] = packet.model
+            result.serial[index] = packet.num
+            result.count[index] = packet.count
+            result.battery[index] = min(packet.battery, 100)
+            result.temperature[index] = packet.temp
+            result.fw[index] = packet.fw
+
+    mismatch = decoded & ((result.mtype != mac_mtype) | (result.model != mac_model))
+    result.reject[decoded] = 0
+    result.reject[mismatch] = REJECT_MISMATCH
+    result.reject[~mac_valid] = REJECT_MAC
+
+    for name in BatchReadings._fields[1:]:
+        getattr(result, name)[result.reject != 0] = 0
+    return result
+
+
+def decode_batch(
+    addresses: Sequence[str], payloads: Sequence[bytes | None]
+) -> BatchReadings:
+    """Разбор пакетов по адресам и данным производителя."""
+
+    np = _numpy()
+    if len(addresses) != len(payloads):
+        raise ValueError("Число адресов и пакетов не совпадает")
+
+    # Адресов в архиве намного меньше, чем пакетов: адрес разбирается один раз
+    unique = dict.fromkeys(addresses)
+    for index, address in enumerate(unique):
+        unique[address] = index
+    inverse = np.fromiter(map(unique.__getitem__, addresses), dtype=np.intp, count=len(addresses))
+    macs = [parse_mac(address) for address in unique]
+    mac_valid = np.array([mac.signValid for mac in macs], dtype=bool)[inverse]
+    mac_mtype = np.array([mac.mtype or 0 for mac in macs], dtype=np.uint8)[inverse]
+    mac_model = np.array([mac.model or 0 for mac in macs], dtype=np.uint8)[inverse]
+
+    buffer, lengths = _stack(np, payloads, max(WIDTH_V1, PACKET_VER_OFFSET + 1))
+    return _decode(np, mac_valid, mac_mtype, mac_model, buffer, lengths, payloads)
+
+
+def decode_capture(path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, BatchReadings]:
+    """Время, адреса (n x 6 байт), сигнал и показания из файла записи.
+
+    Записи читаются из файла одним массивом без разбора по одной.
+    """
+
+    np = _numpy()
+    dtype = np.dtype(
+        [
+            ("time", "<f8"),
+            ("address", "u1", (6,)),
+            ("rssi", "i1"),
+            ("source", "V17"),
+            ("length", "u1"),
+            ("payload", "u1", (MAX_PAYLOAD,)),
+        ]
+    )
+    assert dtype.itemsize == RECORD.size
+
+    with open(path, "rb") as file:
+        if file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"{path}: не файл записи Элехант")
+        records = np.fromfile(file, dtype=dtype)
+
+    address = records["address"]
+    known = np.zeros((256, 256), dtype=bool)
+    for mac in MAC_INDEX.values():
+        known[mac.model, int(mac.mtype)] = True
+    mac_valid = (address[:, 0] == 0xB0) & known[address[:, 1], address[:, 2]]
+
+    # Байты за длиной пакета не читаются: версия 1 разбирается при длине от WIDTH_V1
+    lengths = records["length"].astype(np.intp)
+    buffer = records["payload"]
+
+    payloads = None
+    if len(PACKET_DECODERS) > 1:
+        payloads = [bytes(row[:length]) for row, length in zip(records["payload"], lengths.tolist())]
+
+    readings = _decode(
+        np, mac_valid, address[:, 2].copy(), address[:, 1].copy(), buffer, lengths, payloads
+    )
+    return records["time"], address, records["rssi"], readings
@@ -0,0 +1,145 @@
+"""Буферы фиксированного размера для данных счетчиков."""
+from __future__ import annotations
+
+from array import array
+from typing import Iterator, NamedTuple
+
+
+class PacketRecord(NamedTuple):
+    """Принятый пакет."""
+
+    time: float
+    rssi: int
+    source: str | None
+    payload: bytes | None
+
+
+class PacketRing:
+    """Кольцевой буфер последних пакетов, память выделяется один раз."""
+
+    __slots__ = ("size", "count", "_next", "_times", "_rssi", "_sources", "_payloads")
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.count = 0
+        self._next = 0
+        self._times = array("d", bytes(8 * size))
+        self._rssi = array("h", bytes(2 * size))
+        self._sources: list[str | None] = [None] * size
+        self._payloads: list[bytes | None] = [None] * size
+
+    def append(
+        self, time: float, rssi: int, source: str | None, payload: bytes | None
+    ) -> None:
+        """Запись пакета поверх самого старого."""
+
+        index = self._next
+        self._times[index] = time
+        self._rssi[index] = rssi
+        self._sources[index] = source
+        self._payloads[index] = payload
+
+        index += 1
+        self._next = 0 if index == self.size else index
+        if self.count < self.size:
+            self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[PacketRecord]:
+        """Пакеты от старого к новому."""
+
+        start = (self._next - self.count) % self.size
+        for offset in range(self.count):
+            index = (start + offset) % self.size
+            yield PacketRecord(
+                self._times[index],
+                self._rssi[index],
+                self._sources[index],
+                self._payloads[index],
+            )
+
+
+class Reading(NamedTuple):
+    """Показания в фиксированной точке: секунды эпохи, счетчик x10000, температура x100."""
+
+    time: int
+    count: int
+    temperature: int
+
+
+class ReadingHistory:
+    """Кольцевая история показаний счетчика в массивах целых чисел.
+
+    Записи добавляются в порядке времени, поэтому окно находится двоичным
+    поиском по логическим индексам кольца. Массивы растут до size по мере
+    записи, счетчик с редкими изменениями не занимает всю историю сразу.
+    """
+
+    __slots__ = ("size", "count", "_next", "_times", "_counts", "_temperatures")
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.count = 0
+        self._next = 0
+        self._times = array("I")
+        self._counts = array("I")
+        self._temperatures = array("H")
+
+    def append(self, time: int, count: int, temperature: int) -> None:
+        """Запись показаний поверх самых старых."""
+
+        index = self._next
+        if index == len(self._times):
+            self._times.append(time)
+            self._counts.append(count)
+            self._temperatures.append(temperature)
+            self.count += 1
+            self._next = 0 if self.count == self.size else self.count
+            return
+        self._times[index] = time
+        self._counts[index] = count
+        self._temperatures[index] = temperature
+
+        index += 1
+        self._next = 0 if index == self.size else index
+        if self.count < self.size:
+            self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Reading]:
+        """Показания от старых к новым."""
+        return self.window(0)
+
+    def latest(self) -> Reading | None:
+        """Последние показания."""
+
+        if not self.count:
+            return None
+        index = (self._next - 1) % self.size
+        return Reading(self._times[index], self._counts[index], self._temperatures[index])
+
+    def window(self, start: int, end: int | None = None) -> Iterator[Reading]:
+        """Показания со временем в [start, end]."""
+
+        size = self.size
+        times = self._times
+        first = (self._next - self.count) % size
+
+        # Первый логический индекс со временем не меньше start
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if times[(first + middle) % size] < start:
+                low = middle + 1
+            else:
+                high = middle
+
+        for offset in range(low, self.count):
+            index = (first + offset) % size
+            if end is not None and times[index] > end:
+                break
+            yield Reading(times[index], self._counts[index], self._temperatures[index])
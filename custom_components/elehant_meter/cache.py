@@ -0,0 +1,45 @@
+"""Кэш повторяющихся пакетов Элехант."""
+from __future__ import annotations
+
+from typing import Callable
+
+from homeassistant.components.bluetooth.models import BluetoothServiceInfoBleak
+
+from .const import MANUFACTURER_ID, ElehantData
+
+
+class AdvertisementCache:
+    """Повторное использование данных при совпадении пакета по байтам."""
+
+    def __init__(
+        self, decode: Callable[[BluetoothServiceInfoBleak], ElehantData]
+    ) -> None:
+        self._decode = decode
+        self._entries: dict[str, tuple[bytes, ElehantData]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Доля пакетов, обработанных из кэша."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def async_get(self, service_info: BluetoothServiceInfoBleak) -> ElehantData:
+        """Данные по пакету, повторный пакет возвращает тот же объект.
+
+        Сигнал и время в результате - первого пакета, см. ElehantData.seen.
+        """
+
+        raw_bytes = service_info.manufacturer_data.get(MANUFACTURER_ID)
+        entry = self._entries.get(service_info.address)
+
+        if entry is not None and entry[0] == raw_bytes:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        adv = self._decode(service_info)
+        if raw_bytes is not None:
+            self._entries[service_info.address] = (raw_bytes, adv)
+        return adv
@@ -0,0 +1,279 @@
+"""Запись и воспроизведение потока объявлений Элехант.
+
+Файл записи - заголовок CAPTURE_MAGIC и записи фиксированного размера
+RECORD.size байт: время, адрес, сигнал, источник, данные производителя.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable, Iterable, Iterator
+import mmap
+import os
+from struct import Struct
+from time import perf_counter_ns
+from typing import Any, NamedTuple
+
+from .const import ElehantData
+from .dedup import Deduplicator
+from .stats import PipelineStats
+
+CAPTURE_MAGIC = b"ELHCAP\x01\x00"
+
+# время, адрес, сигнал, источник, длина данных, данные
+RECORD = Struct("<d6sb17sB31s")
+
+MAX_PAYLOAD = 31
+
+
+class CaptureRecord(NamedTuple):
+    """Запись потока."""
+
+    time: float
+    address: str
+    rssi: int
+    source: str
+    payload: bytes
+
+
+def pack_record(
+    time: float, address: str, rssi: int, source: str | None, payload: bytes
+) -> bytes:
+    """Запись в формате файла."""
+
+    payload = payload[:MAX_PAYLOAD]
+    return RECORD.pack(
+        time,
+        bytes.fromhex(address.replace(":", "")),
+        max(-128, min(127, rssi)),
+        (source or "").encode("ascii", "replace")[:17],
+        len(payload),
+        payload,
+    )
+
+
+def unpack_record(buffer, offset: int = 0) -> CaptureRecord:
+    """Разбор записи по смещению."""
+
+    time, address, rssi, source, length, payload = RECORD.unpack_from(buffer, offset)
+    return CaptureRecord(
+        time,
+        ":".join(f"{byte:02X}" for byte in address),
+        rssi,
+        source.rstrip(b"\0").decode("ascii"),
+        payload[:length],
+    )
+
+
+def rotate_file(path: str, backups: int) -> None:
+    """Сдвиг копий path.1 ... path.<backups>, самая старая удаляется."""
+
+    for index in range(backups - 1, 0, -1):
+        source = f"{path}.{index}"
+        if os.path.exists(source):
+            os.replace(source, f"{path}.{index + 1}")
+    if backups > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+class CaptureWriter:
+    """Дозапись потока с ротацией файлов.
+
+    append копит записи в памяти и не выполняет ввод-вывод, write пишет
+    накопленное на диск и вызывается вне цикла событий.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.records = 0
+        self._buffer = bytearray()
+        self._file = None
+
+    def append(
+        self, time: float, address: str, rssi: int, source: str | None, payload: bytes
+    ) -> None:
+        """Добавление записи в буфер, адреса не в формате MAC пропускаются."""
+        try:
+            record = pack_record(time, address, rssi, source, payload)
+        except ValueError:
+            return
+        self._buffer += record
+        self.records += 1
+
+    def take(self) -> bytes:
+        """Накопленные записи, буфер очищается."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+    def write(self, data: bytes) -> None:
+        """Запись на диск с ротацией по размеру."""
+
+        if self._file is None:
+            self._open()
+        self._file.write(data)
+        self._file.flush()
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def close(self) -> None:
+        """Закрытие файла."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self) -> None:
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(CAPTURE_MAGIC)
+
+    def _rotate(self) -> None:
+        self.close()
+        rotate_file(self.path, self.backups)
+
+
+class CaptureReader:
+    """Чтение файла записи через mmap."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path}: не файл записи Элехант")
+
+    def __len__(self) -> int:
+        return (len(self._mmap) - len(CAPTURE_MAGIC)) // RECORD.size
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        mm = self._mmap
+        for offset in range(len(CAPTURE_MAGIC), len(CAPTURE_MAGIC) + len(self) * RECORD.size, RECORD.size):
+            yield unpack_record(mm, offset)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __enter__(self) -> CaptureReader:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class ReplayDevice(NamedTuple):
+    """Замена BLEDevice при воспроизведении."""
+
+    address: str
+    name: str | None = None
+
+
+class ReplayAdvertisement(NamedTuple):
+    """Замена AdvertisementData при воспроизведении."""
+
+    manufacturer_data: dict[int, bytes]
+    rssi: int
+
+
+class ReplayServiceInfo:
+    """Замена BluetoothServiceInfoBleak с полями, которые читает интеграция."""
+
+    __slots__ = ("device", "advertisement", "address", "name", "rssi", "source", "manufacturer_data", "time")
+
+    def __init__(self, record: CaptureRecord, manufacturer_id: int, time: float) -> None:
+        self.manufacturer_data = {manufacturer_id: record.payload}
+        self.device = ReplayDevice(record.address, record.address)
+        self.advertisement = ReplayAdvertisement(self.manufacturer_data, record.rssi)
+        self.address = record.address
+        self.name = record.address
+        self.rssi = record.rssi
+        self.source = record.source
+        self.time = time
+
+
+class ReplayPipeline:
+    """Разбор воспроизводимых записей отдельно от живых счетчиков.
+
+    Записи проходят отсев копий и декодирование с учетом этапов, как в хабе,
+    но не передаются координаторам: сенсоры, снимки, история, суммы парка и
+    выгрузка показаний не видят старых показаний из записи.
+    """
+
+    def __init__(self, manufacturer_id: int) -> None:
+        self.manufacturer_id = manufacturer_id
+        self.dedup = Deduplicator()
+        self.stats = PipelineStats()
+        self.records = 0
+        # Последние показания каждого счетчика из записи
+        self.readings: dict[str, ElehantData] = {}
+
+    def handle(self, record: CaptureRecord) -> None:
+        """Разбор записи."""
+
+        self.records += 1
+        if not self.dedup.accept(
+            record.address, record.payload, record.source, record.rssi, record.time
+        ):
+            self.stats.reject("duplicate")
+            return
+
+        service_info = ReplayServiceInfo(record, self.manufacturer_id, record.time)
+        stage = self.stats.decode
+        if stage.sample():
+            start = perf_counter_ns()
+            adv = ElehantData(service_info.device, service_info.advertisement)
+            stage.record(perf_counter_ns() - start)
+        else:
+            adv = ElehantData(service_info.device, service_info.advertisement)
+
+        if adv.reject is not None:
+            self.stats.reject(adv.reject)
+        else:
+            self.readings[record.address] = adv.seen(record.rssi, record.time)
+
+    def summary(self) -> dict[str, Any]:
+        """Итог воспроизведения."""
+        return {
+            "records": self.records,
+            "accepted": self.dedup.accepted,
+            "pipeline": self.stats.as_dict(),
+            "meters": {
+                address: {
+                    "name": adv.name,
+                    "meter_reading": adv.meter_reading,
+                    "time": adv.time,
+                }
+                for address, adv in self.readings.items()
+            },
+        }
+
+
+async def async_replay(
+    records: Iterable[CaptureRecord],
+    handle: Callable[[CaptureRecord], None],
+    speed: float = 1.0,
+) -> int:
+    """Воспроизведение с исходными интервалами, ускоренными в speed раз; 0 - без пауз."""
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first: float | None = None
+    count = 0
+
+    for record in records:
+        if speed > 0:
+            if first is None:
+                first = record.time
+            delay = (record.time - first) / speed - (loop.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif count % 1000 == 0:
+            await asyncio.sleep(0)
+
+        handle(record)
+        count += 1
+
+    return count
@@ -0,0 +1,75 @@
+"""Объединение записей состояний сенсоров Элехант."""
+from __future__ import annotations
+
+import asyncio
+from time import perf_counter_ns
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.entity import Entity
+
+from .const import DATA_COALESCER
+from .stats import StageStats
+
+
+class StateWriteCoalescer:
+    """Запись состояний пакетами: за окно каждый сенсор записывается один раз с последним значением."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._pending: dict[int, Entity] = {}
+        self._handle: asyncio.TimerHandle | asyncio.Handle | None = None
+        self.requested = 0
+        self.written = 0
+        self.flushes = 0
+        # Записи, не запрошенные по политике записи сенсора
+        self.throttled = 0
+        self.write_stats = StageStats()
+
+    @property
+    def merge_ratio(self) -> float:
+        """Доля запросов записи, объединенных с другими."""
+        return 1 - self.written / self.requested if self.requested else 0.0
+
+    @callback
+    def async_schedule(self, entity: Entity, window: float) -> None:
+        """Запрос записи состояния; окно задает запрос, открывающий пакет."""
+
+        self.requested += 1
+        self._pending[id(entity)] = entity
+
+        if self._handle is None:
+            if window > 0:
+                self._handle = self.hass.loop.call_later(window, self._async_flush)
+            else:
+                self._handle = self.hass.loop.call_soon(self._async_flush)
+
+    @callback
+    def async_discard(self, entity: Entity) -> None:
+        """Отмена ожидающей записи удаляемого сенсора."""
+        self._pending.pop(id(entity), None)
+
+    @callback
+    def _async_flush(self) -> None:
+        self._handle = None
+        pending = self._pending
+        self._pending = {}
+        self.flushes += 1
+        self.written += len(pending)
+
+        write_stats = self.write_stats
+        for entity in pending.values():
+            if write_stats.sample():
+                start = perf_counter_ns()
+                entity.async_write_ha_state()
+                write_stats.record(perf_counter_ns() - start)
+            else:
+                entity.async_write_ha_state()
+
+
+@callback
+def async_get_coalescer(hass: HomeAssistant) -> StateWriteCoalescer:
+    """Общий объединитель записей интеграции."""
+
+    if (coalescer := hass.data.get(DATA_COALESCER)) is None:
+        coalescer = hass.data[DATA_COALESCER] = StateWriteCoalescer(hass)
+    return coalescer
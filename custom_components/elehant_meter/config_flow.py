@@ -1,22 +1,53 @@
 """Config flow for Elehant integration."""
 from __future__ import annotations
 
+from collections.abc import Iterable, Mapping
 import logging
 from typing import Any
 
 from .const import ElehantData
 from .const import MANUFACTURER_ID
+from .const import METER_TYPE_NAMES
+from .const import parse_mac
 import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.components.bluetooth import (
     BluetoothServiceInfoBleak,
     async_discovered_service_info,
+    async_last_service_info,
+    async_rediscover_address,
 )
-from homeassistant.const import CONF_ADDRESS
+from homeassistant.const import CONF_ADDRESS, CONF_NAME
+from homeassistant.core import callback
+import homeassistant.helpers.config_validation as cv
 from homeassistant.data_entry_flow import AbortFlow, FlowResult
 
-from .const import DOMAIN
+from .const import (
+    CONF_AUTO_ADOPT,
+    CONF_FLEET,
+    CONF_FLEET_TOTALS,
+    CONF_METER_MODEL,
+    CONF_METER_TYPE,
+    CONF_MIN_INTERVAL,
+    CONF_PIPELINE_STATS,
+    CONF_RSSI_DEADBAND,
+    CONF_SERIAL_MAX,
+    CONF_SERIAL_MIN,
+    CONF_STALE_TIMEOUTS,
+    CONF_TEMPERATURE_DEADBAND,
+    CONF_WRITE_WINDOW,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_RSSI_DEADBAND,
+    DEFAULT_TEMPERATURE_DEADBAND,
+    DEFAULT_WRITE_WINDOW,
+    DOMAIN,
+    FLEET_UNIQUE_ID,
+    METER_TEMPLATES,
+    stale_timeout_option,
+)
+from .discovery import async_get_discovery_filter
+from .fleet import ANY, async_fleet_addresses, async_get_fleet_entry, matches_filter
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -29,14 +60,26 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self._discovery_info: BluetoothServiceInfoBleak | None = None
         self._discovered_device: ElehantData | None = None
         self._discovered_devices: dict[str, tuple[str, ElehantData]] = {}
+        self._filter: dict[str, Any] = {}
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> OptionsFlowHandler:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler()
 
     async def async_step_bluetooth(
         self, discovery_info: BluetoothServiceInfoBleak
     ) -> FlowResult:
         """Handle the Bluetooth discovery step."""
 
+        discovery_filter = await async_get_discovery_filter(self.hass)
+        if reason := discovery_filter.async_reject_reason(discovery_info):
+            return self.async_abort(reason=reason)
+
         _LOGGER.debug("Обнаружено устройство BT: %s", discovery_info)
-        _LOGGER.debug("Данные в HEX: %s", discovery_info.manufacturer_data[MANUFACTURER_ID].hex().upper())
 
         adv = ElehantData(discovery_info.device, discovery_info.advertisement)
 
@@ -47,6 +90,8 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         _LOGGER.debug("Установка ID: %s", discovery_info.address)
         await self.async_set_unique_id(discovery_info.address)
         self._abort_if_unique_id_configured()
+        if discovery_info.address in async_fleet_addresses(self.hass):
+            return self.async_abort(reason="already_configured")
 
         _LOGGER.debug("Пройдена установка ID")
 
@@ -57,6 +102,25 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return await self.async_step_bluetooth_confirm()
             
 
+    async def async_step_ignore(self, user_input: dict[str, Any]) -> FlowResult:
+        """Remember an ignored device in the discovery filter."""
+        discovery_filter = await async_get_discovery_filter(self.hass)
+        discovery_filter.async_dismiss(user_input["unique_id"])
+        return await super().async_step_ignore(user_input)
+
+    async def async_step_unignore(self, user_input: dict[str, Any]) -> FlowResult:
+        """Forget an ignored device and offer it again if it is in range."""
+        address = user_input["unique_id"]
+        await self.async_set_unique_id(address)
+        discovery_filter = await async_get_discovery_filter(self.hass)
+        discovery_filter.async_restore(address)
+        if (discovery_info := async_last_service_info(self.hass, address, False)) is not None:
+            return await self.async_step_bluetooth(discovery_info)
+
+        # Устройство не в зоне приема: обнаружение по следующему объявлению
+        async_rediscover_address(self.hass, address)
+        return self.async_abort(reason="no_devices_found")
+
     async def async_step_bluetooth_confirm(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
@@ -86,23 +150,23 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
-        """Handle the user step to pick discovered device."""
+        """Handle the user step: filter discovered devices."""
         if user_input is not None:
-            address = user_input[CONF_ADDRESS]
-            adv = self._discovered_devices[address][1]
-            self._raise_for_advertisement_errors(adv)
-
-            await self.async_set_unique_id(address, raise_on_progress=False)
-            self._abort_if_unique_id_configured()
-
-            return self.async_create_entry(
-                title=self._discovered_devices[address][0], data={}
-            )
+            self._filter = user_input
+            return await self.async_step_select()
 
-        current_addresses = self._async_current_ids()
+        current_addresses = self._async_current_ids() | async_fleet_addresses(self.hass)
+        discovery_filter = await async_get_discovery_filter(self.hass)
         for discovery_info in async_discovered_service_info(self.hass, False):
             address = discovery_info.address
-            if address in current_addresses or address in self._discovered_devices:
+            if (
+                address in current_addresses
+                or address in self._discovered_devices
+                or MANUFACTURER_ID not in discovery_info.manufacturer_data
+                or not parse_mac(address).signValid
+                # Отклоненные счетчики и счетчики вне правил обнаружения не предлагаются
+                or discovery_filter.async_reject_reason(discovery_info) is not None
+            ):
                 continue
 
             adv = ElehantData(
@@ -117,16 +181,257 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if not self._discovered_devices:
             return self.async_abort(reason="no_devices_found")
 
+        devices = [dev for (_, dev) in self._discovered_devices.values()]
+        mtypes = {ANY: "Все"} | {
+            str(adv.mtype): METER_TYPE_NAMES[adv.mtype]
+            for adv in sorted(devices, key=lambda adv: adv.mtype)
+        }
+        models = {ANY: "Все"} | {
+            f"{adv.mtype}-{adv.model}": adv.name_model
+            for adv in sorted(devices, key=lambda adv: (adv.mtype, adv.model))
+        }
+
         return self.async_show_form(
             step_id="user",
             data_schema=vol.Schema(
                 {
-                    vol.Required(CONF_ADDRESS): vol.In(
-                        {
-                            addr: dev[0]
-                            for (addr, dev) in self._discovered_devices.items()
-                        }
+                    vol.Optional(CONF_METER_TYPE, default=ANY): vol.In(mtypes),
+                    vol.Optional(CONF_METER_MODEL, default=ANY): vol.In(models),
+                    vol.Optional(CONF_SERIAL_MIN): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                    vol.Optional(CONF_SERIAL_MAX): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                }
+            ),
+            description_placeholders={"count": str(len(devices))},
+        )
+
+    async def async_step_select(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Pick one or many of the filtered devices."""
+        if user_input is not None:
+            addresses = [
+                address
+                for address in user_input[CONF_ADDRESS]
+                if address in self._discovered_devices
+            ]
+            if not addresses:
+                return self.async_abort(reason="no_devices_found")
+
+            if user_input.get(CONF_FLEET):
+                return await self._async_create_fleet(
+                    addresses, user_input.get(CONF_AUTO_ADOPT, False)
+                )
+
+            first, *rest = addresses
+            for address in rest:
+                self.hass.async_create_task(
+                    self.hass.config_entries.flow.async_init(
+                        DOMAIN,
+                        context={"source": config_entries.SOURCE_INTEGRATION_DISCOVERY},
+                        data={
+                            CONF_ADDRESS: address,
+                            CONF_NAME: self._discovered_devices[address][0],
+                        },
                     )
+                )
+
+            await self.async_set_unique_id(first, raise_on_progress=False)
+            self._abort_if_unique_id_configured()
+
+            return self.async_create_entry(
+                title=self._discovered_devices[first][0], data={}
+            )
+
+        devices = {
+            address: name
+            for address, (name, adv) in sorted(
+                self._discovered_devices.items(), key=lambda item: item[1][1].id_meter
+            )
+            if matches_filter(adv, self._filter)
+        }
+        if not devices:
+            return self.async_abort(reason="no_devices_found")
+
+        return self.async_show_form(
+            step_id="select",
+            data_schema=vol.Schema(
+                {
+                    vol.Required(CONF_ADDRESS): cv.multi_select(devices),
+                    vol.Optional(CONF_FLEET, default=False): bool,
+                    vol.Optional(CONF_AUTO_ADOPT, default=False): bool,
                 }
             ),
         )
+
+    async def _async_create_fleet(
+        self, addresses: list[str], auto_adopt: bool
+    ) -> FlowResult:
+        """Create the fleet entry or add the devices to the existing one."""
+        if (entry := async_get_fleet_entry(self.hass)) is not None:
+            self.hass.config_entries.async_update_entry(
+                entry,
+                options={
+                    **entry.options,
+                    CONF_ADDRESS: list(
+                        dict.fromkeys([*entry.options.get(CONF_ADDRESS, []), *addresses])
+                    ),
+                },
+            )
+            return self.async_abort(reason="fleet_updated")
+
+        await self.async_set_unique_id(FLEET_UNIQUE_ID, raise_on_progress=False)
+        self._abort_if_unique_id_configured()
+
+        # Фильтр выбора становится правилами автодобавления парка
+        return self.async_create_entry(
+            title="Приборы учета Элехант",
+            data={CONF_FLEET: True},
+            options={
+                **self._filter,
+                CONF_ADDRESS: addresses,
+                CONF_AUTO_ADOPT: auto_adopt,
+            },
+        )
+
+    async def async_step_integration_discovery(
+        self, discovery_info: dict[str, Any]
+    ) -> FlowResult:
+        """Create an entry for a device picked together with others."""
+        await self.async_set_unique_id(discovery_info[CONF_ADDRESS])
+        self._abort_if_unique_id_configured()
+        if discovery_info[CONF_ADDRESS] in async_fleet_addresses(self.hass):
+            return self.async_abort(reason="already_configured")
+
+        return self.async_create_entry(title=discovery_info[CONF_NAME], data={})
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle Elehant options."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage state write throttling, coalescing and the silence timeout."""
+        if self.config_entry.data.get(CONF_FLEET):
+            return await self.async_step_fleet(user_input)
+
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    **_write_options_schema(options),
+                    **_stale_timeouts_schema(
+                        options, (parse_mac(self.config_entry.unique_id).mtype,)
+                    ),
+                    **_shared_sensors_schema(options),
+                }
+            ),
+        )
+
+    async def async_step_fleet(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the fleet devices, auto-adoption rules and write options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+        coordinators = self.hass.data.get(DOMAIN, {})
+        devices = {}
+        for address in options.get(CONF_ADDRESS, []):
+            coordinator = coordinators.get(address)
+            adv = coordinator.reading if coordinator is not None else None
+            devices[address] = adv.name if adv is not None else address
+        mtypes = {ANY: "Все"} | {
+            str(int(mtype)): name for mtype, name in METER_TYPE_NAMES.items()
+        }
+        models = {ANY: "Все"} | {
+            f"{mtype}-{model}": template.name_model
+            for (mtype, model), template in sorted(METER_TEMPLATES.items())
+        }
+
+        return self.async_show_form(
+            step_id="fleet",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(CONF_ADDRESS, default=list(devices)): cv.multi_select(devices),
+                    vol.Optional(
+                        CONF_AUTO_ADOPT, default=options.get(CONF_AUTO_ADOPT, False)
+                    ): bool,
+                    vol.Optional(
+                        CONF_METER_TYPE, default=options.get(CONF_METER_TYPE, ANY)
+                    ): vol.In(mtypes),
+                    vol.Optional(
+                        CONF_METER_MODEL, default=options.get(CONF_METER_MODEL, ANY)
+                    ): vol.In(models),
+                    vol.Optional(
+                        CONF_SERIAL_MIN,
+                        description={"suggested_value": options.get(CONF_SERIAL_MIN)},
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                    vol.Optional(
+                        CONF_SERIAL_MAX,
+                        description={"suggested_value": options.get(CONF_SERIAL_MAX)},
+                    ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                    **_write_options_schema(options),
+                    **_stale_timeouts_schema(options, CONF_STALE_TIMEOUTS),
+                    **_shared_sensors_schema(options),
+                }
+            ),
+        )
+
+
+def _write_options_schema(options: Mapping[str, Any]) -> dict[vol.Marker, Any]:
+    """Поля ограничения и объединения записей состояний."""
+
+    return {
+        vol.Optional(
+            CONF_TEMPERATURE_DEADBAND,
+            default=options.get(CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND),
+        ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        vol.Optional(
+            CONF_RSSI_DEADBAND,
+            default=options.get(CONF_RSSI_DEADBAND, DEFAULT_RSSI_DEADBAND),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Optional(
+            CONF_MIN_INTERVAL,
+            default=options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0)),
+        vol.Optional(
+            CONF_WRITE_WINDOW,
+            default=options.get(CONF_WRITE_WINDOW, DEFAULT_WRITE_WINDOW),
+        ): vol.All(vol.Coerce(float), vol.Range(min=0, max=10)),
+    }
+
+
+def _stale_timeouts_schema(
+    options: Mapping[str, Any], mtypes: Iterable[int]
+) -> dict[vol.Marker, Any]:
+    """Поля молчания до недоступности для типов счетчиков."""
+
+    return {
+        vol.Optional(
+            CONF_STALE_TIMEOUTS[mtype],
+            default=stale_timeout_option(options, mtype),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0))
+        for mtype in mtypes
+        if mtype in CONF_STALE_TIMEOUTS
+    }
+
+
+def _shared_sensors_schema(options: Mapping[str, Any]) -> dict[vol.Marker, Any]:
+    """Поля общих сенсоров интеграции."""
+
+    return {
+        vol.Optional(
+            CONF_PIPELINE_STATS,
+            default=options.get(CONF_PIPELINE_STATS, False),
+        ): bool,
+        vol.Optional(
+            CONF_FLEET_TOTALS,
+            default=options.get(CONF_FLEET_TOTALS, False),
+        ): bool,
+    }
@@ -1,21 +1,102 @@
-"""Constants for the Elehant integration."""
+"""Constants for the Elehant integration.
 
-from dataclasses import dataclass, field
+The module has no Home Assistant imports and is shared with the headless
+gateway, see gateway.py.
+"""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass
 from enum import IntEnum
-from typing import List, NamedTuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, List, NamedTuple
 
-from bleak.backends.device import BLEDevice
 import datetime as dTime
 import logging
+import time
+
+from .decoder import decode_packet
 
-import json
+if TYPE_CHECKING:
+    from bleak.backends.device import BLEDevice
 
 DOMAIN = "elehant"
+DATA_HUB = f"{DOMAIN}_hub"
+DATA_COALESCER = f"{DOMAIN}_coalescer"
+DATA_DISCOVERY = f"{DOMAIN}_discovery"
+DATA_SNAPSHOT = f"{DOMAIN}_snapshot"
+DATA_BILLING = f"{DOMAIN}_billing"
+DATA_FLEET = f"{DOMAIN}_fleet"
 _LOGGER = logging.getLogger(__name__)
 
 # Manufacurer id
 MANUFACTURER_ID = 65535
 
+# Количество последних пакетов в диагностике
+DIAGNOSTICS_PACKETS = 32
+
+# Количество записей истории показаний на счетчик
+HISTORY_SIZE = 1024
+
+# Копии пакета от разных прокси: окно отсева, секунды, коэффициент
+# сглаживания сигнала источника и время, после которого источник забывается
+DEDUP_WINDOW = 1.0
+SOURCE_RSSI_ALPHA = 0.2
+SOURCE_TIMEOUT = 300
+
+# Колесо таймеров молчания счетчиков: тик, секунды, и число ячеек
+STALE_TICK = 5
+STALE_WHEEL_SLOTS = 512
+
+EVENT_METER_SILENT = f"{DOMAIN}_meter_silent"
+EVENT_REPLAY_FINISHED = f"{DOMAIN}_replay_finished"
+
+# Бюджет приема пакетов всех счетчиков: пакетов в секунду (0 - без
+# ограничения), запас и интервал приема пакетов без изменений, секунды
+DEFAULT_INGEST_RATE = 100
+DEFAULT_INGEST_BURST = 200
+DEFAULT_UNCHANGED_INTERVAL = 30
+
+# Фильтр выбора счетчиков
+CONF_METER_TYPE = "meter_type"
+CONF_METER_MODEL = "meter_model"
+CONF_SERIAL_MIN = "serial_min"
+CONF_SERIAL_MAX = "serial_max"
+
+# Запись парка: много счетчиков в одной записи конфигурации, счетчики
+# парка и правила автодобавления хранятся в параметрах записи
+CONF_FLEET = "fleet"
+CONF_AUTO_ADOPT = "auto_adopt"
+FLEET_UNIQUE_ID = "fleet"
+
+# Файл записи объявлений в папке конфигурации
+CAPTURE_FILE = "elehant_capture.bin"
+
+# Выгрузка показаний для расчетов в папке конфигурации
+BILLING_FILE = "elehant_billing.csv"
+
+# Параметры записи состояний
+CONF_TEMPERATURE_DEADBAND = "temperature_deadband"
+CONF_RSSI_DEADBAND = "rssi_deadband"
+CONF_MIN_INTERVAL = "min_interval"
+CONF_WRITE_WINDOW = "write_window"
+CONF_STALE_TIMEOUT = "stale_timeout"
+CONF_PIPELINE_STATS = "pipeline_stats"
+CONF_FLEET_TOTALS = "fleet_totals"
+
+DEFAULT_TEMPERATURE_DEADBAND = 0.2
+DEFAULT_RSSI_DEADBAND = 5
+DEFAULT_MIN_INTERVAL = 60
+DEFAULT_WRITE_WINDOW = 0.25
+
+# Оценки расхода, секунды: окно и число его интервалов, постоянная
+# сглаживания, перерыв расхода и длительность непрерывного расхода для утечки
+FLOW_WINDOW = 3600
+FLOW_BUCKETS = 12
+FLOW_EWMA_TAU = 900
+LEAK_IDLE_GAP = 900
+LEAK_PERIOD = 6 * 3600
+
 
 class MeterType(IntEnum):
     GAS = 1
@@ -24,6 +105,31 @@ class MeterType(IntEnum):
     HEAT = 4
 
 
+METER_TYPE_NAMES = {
+    MeterType.GAS: "Газ",
+    MeterType.WATER: "Вода",
+    MeterType.ELECTRIC: "Электричество",
+    MeterType.HEAT: "Тепло",
+}
+
+# Молчание счетчика до недоступности, минуты; 0 - без ограничения
+DEFAULT_STALE_TIMEOUTS = {
+    MeterType.GAS: 60,
+    MeterType.WATER: 60,
+    MeterType.ELECTRIC: 60,
+    MeterType.HEAT: 180,
+}
+DEFAULT_STALE_TIMEOUT = 60
+
+# Параметры молчания по типу счетчика; CONF_STALE_TIMEOUT - общий срок
+# записей прежних версий
+CONF_STALE_TIMEOUTS = {
+    MeterType.GAS: "stale_timeout_gas",
+    MeterType.WATER: "stale_timeout_water",
+    MeterType.ELECTRIC: "stale_timeout_electric",
+    MeterType.HEAT: "stale_timeout_heat",
+}
+
 MeterModel = {
 	MeterType.GAS: [
             1, 2, 3, 4, 5, 16, 17, 18, 19, 20,
@@ -77,154 +183,235 @@ METER = {
 }
 
 
-@dataclass
+# Модели счетчиков горячей и холодной воды
+HOT_WATER_MODELS = (4, 6)
+COLD_WATER_MODELS = (3, 5)
+
+# Группы счетчиков для сумм показаний парка, сумма воды включает горячую и холодную
+GROUP_GAS = "gas"
+GROUP_WATER = "water"
+GROUP_HOT_WATER = "hot_water"
+GROUP_COLD_WATER = "cold_water"
+GROUP_ELECTRIC = "electric"
+GROUP_HEAT = "heat"
+
+METER_GROUPS = {
+    GROUP_GAS: MeterType.GAS,
+    GROUP_COLD_WATER: MeterType.WATER,
+    GROUP_HOT_WATER: MeterType.WATER,
+    GROUP_WATER: MeterType.WATER,
+    GROUP_ELECTRIC: MeterType.ELECTRIC,
+    GROUP_HEAT: MeterType.HEAT,
+}
+
+GROUP_PARENTS = {
+    GROUP_COLD_WATER: GROUP_WATER,
+    GROUP_HOT_WATER: GROUP_WATER,
+}
+
+
+class MeterTemplate(NamedTuple):
+    """Заготовка имени устройства и модели и группа для пары тип-модель."""
+
+    name: str
+    name_model: str
+    group: str
+
+
+def _meter_template(mtype: int, model: int, name_model: str) -> MeterTemplate:
+    name = "Счетчик "
+    name_model_post = ""
+    group = {
+        MeterType.GAS: GROUP_GAS,
+        MeterType.WATER: GROUP_WATER,
+        MeterType.ELECTRIC: GROUP_ELECTRIC,
+        MeterType.HEAT: GROUP_HEAT,
+    }[mtype]
+
+    if mtype == MeterType.GAS:
+        name += "газа "
+    if mtype == MeterType.WATER:
+        name += "воды "
+        if model in HOT_WATER_MODELS:
+            name += "горячей "
+            name_model_post = " ГОРЯЧАЯ"
+            group = GROUP_HOT_WATER
+        if model in COLD_WATER_MODELS:
+            name += "холодной "
+            name_model_post = " ХОЛОДНАЯ"
+            group = GROUP_COLD_WATER
+    if mtype == MeterType.ELECTRIC:
+        name += "электричества "
+    if mtype == MeterType.HEAT:
+        name += "тепла "
+
+    return MeterTemplate(name + name_model + ": ", name_model + name_model_post, group)
+
+
+METER_TEMPLATES: dict[tuple[int, int], MeterTemplate] = {
+    (mtype, model): _meter_template(mtype, model, name_model)
+    for key, name_model in METER.items()
+    for mtype, model in [map(int, key.split("-"))]
+}
+
+
+@dataclass(frozen=True)
 class MacData:
     mtype: int = None
     model: int = None
     signValid: bool = False
 
 
-@dataclass
-class ElehantData:
+MAC_INVALID = MacData()
 
-    device: BLEDevice = None
-    name: str = None
+# Размер кэша parse_mac по адресам
+MAC_CACHE_SIZE = 4096
 
-    meter_reading: str = None
-    temperature: str = None
-    rssi: str = None
-    battery: int = None
-    timestamp: dTime.datetime = None
+# Индекс "b0:<модель>:<тип>" -> MacData для всех известных счетчиков
+MAC_INDEX: dict[str, MacData] = {}
+for _mtype, _models in MeterModel.items():
+    for _model in _models:
+        _key = f"b0:{_model:02x}:{_mtype:02x}"
+        MAC_INDEX[_key] = MAC_INDEX[_key.upper()] = MacData(int(_mtype), _model, True)
 
-    id_meter: str = None
-    mtype: int = None
-    model: int = None
-    name_model: str = None
-    frimware: str = None
-    packetVer: int = None
-
-    macdata: MacData = None
-
-    def __init__(self, device=None, ad_data=None):
-        _LOGGER.debug("ElehantData init")
-        if device and ad_data:
-            self.device = device
-            mac = device.address.lower()
-            
-
-            has_manufacurer_data = MANUFACTURER_ID in ad_data.manufacturer_data
-
-            self.macdata = parse_mac(mac)
-
-            if self.macdata.signValid:
-                self.macdata.signValid = False
-
-                raw_bytes = ad_data.manufacturer_data[MANUFACTURER_ID]
-                packetVer = int.from_bytes(raw_bytes[3:4], byteorder="little")
-                
-                _LOGGER.debug("Версия пакета: %s", packetVer)
-
-                if has_manufacurer_data and packetVer == 1:
-                    v_num = int.from_bytes(raw_bytes[6:9], byteorder='little')
-                    v_count = int.from_bytes(raw_bytes[9:13], byteorder='little')
-                    v_temp = int.from_bytes(raw_bytes[14:16], byteorder="little")
-                    v_battery = int.from_bytes(raw_bytes[13:14], byteorder="little")
-                    
-                    v_mtype = int.from_bytes(raw_bytes[4:5], byteorder="little")
-                    v_model = int.from_bytes(raw_bytes[5:6], byteorder="little")
-                    
-                    v_fw = int.from_bytes(raw_bytes[16:17], byteorder="little")
-
-                    if v_mtype == self.macdata.mtype and v_model == self.macdata.model:
-                        
-                        name_model_post: str = ""
-
-                        v_count = v_count/10000
-                        v_temp = v_temp/100
-                        v_battery = min(v_battery, 100)
-
-                        key_name = str(v_mtype) + "-" + str(v_model)
-                        v_name_model = METER[key_name]
-
-                        self.name = "Счетчик "
-                        if v_mtype == MeterType.GAS:
-                            self.name += "газа "
-                        if v_mtype == MeterType.WATER:
-                            self.name += "воды "
-                            if v_model == 4 or v_model == 6:
-                                self.name += "горячей "
-                                name_model_post= " ГОРЯЧАЯ"
-                            if v_model == 3 or v_model == 5:
-                                self.name += "холодной "
-                                name_model_post= " ХОЛОДНАЯ"
-
-                        if v_mtype == MeterType.ELECTRIC:
-                            self.name += "электричества "
-                        if v_mtype == MeterType.HEAT:
-                            self.name += "тепла "
-
-
-                        v_num = '{:07}'.format(v_num)
-                        self.name += v_name_model + ": " + v_num
-
-                        self.id_meter = v_num
-                        self.name_model = v_name_model+name_model_post
-                        self.meter_reading = str(v_count)
-                        self.temperature = str(v_temp)
-                        self.battery = v_battery
-                        self.mtype = v_mtype
-                        self.model = v_model
-                        self.frimware = v_fw/10
-                        self.rssi = ad_data.rssi
-
-                        self.timestamp = dTime.datetime.now(dTime.UTC)
-
-                        self.macdata.signValid = True
-
-
-                        _LOGGER.debug("Имя устройства: %s", self.name)
-                        _LOGGER.debug("MAC: %s", mac)
-                        _LOGGER.debug("ID: %s", self.id_meter)
-                        _LOGGER.debug("Модель: %s", self.name_model)
-                        _LOGGER.debug("Показания: %s", self.meter_reading)
-                        _LOGGER.debug("Температура: %s", self.temperature)
-                        _LOGGER.debug("Батарея: %s", self.battery)
-                        _LOGGER.debug("Сигнал: %s", self.rssi)
-                        _LOGGER.debug("Отметка времени: %s", self.timestamp)
-
-                        _LOGGER.debug("Тип мас: %s", self.mtype)
-                        _LOGGER.debug("Модель мас: %s", self.model)
-                        _LOGGER.debug("Версия прошивки: %s", self.frimware)
-
-                else:
-                    self.macdata.signValid = False
-                    _LOGGER.debug(
-                        "ElehantData init - не пройдена проверка по производителю или версии пакета MAC %s", mac)
-        else:
-            self.macdata.signValid = False
-            _LOGGER.debug(
-                "ElehantData init - не пройдена, device или ad_data пустые")
 
+class _ElehantFields(NamedTuple):
+    address: str | None = None
+    macdata: MacData = MAC_INVALID
+    template: MeterTemplate | None = None
+    serial: int | None = None
+    count: int | None = None
+    raw_temperature: int | None = None
+    battery: int | None = None
+    fw: int | None = None
+    packet_ver: int | None = None
+    # Причина отказа для недействительного пакета: mac, payload, mismatch
+    reject: str | None = None
+    rssi: int | None = None
+    time: float | None = None
+
+
+_tuple_new = tuple.__new__
+
+
+class ElehantData(_ElehantFields):
+    """Показания пакета счетчика, неизменяемый кортеж.
+
+    BLEDevice и объявление не сохраняются, только адрес и числа пакета.
+    Имена берутся из общей для модели MeterTemplate, строковые значения
+    сенсоров вычисляются при чтении. Сигнал и время пакета меняет seen().
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls, device: BLEDevice | None = None, ad_data=None, macdata: MacData | None = None
+    ) -> ElehantData:
+        if not (device and ad_data):
+            return _tuple_new(cls, _INVALID)
 
+        mac = device.address
+        if macdata is None:
+            macdata = parse_mac(mac)
+        if not macdata.signValid:
+            return _tuple_new(cls, (mac, MAC_INVALID, *_INVALID[2:9], "mac", None, None))
+
+        raw_bytes = ad_data.manufacturer_data.get(MANUFACTURER_ID)
+        packet = decode_packet(raw_bytes) if raw_bytes is not None else None
+
+        if packet is None:
+            reject = "payload"
+        elif packet.mtype != macdata.mtype or packet.model != macdata.model:
+            reject = "mismatch"
+        else:
+            return _tuple_new(
+                cls,
+                (
+                    mac,
+                    macdata,
+                    METER_TEMPLATES[packet.mtype, packet.model],
+                    packet.num,
+                    packet.count,
+                    packet.temp,
+                    min(packet.battery, 100),
+                    packet.fw,
+                    packet.packet_ver,
+                    None,
+                    ad_data.rssi,
+                    time.time(),
+                ),
+            )
+        return _tuple_new(cls, (mac, MAC_INVALID, *_INVALID[2:9], reject, None, None))
+
+    def seen(self, rssi: int | None, when: float) -> ElehantData:
+        """Те же показания с сигналом и временем другого пакета."""
+        return _tuple_new(type(self), (*self[:10], rssi, when))
+
+    @property
+    def mtype(self) -> int | None:
+        return self.macdata.mtype
+
+    @property
+    def model(self) -> int | None:
+        return self.macdata.model
+
+    @property
+    def id_meter(self) -> str | None:
+        return f"{self.serial:07}" if self.serial is not None else None
+
+    @property
+    def name(self) -> str | None:
+        return self.template.name + self.id_meter if self.template else None
+
+    @property
+    def name_model(self) -> str | None:
+        return self.template.name_model if self.template else None
+
+    @property
+    def meter_reading(self) -> str | None:
+        return str(self.count / 10000) if self.count is not None else None
+
+    @property
+    def temperature(self) -> str | None:
+        return str(self.raw_temperature / 100) if self.raw_temperature is not None else None
+
+    @property
+    def frimware(self) -> float | None:
+        return self.fw / 10 if self.fw is not None else None
+
+    @property
+    def packetVer(self) -> int | None:
+        return self.packet_ver
+
+    @property
+    def timestamp(self) -> dTime.datetime | None:
+        return dTime.datetime.fromtimestamp(self.time, dTime.UTC) if self.time is not None else None
+
+
+_INVALID = tuple(_ElehantFields())
+
+
+@lru_cache(maxsize=MAC_CACHE_SIZE)
 def parse_mac(in_mac) -> MacData:
-    result = MacData(None, None, False)
+    """Классификация адреса, MacData общие и неизменяемые."""
+
     mac = str(in_mac)
 
-    _LOGGER.debug("parse_mac: %s", mac)
+    # B1 - данные не расшифрованы, остальные - не Элехант
+    if mac[0:2] not in ("b0", "B0"):
+        return MAC_INVALID
 
-    if mac[0:2] == "b0":
-        result.mtype = int(mac[6:8], 16)
-        result.model = int(mac[3:5], 16)
+    return MAC_INDEX.get(mac[0:8], MAC_INVALID)
 
-        if (result.mtype == MeterType.GAS and result.model in MeterModel[MeterType.GAS]) or (result.mtype == MeterType.WATER and result.model in MeterModel[MeterType.WATER]):
-            result.signValid = True
-    else:
-        if mac[0:2] == "b1":
-            _LOGGER.debug(
-                "parse_mac Устройство Елехант (B1). Данные не расшифрованны, игнорирование, результат: %s", mac[0:2])
-        else:
-            _LOGGER.debug(
-                "parse_mac Устройство не Елехант только (B0 или В1) , результат: %s", mac[0:2])
 
-    _LOGGER.debug("parse_mac signValid: %s", result.signValid)
-    return result
\ No newline at end of file
+def default_stale_timeout(address: str) -> int:
+    """Молчание до недоступности по умолчанию для типа счетчика, минуты."""
+    return DEFAULT_STALE_TIMEOUTS.get(parse_mac(address).mtype, DEFAULT_STALE_TIMEOUT)
+
+
+def stale_timeout_option(options: Mapping[str, Any], mtype: int) -> int:
+    """Молчание до недоступности для типа счетчика из параметров записи, минуты."""
+
+    if (key := CONF_STALE_TIMEOUTS.get(mtype)) is not None and key in options:
+        return options[key]
+    return options.get(CONF_STALE_TIMEOUT, DEFAULT_STALE_TIMEOUTS.get(mtype, DEFAULT_STALE_TIMEOUT))
@@ -0,0 +1,95 @@
+"""Декодер пакетов производителя Элехант."""
+from __future__ import annotations
+
+from struct import Struct
+from typing import Callable, NamedTuple
+
+# Смещение байта версии пакета в данных производителя
+PACKET_VER_OFFSET = 3
+
+
+class RawPacket(NamedTuple):
+    """Поля пакета без преобразования единиц."""
+
+    packet_ver: int
+    mtype: int
+    model: int
+    num: int
+    count: int
+    battery: int
+    temp: int
+    fw: int
+
+
+PacketDecoder = Callable[[bytes], "RawPacket | None"]
+
+SerialReader = Callable[[bytes], "int | None"]
+
+PACKET_DECODERS: dict[int, PacketDecoder] = {}
+PACKET_SERIALS: dict[int, SerialReader] = {}
+
+
+def register_packet(
+    packet_ver: int, serial: SerialReader | None = None
+) -> Callable[[PacketDecoder], PacketDecoder]:
+    """Регистрация декодера и чтения номера счетчика для версии пакета."""
+
+    def _register(decoder: PacketDecoder) -> PacketDecoder:
+        PACKET_DECODERS[packet_ver] = decoder
+        if serial is not None:
+            PACKET_SERIALS[packet_ver] = serial
+        return decoder
+
+    return _register
+
+
+# Версия 1:
+#  [3] версия, [4] тип, [5] модель, [6:9] номер, [9:13] показания,
+#  [13] батарея, [14:16] температура, [16] прошивка
+_PACKET_V1 = Struct("<3xBBBHBIBHB")
+_unpack_v1 = _PACKET_V1.unpack_from
+_SIZE_V1 = _PACKET_V1.size
+_unpack_serial_v1 = Struct("<6xHB").unpack_from
+
+
+def _serial_v1(raw: bytes) -> int | None:
+    if len(raw) < _SIZE_V1:
+        return None
+
+    num_lo, num_hi = _unpack_serial_v1(raw)
+    return num_lo | num_hi << 16
+
+
+@register_packet(1, serial=_serial_v1)
+def _decode_v1(raw: bytes) -> RawPacket | None:
+    if len(raw) < _SIZE_V1:
+        return None
+
+    ver, mtype, model, num_lo, num_hi, count, battery, temp, fw = _unpack_v1(raw)
+    return RawPacket(ver, mtype, model, num_lo | num_hi << 16, count, battery, temp, fw)
+
+
+def decode_packet(raw: bytes) -> RawPacket | None:
+    """Разбор данных производителя, None для неизвестной версии пакета."""
+
+    if len(raw) <= PACKET_VER_OFFSET:
+        return None
+
+    decoder = PACKET_DECODERS.get(raw[PACKET_VER_OFFSET])
+    if decoder is None:
+        return None
+
+    return decoder(raw)
+
+
+def packet_serial(raw: bytes) -> int | None:
+    """Номер счетчика без полного разбора пакета."""
+
+    if len(raw) <= PACKET_VER_OFFSET:
+        return None
+
+    reader = PACKET_SERIALS.get(raw[PACKET_VER_OFFSET])
+    if reader is None:
+        return None
+
+    return reader(raw)
@@ -0,0 +1,111 @@
+"""Отсев копий пакета, принятых несколькими прокси Bluetooth."""
+from __future__ import annotations
+
+from .const import DEDUP_WINDOW, SOURCE_RSSI_ALPHA, SOURCE_TIMEOUT
+
+
+class SourceStats:
+    """Сглаженный сигнал счетчика на одном источнике."""
+
+    __slots__ = ("rssi", "time", "packets")
+
+    def __init__(self, rssi: int, time: float) -> None:
+        self.rssi = float(rssi)
+        self.time = time
+        self.packets = 1
+
+
+class _AddressState:
+    __slots__ = ("payload", "time", "sources", "duplicates", "best")
+
+    def __init__(self) -> None:
+        self.payload: bytes | None = None
+        self.time = float("-inf")
+        self.sources: dict[str, SourceStats] = {}
+        self.duplicates = 0
+        self.best: tuple[str, int] | None = None
+
+
+class Deduplicator:
+    """Первая копия пакета проходит, копии того же пакета в течение окна отсеиваются.
+
+    Сигнал учитывается по всем копиям: для каждого источника хранится
+    экспоненциальное среднее, лучший источник выбирается при приеме пакета.
+    """
+
+    def __init__(
+        self,
+        window: float = DEDUP_WINDOW,
+        alpha: float = SOURCE_RSSI_ALPHA,
+        source_timeout: float = SOURCE_TIMEOUT,
+    ) -> None:
+        self.window = window
+        self.alpha = alpha
+        self.source_timeout = source_timeout
+        self.accepted = 0
+        self.duplicates = 0
+        self._addresses: dict[str, _AddressState] = {}
+
+    def accept(
+        self, address: str, payload: bytes | None, source: str | None, rssi: int, now: float
+    ) -> bool:
+        """Нужно ли обрабатывать пакет; now - монотонное время приема."""
+
+        if (state := self._addresses.get(address)) is None:
+            state = self._addresses[address] = _AddressState()
+
+        source = source or ""
+        if (stats := state.sources.get(source)) is None:
+            state.sources[source] = SourceStats(rssi, now)
+        else:
+            stats.rssi += self.alpha * (rssi - stats.rssi)
+            stats.time = now
+            stats.packets += 1
+
+        if payload == state.payload and now - state.time < self.window:
+            state.duplicates += 1
+            self.duplicates += 1
+            return False
+
+        state.payload = payload
+        state.time = now
+        state.best = self._best(state, now)
+        self.accepted += 1
+        return True
+
+    def best(self, address: str) -> tuple[str, int] | None:
+        """Лучший источник счетчика и его сглаженный сигнал."""
+
+        if (state := self._addresses.get(address)) is None:
+            return None
+        return state.best
+
+    def sources(self, address: str) -> dict[str, SourceStats]:
+        """Статистика источников счетчика."""
+
+        if (state := self._addresses.get(address)) is None:
+            return {}
+        return state.sources
+
+    def address_duplicates(self, address: str) -> int:
+        """Отсеянные копии пакетов счетчика."""
+
+        if (state := self._addresses.get(address)) is None:
+            return 0
+        return state.duplicates
+
+    def forget(self, address: str) -> None:
+        """Удалить состояние счетчика."""
+        self._addresses.pop(address, None)
+
+    def _best(self, state: _AddressState, now: float) -> tuple[str, int] | None:
+        best: tuple[str, int] | None = None
+        best_rssi = float("-inf")
+        for source, stats in list(state.sources.items()):
+            if now - stats.time > self.source_timeout:
+                # Источник давно не принимал счетчик
+                del state.sources[source]
+            elif stats.rssi > best_rssi:
+                best_rssi = stats.rssi
+                best = (source, round(stats.rssi))
+        return best
@@ -0,0 +1,105 @@
+"""Diagnostics support for Elehant."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from . import ElehantCoordinator
+from .coalesce import async_get_coalescer
+from .const import CONF_AUTO_ADOPT, CONF_FLEET, DATA_FLEET, DOMAIN
+from .fleet import ElehantFleet
+from .hub import async_get_hub
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+
+    hub = async_get_hub(hass)
+    coalescer = async_get_coalescer(hass)
+    scheduler = hub.scheduler
+    shared = {
+        "state_writes": {
+            "requested": coalescer.requested,
+            "written": coalescer.written,
+            "flushes": coalescer.flushes,
+            "throttled": coalescer.throttled,
+            "merge_ratio": round(coalescer.merge_ratio, 4),
+        },
+        "pipeline": {
+            **hub.stats.as_dict(),
+            "write": coalescer.write_stats.as_dict(),
+        },
+        "ingest": {
+            "rate": scheduler.rate,
+            "burst": scheduler.burst,
+            "unchanged_interval": scheduler.unchanged_interval,
+            "admitted": scheduler.admitted,
+            "deferred": scheduler.deferred,
+            "superseded": scheduler.superseded,
+            "pending": scheduler.pending,
+            "dropped": dict(scheduler.dropped),
+        },
+    }
+
+    if entry.data.get(CONF_FLEET):
+        fleet: ElehantFleet = hass.data[DATA_FLEET]
+        return {
+            "fleet": {
+                "meters": len(fleet.coordinators),
+                "auto_adopt": entry.options.get(CONF_AUTO_ADOPT, False),
+                "adopted": fleet.adopted,
+            },
+            **shared,
+            "meters": {
+                address: _coordinator_diagnostics(coordinator)
+                for address, coordinator in fleet.coordinators.items()
+            },
+        }
+
+    coordinator: ElehantCoordinator = hass.data[DOMAIN][entry.entry_id]
+    diagnostics = _coordinator_diagnostics(coordinator)
+    packets = diagnostics.pop("packets")
+    shared["state_writes"] = {"window": coordinator.write_window, **shared["state_writes"]}
+    return {**diagnostics, **shared, "packets": packets}
+
+
+def _coordinator_diagnostics(coordinator: ElehantCoordinator) -> dict[str, Any]:
+    cache = coordinator.cache
+    dedup = coordinator.hub.dedup
+
+    return {
+        "address": coordinator.address,
+        "available": coordinator.available,
+        "stale": coordinator.stale,
+        "history": {
+            "size": coordinator.history.size,
+            "readings": len(coordinator.history),
+        },
+        "cache": {
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "hit_rate": round(cache.hit_rate, 4),
+        },
+        "sources": {
+            "best": dedup.best(coordinator.address),
+            "duplicates": dedup.address_duplicates(coordinator.address),
+            "rssi": {
+                source: {"rssi": round(stats.rssi, 1), "packets": stats.packets}
+                for source, stats in dedup.sources(coordinator.address).items()
+            },
+        },
+        "packets": [
+            {
+                "time": dt_util.utc_from_timestamp(record.time).isoformat(),
+                "rssi": record.rssi,
+                "source": record.source,
+                "data": record.payload.hex().upper() if record.payload else None,
+            }
+            for record in coordinator.packets
+        ],
+    }
@@ -0,0 +1,170 @@
+"""Фильтр обнаружения счетчиков Элехант."""
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Any
+
+from homeassistant.components.bluetooth.models import BluetoothServiceInfoBleak
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.singleton import singleton
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_DISCOVERY, DOMAIN, MANUFACTURER_ID, parse_mac
+from .decoder import packet_serial
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.discovery"
+SAVE_DELAY = 10
+
+# Причины отказа, совпадают с причинами прерывания мастера настройки
+REASON_DISMISSED = "dismissed"
+REASON_WEAK_SIGNAL = "weak_signal"
+REASON_FILTERED = "filtered"
+REASON_NOT_SUPPORTED = "not_supported"
+
+
+def parse_serial_ranges(value: str | None) -> list[tuple[int, int]]:
+    """Диапазоны номеров вида "100-200, 345", отсортированные и объединенные."""
+
+    ranges = []
+    for part in (value or "").replace(";", ",").split(","):
+        if not (part := part.strip()):
+            continue
+        start, _, end = part.partition("-")
+        start_num = int(start)
+        end_num = int(end) if end.strip() else start_num
+        ranges.append((min(start_num, end_num), max(start_num, end_num)))
+
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def format_serial_ranges(ranges: list[tuple[int, int]]) -> str:
+    return ", ".join(f"{start}-{end}" if start != end else str(start) for start, end in ranges)
+
+
+class _SerialRanges:
+    """Поиск номера в непересекающихся диапазонах."""
+
+    __slots__ = ("ranges", "_starts")
+
+    def __init__(self, ranges: list[tuple[int, int]]) -> None:
+        self.ranges = ranges
+        self._starts = [start for start, _ in ranges]
+
+    def __bool__(self) -> bool:
+        return bool(self.ranges)
+
+    def __contains__(self, serial: int) -> bool:
+        index = bisect_right(self._starts, serial) - 1
+        return index >= 0 and serial <= self.ranges[index][1]
+
+
+class DiscoveryFilter:
+    """Списки допуска и отказа для обнаружения, проверяются до разбора пакета."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self.dismissed: set[str] = set()
+        self.allow_types: frozenset[int] = frozenset()
+        self.deny_types: frozenset[int] = frozenset()
+        self.allow_serials = _SerialRanges([])
+        self.deny_serials = _SerialRanges([])
+        self.min_rssi: int | None = None
+
+    async def async_load(self) -> None:
+        """Загрузка сохраненных правил и отклоненных счетчиков."""
+
+        if (data := await self._store.async_load()) is None:
+            return
+        self.dismissed = set(data.get("dismissed", []))
+        self._set_rules(data.get("rules", {}))
+
+    @callback
+    def async_reject_reason(self, service_info: BluetoothServiceInfoBleak) -> str | None:
+        """Причина отказа в обнаружении или None."""
+
+        address = service_info.address
+        if address in self.dismissed:
+            return REASON_DISMISSED
+
+        if self.min_rssi is not None and service_info.rssi < self.min_rssi:
+            return REASON_WEAK_SIGNAL
+
+        macdata = parse_mac(address)
+        if not macdata.signValid:
+            return REASON_NOT_SUPPORTED
+        if (self.allow_types and macdata.mtype not in self.allow_types) or macdata.mtype in self.deny_types:
+            return REASON_FILTERED
+
+        if self.allow_serials or self.deny_serials:
+            raw_bytes = service_info.manufacturer_data.get(MANUFACTURER_ID)
+            serial = packet_serial(raw_bytes) if raw_bytes is not None else None
+            if serial is None:
+                return REASON_NOT_SUPPORTED
+            if (self.allow_serials and serial not in self.allow_serials) or serial in self.deny_serials:
+                return REASON_FILTERED
+
+        return None
+
+    @callback
+    def async_set_rules(self, rules: dict[str, Any]) -> None:
+        """Замена правил фильтра."""
+        self._set_rules(rules)
+        self._async_schedule_save()
+
+    @callback
+    def async_dismiss(self, address: str) -> None:
+        """Запомнить отклоненный счетчик."""
+        if address not in self.dismissed:
+            self.dismissed.add(address)
+            self._async_schedule_save()
+
+    @callback
+    def async_restore(self, address: str | None = None) -> None:
+        """Забыть отклоненный счетчик, без адреса - все."""
+        if address is None:
+            self.dismissed.clear()
+        else:
+            self.dismissed.discard(address)
+        self._async_schedule_save()
+
+    @property
+    def rules(self) -> dict[str, Any]:
+        """Текущие правила в формате хранения."""
+        return {
+            "allow_types": sorted(self.allow_types),
+            "deny_types": sorted(self.deny_types),
+            "allow_serials": format_serial_ranges(self.allow_serials.ranges),
+            "deny_serials": format_serial_ranges(self.deny_serials.ranges),
+            "min_rssi": self.min_rssi,
+        }
+
+    def _set_rules(self, rules: dict[str, Any]) -> None:
+        self.allow_types = frozenset(int(mtype) for mtype in rules.get("allow_types", []))
+        self.deny_types = frozenset(int(mtype) for mtype in rules.get("deny_types", []))
+        self.allow_serials = _SerialRanges(parse_serial_ranges(rules.get("allow_serials")))
+        self.deny_serials = _SerialRanges(parse_serial_ranges(rules.get("deny_serials")))
+        self.min_rssi = rules.get("min_rssi")
+
+    @callback
+    def _async_schedule_save(self) -> None:
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        return {"dismissed": sorted(self.dismissed), "rules": self.rules}
+
+
+@singleton(DATA_DISCOVERY)
+async def async_get_discovery_filter(hass: HomeAssistant) -> DiscoveryFilter:
+    """Общий фильтр обнаружения, загружается при первом обращении."""
+
+    discovery_filter = DiscoveryFilter(hass)
+    await discovery_filter.async_load()
+    return discovery_filter
@@ -0,0 +1,185 @@
+"""Потоковые оценки расхода по показаниям счетчика Элехант.
+
+Состояние каждой оценки не зависит от длины истории: кольцо из
+FLOW_BUCKETS отсчетов для скользящего окна и несколько чисел для
+экспоненциального среднего и поиска утечки.
+"""
+from __future__ import annotations
+
+from array import array
+import math
+
+from .const import (
+    FLOW_BUCKETS,
+    FLOW_EWMA_TAU,
+    FLOW_WINDOW,
+    LEAK_IDLE_GAP,
+    LEAK_PERIOD,
+)
+
+# Единиц счетчика в единице показаний
+COUNT_SCALE = 10000
+
+_HOUR = 3600
+
+
+class FlowEstimator:
+    """Расход за скользящее окно, сглаженный расход и непрерывный минимальный расход.
+
+    Расход - в единицах показаний в час. Утечка - расход, который не
+    прерывался на LEAK_IDLE_GAP в течение LEAK_PERIOD; leak_flow - наименьший
+    расход за отсчет окна в этот период, 0 если утечки нет.
+    """
+
+    __slots__ = (
+        "window",
+        "tau",
+        "idle_gap",
+        "leak_period",
+        "_width",
+        "_times",
+        "_counts",
+        "_bucket",
+        "_last_time",
+        "_last_count",
+        "_last_change",
+        "_ewma",
+        "_flow_since",
+        "_min_rate",
+    )
+
+    def __init__(
+        self,
+        window: float = FLOW_WINDOW,
+        buckets: int = FLOW_BUCKETS,
+        tau: float = FLOW_EWMA_TAU,
+        idle_gap: float = LEAK_IDLE_GAP,
+        leak_period: float = LEAK_PERIOD,
+    ) -> None:
+        self.window = window
+        self.tau = tau
+        self.idle_gap = idle_gap
+        self.leak_period = leak_period
+        self._width = window / buckets
+        # Первый отсчет каждого интервала окна, nan - интервал пуст
+        self._times = array("d", [math.nan]) * buckets
+        self._counts = array("q", [0]) * buckets
+        self._bucket = -1
+        self._last_time: float | None = None
+        self._last_count = 0
+        self._last_change = 0.0
+        self._ewma = 0.0
+        self._flow_since: float | None = None
+        self._min_rate = math.inf
+
+    def update(self, count: int, now: float) -> None:
+        """Новый отсчет счетчика count в момент now, секунды."""
+
+        last_time = self._last_time
+        if last_time is None:
+            self._last_time = self._last_change = now
+            self._last_count = count
+            self._start_bucket(count, now)
+            return
+
+        dt = now - last_time
+        if dt <= 0:
+            return
+
+        delta = count - self._last_count
+        if delta < 0:
+            # Замена или сброс счетчика, оценки начинаются заново
+            self.reset()
+            self.update(count, now)
+            return
+
+        # Среднее по времени для кусочно-постоянного расхода
+        alpha = 1 - math.exp(-dt / self.tau)
+        self._ewma += alpha * (delta / dt * _HOUR - self._ewma)
+
+        if delta:
+            if now - self._last_change >= self.idle_gap:
+                self._flow_since = now
+                self._min_rate = math.inf
+            elif self._flow_since is None:
+                self._flow_since = self._last_change
+                self._min_rate = math.inf
+            self._last_change = now
+        elif now - self._last_change >= self.idle_gap:
+            self._flow_since = None
+
+        self._last_time = now
+        self._last_count = count
+
+        if int(now // self._width) != self._bucket:
+            self._close_bucket(count, now)
+            self._start_bucket(count, now)
+
+    def reset(self) -> None:
+        """Сброс состояния."""
+        self.__init__(self.window, len(self._times), self.tau, self.idle_gap, self.leak_period)
+
+    @property
+    def rate(self) -> float | None:
+        """Расход за окно в единицах показаний в час."""
+
+        if self._last_time is None:
+            return None
+
+        now = self._last_time
+        times = self._times
+        size = len(times)
+        start = self._bucket % size
+        # Самый старый отсчет в пределах окна
+        for step in range(1, size + 1):
+            index = (start + step) % size
+            first = times[index]
+            if first == first and now - first <= self.window:
+                break
+        else:
+            return None
+
+        if (elapsed := now - first) <= 0:
+            return 0.0
+        return round((self._last_count - self._counts[index]) / COUNT_SCALE / elapsed * _HOUR, 4)
+
+    @property
+    def rate_average(self) -> float | None:
+        """Экспоненциально сглаженный расход в единицах показаний в час."""
+        if self._last_time is None:
+            return None
+        return round(self._ewma / COUNT_SCALE, 4)
+
+    @property
+    def leak(self) -> bool:
+        """Расход не прерывался LEAK_PERIOD."""
+        return (
+            self._flow_since is not None
+            and self._last_time is not None
+            and self._last_time - self._flow_since >= self.leak_period
+        )
+
+    @property
+    def leak_flow(self) -> float | None:
+        """Непрерывный минимальный расход при утечке, 0 без утечки."""
+
+        if self._last_time is None:
+            return None
+        if not self.leak or self._min_rate == math.inf:
+            return 0.0
+        return round(self._min_rate / COUNT_SCALE * _HOUR, 4)
+
+    def _start_bucket(self, count: int, now: float) -> None:
+        self._bucket = int(now // self._width)
+        index = self._bucket % len(self._times)
+        self._times[index] = now
+        self._counts[index] = count
+
+    def _close_bucket(self, count: int, now: float) -> None:
+        if self._flow_since is None:
+            return
+        index = self._bucket % len(self._times)
+        started = self._times[index]
+        if started < self._flow_since or (elapsed := now - started) <= 0:
+            return
+        self._min_rate = min(self._min_rate, (count - self._counts[index]) / elapsed)
@@ -0,0 +1,202 @@
+"""Выгрузка показаний счетчиков Элехант для расчетов.
+
+Файл выгрузки - CSV с заголовком COLUMNS, по строке на счетчик в каждой
+выгрузке. Строки дописываются в конец файла, при превышении размера файл
+переименовывается, как файл записи объявлений.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable
+import csv
+from datetime import date, datetime, timedelta
+import logging
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_point_in_utc_time
+from homeassistant.helpers.singleton import singleton
+from homeassistant.helpers.storage import Store
+import homeassistant.util.dt as dt_util
+
+from .capture import rotate_file
+from .const import BILLING_FILE, DATA_BILLING, DOMAIN
+
+if TYPE_CHECKING:
+    from . import ElehantCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.billing"
+
+PERIOD_OFF = "off"
+PERIOD_HOURLY = "hourly"
+PERIOD_DAILY = "daily"
+PERIOD_MONTHLY = "monthly"
+PERIODS = (PERIOD_OFF, PERIOD_HOURLY, PERIOD_DAILY, PERIOD_MONTHLY)
+
+DEFAULT_PERIOD = PERIOD_OFF
+DEFAULT_MAX_SIZE = 10
+DEFAULT_BACKUPS = 12
+
+COLUMNS = ("period", "address", "id_meter", "mtype", "name_model", "meter_reading", "received")
+
+
+def next_boundary(period: str, now: datetime) -> datetime | None:
+    """Начало следующего периода после now по местному времени."""
+
+    now = dt_util.as_local(now)
+    if period == PERIOD_HOURLY:
+        return dt_util.as_utc(now).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    if period == PERIOD_DAILY:
+        return dt_util.start_of_local_day(now.date() + timedelta(days=1))
+    if period == PERIOD_MONTHLY:
+        year, month = (now.year + 1, 1) if now.month == 12 else (now.year, now.month + 1)
+        return dt_util.start_of_local_day(date(year, month, 1))
+    return None
+
+
+class BillingWriter:
+    """Дозапись строк выгрузки с ротацией по размеру, вызывается вне цикла событий."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def write(self, rows: Iterable[tuple]) -> None:
+        """Дописать строки, в новый файл сначала пишется заголовок."""
+
+        with open(self.path, "a", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            if file.tell() == 0:
+                writer.writerow(COLUMNS)
+            writer.writerows(rows)
+            size = file.tell()
+        if size >= self.max_bytes:
+            rotate_file(self.path, self.backups)
+
+
+class BillingExporter:
+    """Выгрузка последних показаний всех счетчиков по расписанию и по запросу.
+
+    Показания снимаются в обработчике таймера в момент начала периода,
+    запись на диск выполняется в потоке исполнителя по порядку снимков.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self.period = DEFAULT_PERIOD
+        self.max_size = DEFAULT_MAX_SIZE
+        self.backups = DEFAULT_BACKUPS
+        self.next_export: datetime | None = None
+        self._writer = self._build_writer()
+        self._write_lock = asyncio.Lock()
+        self._unsub: CALLBACK_TYPE | None = None
+
+    async def async_load(self) -> None:
+        """Загрузка сохраненного расписания и запуск таймера."""
+
+        if (data := await self._store.async_load()) is not None:
+            self.period = data.get("period", DEFAULT_PERIOD)
+            self.max_size = data.get("max_size", DEFAULT_MAX_SIZE)
+            self.backups = data.get("backups", DEFAULT_BACKUPS)
+            self._writer = self._build_writer()
+        self._async_schedule()
+
+    @callback
+    def async_configure(self, period: str, max_size: int, backups: int) -> None:
+        """Новое расписание и ротация файла."""
+
+        self.period = period
+        self.max_size = max_size
+        self.backups = backups
+        self._writer = self._build_writer()
+        self._store.async_delay_save(self._data_to_save)
+        self._async_schedule()
+
+    async def async_export(self) -> int:
+        """Выгрузка показаний сейчас, возвращает число строк."""
+
+        rows = self._async_snapshot(dt_util.now())
+        await self._async_write(rows)
+        return len(rows)
+
+    @callback
+    def async_stop(self) -> None:
+        """Остановить расписание."""
+
+        if self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+        self.next_export = None
+
+    @callback
+    def _async_schedule(self) -> None:
+        self.async_stop()
+        if (boundary := next_boundary(self.period, dt_util.utcnow())) is None:
+            return
+        self.next_export = boundary
+        self._unsub = async_track_point_in_utc_time(self.hass, self._async_at_boundary, boundary)
+
+    @callback
+    def _async_at_boundary(self, _now: datetime) -> None:
+        self._unsub = None
+        # Снимок на границу периода, а не на момент записи файла
+        rows = self._async_snapshot(dt_util.as_local(self.next_export))
+        self._async_schedule()
+        self.hass.async_create_background_task(
+            self._async_write(rows), f"{DOMAIN} billing export"
+        )
+
+    @callback
+    def _async_snapshot(self, period: datetime) -> list[tuple]:
+        label = period.isoformat(timespec="seconds")
+        coordinators: dict[str, ElehantCoordinator] = self.hass.data.get(DOMAIN, {})
+        rows = []
+        for coordinator in coordinators.values():
+            if (adv := coordinator.reading) is None:
+                continue
+            rows.append(
+                (
+                    label,
+                    coordinator.address,
+                    adv.id_meter,
+                    adv.mtype,
+                    adv.name_model,
+                    adv.count / 10000,
+                    dt_util.utc_from_timestamp(adv.time).isoformat(timespec="seconds"),
+                )
+            )
+        return rows
+
+    async def _async_write(self, rows: list[tuple]) -> None:
+        if not rows:
+            return
+        async with self._write_lock:
+            try:
+                await self.hass.async_add_executor_job(self._writer.write, rows)
+            except OSError as err:
+                _LOGGER.error("Ошибка выгрузки показаний в %s: %s", self._writer.path, err)
+                return
+        _LOGGER.debug("Выгружено показаний: %s", len(rows))
+
+    def _build_writer(self) -> BillingWriter:
+        return BillingWriter(
+            self.hass.config.path(BILLING_FILE), self.max_size * 1024 * 1024, self.backups
+        )
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        return {"period": self.period, "max_size": self.max_size, "backups": self.backups}
+
+
+@singleton(DATA_BILLING)
+async def async_get_billing_exporter(hass: HomeAssistant) -> BillingExporter:
+    """Общая выгрузка показаний, загружается при первом обращении."""
+
+    exporter = BillingExporter(hass)
+    await exporter.async_load()
+    return exporter
@@ -0,0 +1,256 @@
+"""Запись парка: много счетчиков Элехант в одной записи конфигурации.
+
+Счетчики парка перечислены в параметрах записи. Сенсоры всех счетчиков
+создаются одной установкой платформы, поэтому запуск не растет на установку
+записи и платформы для каждого счетчика. Незнакомые счетчики, подходящие под
+правила парка, могут добавляться в парк по первому объявлению.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable, Mapping
+import logging
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.components.bluetooth import DOMAIN as BLUETOOTH_DOMAIN
+from homeassistant.components.bluetooth.models import BluetoothServiceInfoBleak
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_ADDRESS
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+
+from .const import (
+    CONF_AUTO_ADOPT,
+    CONF_FLEET,
+    CONF_METER_MODEL,
+    CONF_METER_TYPE,
+    CONF_SERIAL_MAX,
+    CONF_SERIAL_MIN,
+    DOMAIN,
+    ElehantData,
+)
+from .discovery import DiscoveryFilter
+from .hub import ElehantHub
+
+if TYPE_CHECKING:
+    from . import ElehantCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+# Любое значение в фильтре типа и модели
+ANY = "any"
+
+
+def matches_filter(adv: ElehantData, rules: Mapping[str, Any]) -> bool:
+    """Проверка счетчика по фильтру типа, модели и диапазона номеров."""
+
+    if (mtype := rules.get(CONF_METER_TYPE, ANY)) != ANY and int(mtype) != adv.mtype:
+        return False
+    if (model := rules.get(CONF_METER_MODEL, ANY)) != ANY and model != f"{adv.mtype}-{adv.model}":
+        return False
+    serial = int(adv.id_meter)
+    if (serial_min := rules.get(CONF_SERIAL_MIN)) is not None and serial < serial_min:
+        return False
+    if (serial_max := rules.get(CONF_SERIAL_MAX)) is not None and serial > serial_max:
+        return False
+    return True
+
+
+@callback
+def async_get_fleet_entry(hass: HomeAssistant) -> ConfigEntry | None:
+    """Запись парка, если она создана."""
+
+    for entry in hass.config_entries.async_entries(DOMAIN):
+        if entry.data.get(CONF_FLEET):
+            return entry
+    return None
+
+
+@callback
+def async_fleet_addresses(hass: HomeAssistant) -> set[str]:
+    """Адреса счетчиков парка."""
+
+    if (entry := async_get_fleet_entry(hass)) is None:
+        return set()
+    return set(entry.options.get(CONF_ADDRESS, []))
+
+
+def _adopt_rules(options: Mapping[str, Any]) -> tuple:
+    return (
+        options.get(CONF_AUTO_ADOPT, False),
+        options.get(CONF_METER_TYPE, ANY),
+        options.get(CONF_METER_MODEL, ANY),
+        options.get(CONF_SERIAL_MIN),
+        options.get(CONF_SERIAL_MAX),
+    )
+
+
+class ElehantFleet:
+    """Координаторы счетчиков записи парка.
+
+    Платформа сенсоров подключается к парку один раз и передает функцию
+    установки сенсоров счетчика. Счетчики, добавленные после запуска,
+    устанавливаются той же функцией без перезагрузки записи.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        hub: ElehantHub,
+        discovery: DiscoveryFilter,
+        create: Callable[[str], ElehantCoordinator],
+    ) -> None:
+        self.hass = hass
+        self.entry = entry
+        self.hub = hub
+        self.discovery = discovery
+        self.coordinators: dict[str, ElehantCoordinator] = {}
+        self.adopted = 0
+        self._create = create
+        self._setup_meter: Callable[[ElehantCoordinator], CALLBACK_TYPE] | None = None
+        self._platform_unsubs: dict[str, CALLBACK_TYPE] = {}
+        self._started = False
+        self._stop_unsubs: dict[str, CALLBACK_TYPE] = {}
+        self._unsub_adopter: CALLBACK_TYPE | None = None
+        self._rules = _adopt_rules(entry.options)
+        # Адреса парка, настроенные отдельными записями
+        self._skipped: set[str] = set()
+        # Адреса, не прошедшие правила автодобавления, проверяются один раз
+        self._mismatched: set[str] = set()
+
+    @property
+    def addresses(self) -> list[str]:
+        """Адреса счетчиков из параметров записи."""
+        return self.entry.options.get(CONF_ADDRESS, [])
+
+    @callback
+    def async_add(self, address: str) -> ElehantCoordinator | None:
+        """Подключение счетчика к парку, None - у счетчика своя запись."""
+
+        if self.hass.config_entries.async_entry_for_domain_unique_id(DOMAIN, address) is not None:
+            if address not in self._skipped:
+                self._skipped.add(address)
+                _LOGGER.warning("Счетчик %s настроен отдельной записью и пропущен в парке", address)
+            return None
+
+        coordinator = self.coordinators[address] = self._create(address)
+        if self._setup_meter is not None:
+            self._platform_unsubs[address] = self._setup_meter(coordinator)
+        if self._started:
+            self._stop_unsubs[address] = coordinator.async_start()
+        return coordinator
+
+    @callback
+    def async_attach_platform(
+        self, setup_meter: Callable[[ElehantCoordinator], CALLBACK_TYPE]
+    ) -> CALLBACK_TYPE:
+        """Установка сенсоров всех счетчиков парка и добавленных позже."""
+
+        self._setup_meter = setup_meter
+        for address, coordinator in self.coordinators.items():
+            self._platform_unsubs[address] = setup_meter(coordinator)
+
+        @callback
+        def _async_detach() -> None:
+            self._setup_meter = None
+            while self._platform_unsubs:
+                self._platform_unsubs.popitem()[1]()
+
+        return _async_detach
+
+    @callback
+    def async_remove_excluded_devices(self) -> None:
+        """Отвязать от записи устройства счетчиков, исключенных из парка."""
+
+        registry = dr.async_get(self.hass)
+        for device in dr.async_entries_for_config_entry(registry, self.entry.entry_id):
+            # Устройства сенсоров счетчиков: ("bluetooth", "<адрес>-<адрес>")
+            addresses = {
+                identifier.partition("-")[0]
+                for domain, identifier in device.identifiers
+                if domain == BLUETOOTH_DOMAIN
+            }
+            if addresses and addresses.isdisjoint(self.coordinators):
+                registry.async_update_device(
+                    device.id, remove_config_entry_id=self.entry.entry_id
+                )
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """Запуск координаторов и автодобавления."""
+
+        self._started = True
+        for address, coordinator in self.coordinators.items():
+            self._stop_unsubs[address] = coordinator.async_start()
+        self._async_update_adopter()
+
+        @callback
+        def _async_stop() -> None:
+            self._started = False
+            self._async_update_adopter()
+            while self._stop_unsubs:
+                self._stop_unsubs.popitem()[1]()
+
+        return _async_stop
+
+    @callback
+    def async_update_options(self) -> bool:
+        """Применение новых параметров записи, False - нужна перезагрузка.
+
+        Новые счетчики подключаются без перезагрузки. Исключение счетчика из
+        парка требует перезагрузки записи, чтобы удалить его сенсоры.
+        """
+
+        addresses = self.addresses
+        if not self.coordinators.keys() <= set(addresses):
+            return False
+
+        for address in addresses:
+            if address not in self.coordinators:
+                self.async_add(address)
+        for coordinator in self.coordinators.values():
+            coordinator.async_apply_options(self.entry.options)
+
+        if (rules := _adopt_rules(self.entry.options)) != self._rules:
+            self._rules = rules
+            self._mismatched.clear()
+        self._async_update_adopter()
+        return True
+
+    @callback
+    def _async_update_adopter(self) -> None:
+        adopt = self._started and self.entry.options.get(CONF_AUTO_ADOPT, False)
+        if adopt and self._unsub_adopter is None:
+            self._unsub_adopter = self.hub.async_set_adopter(self._async_adopt)
+        elif not adopt and self._unsub_adopter is not None:
+            self._unsub_adopter()
+            self._unsub_adopter = None
+
+    @callback
+    def _async_adopt(self, service_info: BluetoothServiceInfoBleak) -> bool:
+        """Добавление незнакомого счетчика, подходящего под правила парка."""
+
+        address = service_info.address
+        if address in self._mismatched or address in self.discovery.dismissed:
+            return False
+
+        adv = ElehantData(service_info.device, service_info.advertisement)
+        if adv.reject is not None:
+            # Поврежденный пакет известного счетчика проверяется снова со следующим
+            if adv.reject == "mac":
+                self._mismatched.add(address)
+            return False
+        if not matches_filter(adv, self.entry.options) or self.async_add(address) is None:
+            self._mismatched.add(address)
+            return False
+
+        self.adopted += 1
+        _LOGGER.info("Счетчик %s добавлен в парк", adv.name)
+        for flow in self.hass.config_entries.flow.async_progress_by_handler(DOMAIN):
+            if flow["context"].get("unique_id") == address:
+                self.hass.config_entries.flow.async_abort(flow["flow_id"])
+        self.hass.config_entries.async_update_entry(
+            self.entry,
+            options={**self.entry.options, CONF_ADDRESS: [*self.addresses, address]},
+        )
+        return True
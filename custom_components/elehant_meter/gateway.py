@@ -0,0 +1,275 @@
+"""Шлюз Элехант без Home Assistant.
+
+Принимает объявления от сканера bleak, из файла записи или из stdin и
+выводит показания в формате JSON по строке на пакет. Модуль не
+импортирует homeassistant; запускается через elehant_gateway.py в корне
+репозитория.
+
+Формат stdin: строка на объявление "адрес данные_hex [сигнал]".
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import AsyncIterator, Awaitable
+import json
+import logging
+import sys
+import time
+from typing import NamedTuple, TextIO
+
+from .capture import CaptureReader, ReplayAdvertisement, ReplayDevice, async_replay
+from .const import MANUFACTURER_ID, ElehantData
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+# Байт на одно чтение stdin из обычного файла
+STDIN_CHUNK = 1 << 16
+
+
+class Advertisement(NamedTuple):
+    """Принятое объявление."""
+
+    time: float
+    address: str
+    rssi: int
+    payload: bytes
+
+
+class Gateway:
+    """Очередь объявлений между источником и выводом.
+
+    Сканер кладет объявления без ожидания: при заполненной очереди
+    вытесняется самое старое, поэтому медленный вывод не останавливает
+    прием. Файловые источники ждут места в очереди.
+    """
+
+    def __init__(
+        self,
+        output: TextIO,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        dedup: bool = False,
+    ) -> None:
+        self.output = output
+        self.queue: asyncio.Queue[Advertisement] = asyncio.Queue(queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup = dedup
+        self.received = 0
+        self.dropped = 0
+        self.emitted = 0
+        self._last_payload: dict[str, bytes] = {}
+
+    def offer(self, adv: Advertisement) -> None:
+        """Объявление от сканера, без ожидания."""
+
+        self.received += 1
+        queue = self.queue
+        if queue.full():
+            queue.get_nowait()
+            queue.task_done()
+            self.dropped += 1
+        queue.put_nowait(adv)
+
+    async def put(self, adv: Advertisement) -> None:
+        """Объявление из файлового источника, с ожиданием места в очереди."""
+        self.received += 1
+        await self.queue.put(adv)
+
+    async def async_run_output(self) -> None:
+        """Разбор и вывод пакетами; запись идет в отдельном потоке."""
+
+        loop = asyncio.get_running_loop()
+        queue = self.queue
+
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(queue.get_nowait())
+
+            if lines := self.decode_batch(batch):
+                await loop.run_in_executor(None, self._write, "".join(lines))
+                self.emitted += len(lines)
+            for _ in batch:
+                queue.task_done()
+
+    def decode_batch(self, batch: list[Advertisement]) -> list[str]:
+        """Строки JSON для пакетов счетчиков Элехант."""
+
+        lines = []
+        last_payload = self._last_payload
+        for adv in batch:
+            if self.dedup:
+                if last_payload.get(adv.address) == adv.payload:
+                    continue
+                last_payload[adv.address] = adv.payload
+
+            data = ElehantData(
+                ReplayDevice(adv.address),
+                ReplayAdvertisement({MANUFACTURER_ID: adv.payload}, adv.rssi),
+            )
+            if not data.macdata.signValid:
+                continue
+
+            lines.append(
+                json.dumps(
+                    {
+                        "time": round(adv.time, 3),
+                        "address": adv.address,
+                        "id": data.id_meter,
+                        "type": data.mtype,
+                        "model": data.model,
+                        "name": data.name,
+                        "meter_reading": data.count / 10000,
+                        "temperature": data.raw_temperature / 100,
+                        "battery": data.battery,
+                        "rssi": adv.rssi,
+                        "firmware": data.frimware,
+                    },
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+        return lines
+
+    def _write(self, data: str) -> None:
+        self.output.write(data)
+        self.output.flush()
+
+
+async def async_scan(gateway: Gateway, adapter: str | None) -> None:
+    """Пассивный прием объявлений через bleak до отмены."""
+
+    try:
+        from bleak import BleakScanner
+    except ImportError as err:
+        raise SystemExit("Для сканирования нужен пакет bleak: pip install bleak") from err
+
+    def _detection_callback(device, advertisement_data) -> None:
+        if (payload := advertisement_data.manufacturer_data.get(MANUFACTURER_ID)) is not None:
+            gateway.offer(
+                Advertisement(time.time(), device.address, advertisement_data.rssi, payload)
+            )
+
+    kwargs = {"adapter": adapter} if adapter else {}
+    async with BleakScanner(_detection_callback, **kwargs):
+        await asyncio.Event().wait()
+
+
+async def async_read_capture(gateway: Gateway, path: str, speed: float) -> None:
+    """Объявления из файла записи."""
+
+    with CaptureReader(path) as reader:
+        if speed > 0:
+            # Исходные интервалы сохраняются, очередь заполняется без ожидания
+            await async_replay(
+                reader,
+                lambda record: gateway.offer(
+                    Advertisement(record.time, record.address, record.rssi, record.payload)
+                ),
+                speed,
+            )
+            return
+
+        for record in reader:
+            await gateway.put(Advertisement(record.time, record.address, record.rssi, record.payload))
+
+
+async def async_read_stdin(gateway: Gateway) -> None:
+    """Объявления из stdin, строка "адрес данные_hex [сигнал]"."""
+
+    async for line in _async_stdin_lines():
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        try:
+            payload = bytes.fromhex(parts[1].decode())
+            rssi = int(parts[2]) if len(parts) > 2 else 0
+        except ValueError:
+            _LOGGER.debug("Пропущена строка: %r", line)
+            continue
+        await gateway.put(Advertisement(time.time(), parts[0].decode().upper(), rssi, payload))
+
+
+async def _async_stdin_lines() -> AsyncIterator[bytes]:
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except ValueError:
+        # Обычный файл, перенаправленный в stdin: чтение блоками в потоке
+        while lines := await loop.run_in_executor(None, sys.stdin.buffer.readlines, STDIN_CHUNK):
+            for line in lines:
+                yield line
+        return
+
+    while line := await reader.readline():
+        yield line
+
+
+async def async_main(args: argparse.Namespace) -> Gateway:
+    gateway = Gateway(sys.stdout, args.queue, args.batch, args.flush_interval, args.dedup)
+
+    source: Awaitable[None]
+    if args.capture:
+        source = async_read_capture(gateway, args.capture, args.speed)
+    elif args.stdin:
+        source = async_read_stdin(gateway)
+    else:
+        source = async_scan(gateway, args.adapter)
+
+    output = asyncio.create_task(gateway.async_run_output())
+    try:
+        await source
+        # Источник исчерпан: дождаться вывода оставшегося
+        await gateway.queue.join()
+    finally:
+        output.cancel()
+    return gateway
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Показания счетчиков Элехант в формате JSON по строке на пакет."
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--capture", help="файл записи службы capture_start")
+    source.add_argument("--stdin", action="store_true", help="строки \"адрес данные_hex [сигнал]\" из stdin")
+    parser.add_argument("--adapter", help="адаптер Bluetooth, например hci0")
+    parser.add_argument("--speed", type=float, default=0, help="скорость воспроизведения записи, 0 - без пауз")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE, help="размер очереди")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_SIZE, help="строк в одной записи вывода")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL, help="секунд до записи неполного пакета")
+    parser.add_argument("--dedup", action="store_true", help="пропускать повторы пакета счетчика")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        gateway = asyncio.run(async_main(args))
+    except KeyboardInterrupt:
+        return
+    _LOGGER.info(
+        "Принято: %s, выведено: %s, вытеснено: %s, %.2f с",
+        gateway.received,
+        gateway.emitted,
+        gateway.dropped,
+        time.perf_counter() - started,
+    )
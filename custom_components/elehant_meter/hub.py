@@ -0,0 +1,230 @@
+"""Общий прием объявлений Элехант для всех записей конфигурации."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from datetime import datetime, timedelta
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from homeassistant.components.bluetooth import (
+    BluetoothCallbackMatcher,
+    BluetoothChange,
+    BluetoothScanningMode,
+    async_last_service_info,
+    async_register_callback,
+)
+from homeassistant.components.bluetooth.models import BluetoothServiceInfoBleak
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .capture import CaptureWriter
+from .const import DATA_HUB, GROUP_PARENTS, MANUFACTURER_ID
+from .aggregate import FleetTotals
+from .dedup import Deduplicator
+from .scheduler import IngestScheduler
+from .staleness import StalenessTracker
+from .stats import PipelineStats
+
+if TYPE_CHECKING:
+    from . import ElehantCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPTURE_FLUSH_INTERVAL = timedelta(seconds=5)
+
+
+class ElehantHub:
+    """Один обработчик Bluetooth на MANUFACTURER_ID, пакеты раздаются координаторам по адресу.
+
+    Копии пакета, принятые несколькими прокси, передаются координатору один
+    раз, а число пакетов в обработке ограничено общим бюджетом.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self.dedup = Deduplicator()
+        self.staleness = StalenessTracker(hass)
+        self.stats = PipelineStats()
+        self.scheduler = IngestScheduler(hass.loop, self._async_deliver)
+        # Запись, которой принадлежат сенсоры статистики
+        self.stats_entry_id: str | None = None
+        self.totals = FleetTotals(GROUP_PARENTS)
+        self.totals_entry_id: str | None = None
+        self._coordinators: dict[str, ElehantCoordinator] = {}
+        self._adopter: Callable[[BluetoothServiceInfoBleak], bool] | None = None
+        self._unsub: CALLBACK_TYPE | None = None
+        self._capture: CaptureWriter | None = None
+        # Запись на диск выполняется в потоках, блокировка задает их порядок
+        self._capture_lock = asyncio.Lock()
+        self._capture_flush_unsub: CALLBACK_TYPE | None = None
+        self._capture_stop_unsub: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_register(self, coordinator: ElehantCoordinator) -> CALLBACK_TYPE:
+        """Подключение координатора счетчика."""
+
+        address = coordinator.address
+        self._coordinators[address] = coordinator
+        self._async_listen()
+        # Общий обработчик не получает повтор последнего объявления, как
+        # обработчик по адресу, поэтому оно передается новому координатору
+        if (service_info := async_last_service_info(self.hass, address, False)) is not None:
+            self.async_dispatch(service_info)
+
+        @callback
+        def _async_unregister() -> None:
+            if self._coordinators.get(address) is coordinator:
+                del self._coordinators[address]
+                self.dedup.forget(address)
+                self.scheduler.forget(address)
+            self._async_maybe_stop()
+
+        return _async_unregister
+
+    @callback
+    def async_set_adopter(
+        self, adopter: Callable[[BluetoothServiceInfoBleak], bool]
+    ) -> CALLBACK_TYPE:
+        """Обработчик объявлений незнакомых адресов.
+
+        True от обработчика - адрес подключен к хабу, и объявление передается
+        его координатору.
+        """
+
+        self._adopter = adopter
+        self._async_listen()
+
+        @callback
+        def _async_remove() -> None:
+            if self._adopter is adopter:
+                self._adopter = None
+            self._async_maybe_stop()
+
+        return _async_remove
+
+    @callback
+    def _async_listen(self) -> None:
+        if self._unsub is None:
+            _LOGGER.debug("Регистрация общего обработчика объявлений")
+            self._unsub = async_register_callback(
+                self.hass,
+                self._async_handle_bluetooth_event,
+                BluetoothCallbackMatcher(
+                    manufacturer_id=MANUFACTURER_ID, connectable=False
+                ),
+                BluetoothScanningMode.PASSIVE,
+            )
+
+    @callback
+    def _async_maybe_stop(self) -> None:
+        if not self._coordinators and self._adopter is None and self._unsub is not None:
+            self._unsub()
+            self._unsub = None
+            self.scheduler.cancel()
+
+    @callback
+    def _async_handle_bluetooth_event(
+        self, service_info: BluetoothServiceInfoBleak, change: BluetoothChange
+    ) -> None:
+        if (capture := self._capture) is not None:
+            capture.append(
+                time.time(),
+                service_info.address,
+                service_info.rssi,
+                service_info.source,
+                service_info.manufacturer_data.get(MANUFACTURER_ID, b""),
+            )
+        self.async_dispatch(service_info, change)
+
+    @callback
+    def async_dispatch(
+        self,
+        service_info: BluetoothServiceInfoBleak,
+        change: BluetoothChange = BluetoothChange.ADVERTISEMENT,
+    ) -> None:
+        """Передача объявления координатору адреса, кроме копий уже принятого пакета."""
+
+        address = service_info.address
+        if address not in self._coordinators and (
+            self._adopter is None or not self._adopter(service_info)
+        ):
+            self.stats.reject("not_configured")
+            return
+        payload = service_info.manufacturer_data.get(MANUFACTURER_ID)
+        if self.dedup.accept(
+            address, payload, service_info.source, service_info.rssi, service_info.time
+        ):
+            self.scheduler.offer(address, payload, service_info)
+        else:
+            self.stats.reject("duplicate")
+
+    @callback
+    def _async_deliver(self, service_info: BluetoothServiceInfoBleak) -> None:
+        if (coordinator := self._coordinators.get(service_info.address)) is not None:
+            coordinator._async_handle_bluetooth_event(
+                service_info, BluetoothChange.ADVERTISEMENT
+            )
+
+    @property
+    def capture(self) -> CaptureWriter | None:
+        """Текущая запись потока."""
+        return self._capture
+
+    async def async_start_capture(self, writer: CaptureWriter) -> None:
+        """Начало записи всех объявлений MANUFACTURER_ID."""
+
+        await self.async_stop_capture()
+        self._capture = writer
+        self._capture_flush_unsub = async_track_time_interval(
+            self.hass, self._async_flush_capture, CAPTURE_FLUSH_INTERVAL
+        )
+        self._capture_stop_unsub = self.hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, self._async_stop_capture_at_stop
+        )
+        _LOGGER.info("Запись объявлений в %s", writer.path)
+
+    async def async_stop_capture(self) -> None:
+        """Остановка записи с сохранением накопленного."""
+
+        if (writer := self._capture) is None:
+            return
+        self._capture = None
+        if self._capture_flush_unsub is not None:
+            self._capture_flush_unsub()
+            self._capture_flush_unsub = None
+        if self._capture_stop_unsub is not None:
+            self._capture_stop_unsub()
+            self._capture_stop_unsub = None
+
+        async with self._capture_lock:
+            await self.hass.async_add_executor_job(_write_and_close, writer, writer.take())
+        _LOGGER.info("Запись объявлений остановлена, записей: %s", writer.records)
+
+    async def _async_flush_capture(self, _now: datetime) -> None:
+        if (writer := self._capture) is None:
+            return
+        async with self._capture_lock:
+            if writer is self._capture and (data := writer.take()):
+                await self.hass.async_add_executor_job(writer.write, data)
+
+    async def _async_stop_capture_at_stop(self, _event: Event) -> None:
+        self._capture_stop_unsub = None
+        await self.async_stop_capture()
+
+
+def _write_and_close(writer: CaptureWriter, data: bytes) -> None:
+    if data:
+        writer.write(data)
+    writer.close()
+
+
+@callback
+def async_get_hub(hass: HomeAssistant) -> ElehantHub:
+    """Общий обработчик интеграции."""
+
+    if (hub := hass.data.get(DATA_HUB)) is None:
+        hub = hass.data[DATA_HUB] = ElehantHub(hass)
+    return hub
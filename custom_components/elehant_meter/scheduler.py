@@ -0,0 +1,143 @@
+"""Ограничение числа пакетов Элехант, принимаемых в обработку."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from typing import Any
+
+from .const import DEFAULT_INGEST_BURST, DEFAULT_INGEST_RATE, DEFAULT_UNCHANGED_INTERVAL
+
+
+class IngestScheduler:
+    """Общий бюджет пакетов в секунду с очередью по счетчикам.
+
+    Бюджет - ведро жетонов rate/burst, rate 0 - без ограничения. Пакет с
+    изменившимися данными принимается сразу, если есть жетон, иначе ждет в
+    очереди, где у каждого счетчика одно место с последним пакетом: новый
+    пакет заменяет ожидающий, показания не теряются, а очередь ограничена
+    числом счетчиков. Очередь обходится по порядку постановки, поэтому
+    счетчики обслуживаются поровну. Пакет без изменений принимается не чаще
+    unchanged_interval на счетчик и ждет во второй очереди, которая
+    обслуживается после первой. Так при любой нагрузке счетчик с неизменными
+    данными не считается замолчавшим, а изменения не ждут за повторами.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        deliver: Callable[[Any], None],
+        rate: float = DEFAULT_INGEST_RATE,
+        burst: float = DEFAULT_INGEST_BURST,
+        unchanged_interval: float = DEFAULT_UNCHANGED_INTERVAL,
+    ) -> None:
+        self._loop = loop
+        self._deliver = deliver
+        self.rate = rate
+        self.burst = burst
+        self.unchanged_interval = unchanged_interval
+        self._tokens = burst
+        self._refilled = loop.time()
+        self._last: dict[str, tuple[bytes | None, float]] = {}
+        # Очереди пакетов с изменениями и пакетов без изменений
+        self._pending: dict[str, tuple[Any, bytes | None]] = {}
+        self._unchanged: dict[str, tuple[Any, bytes | None]] = {}
+        self._handle: asyncio.TimerHandle | None = None
+        self.admitted = 0
+        self.deferred = 0
+        self.superseded = 0
+        self.dropped: dict[str, int] = {"sampled": 0}
+
+    def configure(self, rate: float, burst: float, unchanged_interval: float) -> None:
+        """Новые параметры бюджета."""
+
+        self.rate = rate
+        self.burst = burst
+        self.unchanged_interval = unchanged_interval
+        self._tokens = min(self._tokens, burst)
+        self._async_schedule_drain()
+
+    @property
+    def pending(self) -> int:
+        """Счетчики с ожидающим пакетом."""
+        return len(self._pending) + len(self._unchanged)
+
+    def offer(self, address: str, payload: bytes | None, service_info: Any) -> None:
+        """Пакет счетчика; принимается сейчас, позже или отбрасывается."""
+
+        now = self._loop.time()
+        last = self._last.get(address)
+
+        changed = last is None or last[0] != payload
+        if not changed and now - last[1] < self.unchanged_interval:
+            self.dropped["sampled"] += 1
+            return
+
+        if address in self._pending:
+            self.superseded += 1
+            self._pending[address] = (service_info, payload)
+            return
+        if address in self._unchanged:
+            self.superseded += 1
+            if changed:
+                # Изменившийся пакет переходит в первую очередь
+                del self._unchanged[address]
+                self._pending[address] = (service_info, payload)
+            else:
+                self._unchanged[address] = (service_info, payload)
+            return
+
+        queue = self._pending if changed else self._unchanged
+        if not queue and not self._pending and self._take(now):
+            self._admit(address, payload, service_info, now)
+            return
+
+        self.deferred += 1
+        queue[address] = (service_info, payload)
+        self._async_schedule_drain()
+
+    def forget(self, address: str) -> None:
+        """Удалить состояние счетчика."""
+        self._last.pop(address, None)
+        self._pending.pop(address, None)
+        self._unchanged.pop(address, None)
+
+    def cancel(self) -> None:
+        """Остановить обработку очереди."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _take(self, now: float) -> bool:
+        if not self.rate:
+            return True
+        tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        if tokens < 1:
+            self._tokens = tokens
+            return False
+        self._tokens = tokens - 1
+        return True
+
+    def _admit(self, address: str, payload: bytes | None, service_info: Any, now: float) -> None:
+        self._last[address] = (payload, now)
+        self.admitted += 1
+        self._deliver(service_info)
+
+    def _async_drain(self) -> None:
+        self._handle = None
+        now = self._loop.time()
+        while (queue := self._pending or self._unchanged) and self._take(now):
+            address = next(iter(queue))
+            service_info, payload = queue.pop(address)
+            self._admit(address, payload, service_info, now)
+        self._async_schedule_drain()
+
+    def _async_schedule_drain(self) -> None:
+        if self._handle is not None or not (self._pending or self._unchanged):
+            return
+        if not self.rate:
+            self._handle = self._loop.call_soon(self._async_drain)
+            return
+        elapsed = self._loop.time() - self._refilled
+        delay = max(0.0, (1 - self._tokens) / self.rate - elapsed)
+        self._handle = self._loop.call_later(delay, self._async_drain)
@@ -1,17 +1,22 @@
 """Support for Elehant sensors."""
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections.abc import Iterable
+from dataclasses import dataclass, replace
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+import time
+from time import perf_counter_ns
+from typing import TYPE_CHECKING, Any
 
 from .const import ElehantData
-from bleak.backends.device import BLEDevice
 
 from homeassistant import config_entries
 from homeassistant.components.bluetooth.passive_update_processor import (
     PassiveBluetoothDataProcessor,
     PassiveBluetoothDataUpdate,
     PassiveBluetoothEntityKey,
-    PassiveBluetoothProcessorCoordinator,
     PassiveBluetoothProcessorEntity,
 )
 from homeassistant.components.sensor import (
@@ -26,24 +31,51 @@ from homeassistant.const import (
     EntityCategory,
     UnitOfTemperature,
     UnitOfVolume,
-    UnitOfPower
+    UnitOfVolumeFlowRate,
+    UnitOfEnergy,
+    UnitOfPower,
 )
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.entity import DeviceInfo, Entity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 
-from .const import DOMAIN
+from .aggregate import FleetTotals
+from .coalesce import StateWriteCoalescer, async_get_coalescer
+from .const import (
+    CONF_FLEET,
+    CONF_FLEET_TOTALS,
+    CONF_PIPELINE_STATS,
+    DATA_FLEET,
+    DEFAULT_WRITE_WINDOW,
+    DOMAIN,
+    GROUP_COLD_WATER,
+    GROUP_ELECTRIC,
+    GROUP_GAS,
+    GROUP_HEAT,
+    GROUP_HOT_WATER,
+    GROUP_WATER,
+    METER_GROUPS,
+)
 from .const import MeterType
-from .const import MacData
-from .const import parse_mac
+from .estimators import FlowEstimator
+from .hub import async_get_hub
+from .stats import PipelineStats, StageStats
 
 import logging
 
+if TYPE_CHECKING:
+    from . import ElehantCoordinator
+    from .fleet import ElehantFleet
+
 _LOGGER = logging.getLogger(__name__)
 
+# Опрос сенсоров статистики, остальные сенсоры не опрашиваются
+SCAN_INTERVAL = timedelta(seconds=60)
+
 
-@dataclass
+@dataclass(frozen=True)
 class ElehantSensorEntityDescription(SensorEntityDescription):
     """Class to describe an Elehant sensor entity."""
     name: str | None = None
@@ -90,59 +122,100 @@ SENSOR_DESCRIPTIONS = {
     ),
 }
 
+# Сенсоры оценок расхода, значения берутся из FlowEstimator
+FLOW_SENSOR_DESCRIPTIONS = {
+    "flow_rate": ElehantSensorEntityDescription(
+        key="flow_rate",
+        name="Расход",
+        device_class=SensorDeviceClass.VOLUME_FLOW_RATE,
+        native_unit_of_measurement=UnitOfVolumeFlowRate.CUBIC_METERS_PER_HOUR,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    "rate_average": ElehantSensorEntityDescription(
+        key="rate_average",
+        name="Средний расход",
+        device_class=SensorDeviceClass.VOLUME_FLOW_RATE,
+        native_unit_of_measurement=UnitOfVolumeFlowRate.CUBIC_METERS_PER_HOUR,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    "leak_flow": ElehantSensorEntityDescription(
+        key="leak_flow",
+        name="Утечка",
+        device_class=SensorDeviceClass.VOLUME_FLOW_RATE,
+        native_unit_of_measurement=UnitOfVolumeFlowRate.CUBIC_METERS_PER_HOUR,
+        state_class=SensorStateClass.MEASUREMENT,
+        icon="mdi:pipe-leak",
+    ),
+}
+
+FLOW_VALUES = {
+    "flow_rate": lambda flow: flow.rate,
+    "rate_average": lambda flow: flow.rate_average,
+    "leak_flow": lambda flow: flow.leak_flow,
+}
 
-def _device_key_to_bluetooth_entity_desc(
-    device: BLEDevice,
-    key: str,
-    desc: ElehantSensorEntityDescription,
-) -> ElehantSensorEntityDescription:
-    """Замена типа счетчика"""
 
-    _LOGGER.debug("_device_key_to_bluetooth_entity_desc")
+def _meter_reading_description(mtype: MeterType) -> ElehantSensorEntityDescription:
+    """Описание показаний для типа счетчика."""
 
-    mac = device.address.lower()
-    result = desc
+    desc = SENSOR_DESCRIPTIONS["meter_reading"]
 
-    # _LOGGER.debug("MAC: %s", mac)
-    # _LOGGER.debug("KEY: %s", key)
+    if mtype == MeterType.WATER:
+        return replace(desc, device_class=SensorDeviceClass.WATER)
+    if mtype == MeterType.ELECTRIC:
+        return replace(
+            desc,
+            device_class=SensorDeviceClass.ENERGY,
+            native_unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        )
+    if mtype == MeterType.HEAT:
+        return replace(
+            desc,
+            device_class=SensorDeviceClass.ENERGY,
+            native_unit_of_measurement="Gcal",
+        )
 
-    if key == "meter_reading":
-        _LOGGER.debug("MAC: %s", mac)
-        _LOGGER.debug("KEY: %s", key)
+    return desc
 
-        macdata = parse_mac(mac)
 
-        _LOGGER.debug("metertype: %s", macdata.mtype)
+def _flow_descriptions(mtype: MeterType) -> dict[str, ElehantSensorEntityDescription]:
+    """Описания оценок расхода для типа счетчика, утечка - только для газа и воды."""
 
-        assert macdata.signValid is not None, "Неизвестное устройство"
+    if mtype in (MeterType.GAS, MeterType.WATER):
+        return FLOW_SENSOR_DESCRIPTIONS
 
-        if macdata.mtype == MeterType.GAS:
-            result.device_class = SensorDeviceClass.GAS
-            _LOGGER.debug("Выбран тип: GAS")
+    if mtype == MeterType.ELECTRIC:
+        changes = {
+            "device_class": SensorDeviceClass.POWER,
+            "native_unit_of_measurement": UnitOfPower.KILO_WATT,
+        }
+    else:
+        changes = {"device_class": None, "native_unit_of_measurement": "Gcal/h"}
 
-        if macdata.mtype == MeterType.WATER:
-            _LOGGER.debug("Выбран тип: WATER")
-            result.device_class = SensorDeviceClass.WATER          
-            
-        if macdata.mtype == MeterType.ELECTRIC:  
-            result.device_class = SensorDeviceClass.ENERGY
-            result.native_unit_of_measurement = UnitOfPower.KILO_WATT_HOUR
-            _LOGGER.debug("Выбран тип: ELECTRIC")
-        if macdata.mtype == MeterType.HEAT:
-            result.device_class = SensorDeviceClass.ENERGY
-            result.native_unit_of_measurement = "Gcal"
-            _LOGGER.debug("Выбран тип: HEAT")
+    return {
+        key: replace(desc, **changes)
+        for key, desc in FLOW_SENSOR_DESCRIPTIONS.items()
+        if key != "leak_flow"
+    }
 
-    return result
+
+METER_SENSOR_DESCRIPTIONS: dict[int, dict[str, ElehantSensorEntityDescription]] = {
+    mtype: {
+        **SENSOR_DESCRIPTIONS,
+        "meter_reading": _meter_reading_description(mtype),
+        **_flow_descriptions(mtype),
+    }
+    for mtype in MeterType
+}
 
 
 def _device_key_to_bluetooth_entity_key(
-    device: BLEDevice,
+    address: str,
     key: str,
 ) -> PassiveBluetoothEntityKey:
     """Convert a device key to an entity key."""
 
-    return PassiveBluetoothEntityKey(key, device.address)
+    return PassiveBluetoothEntityKey(key, address)
 
 
 def _sensor_device_info_to_hass(
@@ -152,7 +225,7 @@ def _sensor_device_info_to_hass(
     hass_device_info = DeviceInfo(
         name = adv.name,
         serial_number=adv.id_meter,
-        model_id=adv.device.address,
+        model_id=adv.address,
         model = adv.name_model,
         hw_version=adv.frimware,
         manufacturer = "Элехант"
@@ -162,24 +235,35 @@ def _sensor_device_info_to_hass(
     return hass_device_info
 
 
+def _entity_value(adv: ElehantData, flow: FlowEstimator | None, key: str) -> Any:
+    if (value := FLOW_VALUES.get(key)) is not None:
+        return value(flow) if flow is not None else None
+    return getattr(adv, key, None)
+
+
 def sensor_update_to_bluetooth_data_update(
     adv: ElehantData,
+    flow: FlowEstimator | None = None,
 ) -> PassiveBluetoothDataUpdate:
     """Convert a sensor update to a Bluetooth data update."""
-   
+
+    descriptions = METER_SENSOR_DESCRIPTIONS[adv.mtype]
+    # Ключи сущностей создаются один раз на все словари обновления
+    entity_keys = {
+        key: _device_key_to_bluetooth_entity_key(adv.address, key) for key in descriptions
+    }
+
     result = PassiveBluetoothDataUpdate(
-        devices={adv.device.address: _sensor_device_info_to_hass(adv)},
+        devices={adv.address: _sensor_device_info_to_hass(adv)},
         entity_descriptions={
-            _device_key_to_bluetooth_entity_key(adv.device, key): _device_key_to_bluetooth_entity_desc(adv.device, key, desc)
-            for key, desc in SENSOR_DESCRIPTIONS.items()
+            entity_keys[key]: desc for key, desc in descriptions.items()
         },
         entity_data={
-            _device_key_to_bluetooth_entity_key(adv.device, key): getattr(adv, key, None)
-            for key in SENSOR_DESCRIPTIONS
+            entity_key: _entity_value(adv, flow, key)
+            for key, entity_key in entity_keys.items()
         },
         entity_names={
-            _device_key_to_bluetooth_entity_key(adv.device, key): desc.name
-            for key, desc in SENSOR_DESCRIPTIONS.items()
+            entity_keys[key]: desc.name for key, desc in descriptions.items()
         },
     )
     _LOGGER.debug("sensor_update_to_bluetooth_data_update: %s", result)
@@ -187,6 +271,75 @@ def sensor_update_to_bluetooth_data_update(
     return result
 
 
+class ElehantSensorUpdater:
+    """Полное обновление для первого пакета устройства, далее только изменившиеся данные.
+
+    Оценки расхода обновляются каждым пакетом, включая повторные. Время
+    построения обновления учитывается в stats, если они заданы.
+    """
+
+    def __init__(self, stats: PipelineStats | None = None) -> None:
+        self.stats = stats
+        self._entity_keys: dict[str, dict[str, PassiveBluetoothEntityKey]] = {}
+        self._flow_keys: dict[str, dict[str, PassiveBluetoothEntityKey]] = {}
+        self._entity_data: dict[str, dict[PassiveBluetoothEntityKey, Any]] = {}
+        self._device_info: dict[str, tuple] = {}
+        self.flows: dict[str, FlowEstimator] = {}
+
+    def __call__(self, adv: ElehantData) -> PassiveBluetoothDataUpdate:
+        if (stats := self.stats) is None or not stats.update.sample():
+            return self._build(adv)
+
+        start = perf_counter_ns()
+        result = self._build(adv)
+        stats.update.record(perf_counter_ns() - start)
+        return result
+
+    def _build(self, adv: ElehantData) -> PassiveBluetoothDataUpdate:
+        if not adv.macdata.signValid:
+            return PassiveBluetoothDataUpdate()
+
+        address = adv.address
+        # Имя и модель определяются шаблоном модели и номером
+        device_info = (adv.template, adv.serial, adv.fw)
+        entity_keys = self._entity_keys.get(address)
+
+        if (flow := self.flows.get(address)) is None:
+            flow = self.flows[address] = FlowEstimator()
+        flow.update(adv.count, adv.time)
+
+        if entity_keys is None:
+            result = sensor_update_to_bluetooth_data_update(adv, flow)
+            all_keys = {entity_key.key: entity_key for entity_key in result.entity_data}
+            self._entity_keys[address] = {
+                key: entity_key for key, entity_key in all_keys.items() if key not in FLOW_VALUES
+            }
+            self._flow_keys[address] = {
+                key: entity_key for key, entity_key in all_keys.items() if key in FLOW_VALUES
+            }
+            self._entity_data[address] = dict(result.entity_data)
+            self._device_info[address] = device_info
+            return result
+
+        last_data = self._entity_data[address]
+        entity_data = {}
+        for key, entity_key in entity_keys.items():
+            value = getattr(adv, key)
+            if last_data[entity_key] != value:
+                last_data[entity_key] = entity_data[entity_key] = value
+        for key, entity_key in self._flow_keys[address].items():
+            value = FLOW_VALUES[key](flow)
+            if last_data[entity_key] != value:
+                last_data[entity_key] = entity_data[entity_key] = value
+
+        devices = {}
+        if self._device_info[address] != device_info:
+            self._device_info[address] = device_info
+            devices[address] = _sensor_device_info_to_hass(adv)
+
+        return PassiveBluetoothDataUpdate(devices=devices, entity_data=entity_data)
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: config_entries.ConfigEntry,
@@ -196,15 +349,88 @@ async def async_setup_entry(
 
     _LOGGER.debug("async_setup_entry: %s", entry)
 
-    coordinator: PassiveBluetoothProcessorCoordinator = hass.data[DOMAIN][entry.entry_id]
+    hub = async_get_hub(hass)
+    coalescer = async_get_coalescer(hass)
+
+    # Сенсоры счетчиков, созданные при установке, добавляются одним вызовом
+    pending: list[Entity] = []
+    batching = True
+
+    @callback
+    def _async_add_entities(
+        new_entities: Iterable[Entity], update_before_add: bool = False
+    ) -> None:
+        if batching:
+            pending.extend(new_entities)
+        else:
+            async_add_entities(new_entities, update_before_add)
+
+    setup_meter = partial(_async_setup_meter, async_add_entities=_async_add_entities)
+    if entry.data.get(CONF_FLEET):
+        fleet: ElehantFleet = hass.data[DATA_FLEET]
+        entry.async_on_unload(fleet.async_attach_platform(setup_meter))
+    else:
+        entry.async_on_unload(setup_meter(hass.data[DOMAIN][entry.entry_id]))
+
+    if entry.options.get(CONF_PIPELINE_STATS) and hub.stats_entry_id is None:
+        # Сенсоры статистики общие для интеграции, их создает одна запись
+        hub.stats_entry_id = entry.entry_id
+
+        @callback
+        def _async_release_stats() -> None:
+            hub.stats_entry_id = None
+
+        entry.async_on_unload(_async_release_stats)
+        stages = {
+            "classify": hub.stats.classify,
+            "decode": hub.stats.decode,
+            "update": hub.stats.update,
+            "write": coalescer.write_stats,
+        }
+        pending.extend(ElehantStageSensorEntity(key, stage) for key, stage in stages.items())
+        pending.append(ElehantRejectsSensorEntity(hub.stats))
+
+    if entry.options.get(CONF_FLEET_TOTALS) and hub.totals_entry_id is None:
+        hub.totals_entry_id = entry.entry_id
+
+        @callback
+        def _async_release_totals() -> None:
+            hub.totals_entry_id = None
+
+        entry.async_on_unload(_async_release_totals)
+        pending.extend(
+            ElehantFleetTotalSensorEntity(group, hub.totals, coalescer)
+            for group in METER_GROUPS
+        )
+
+    batching = False
+    if pending:
+        async_add_entities(pending)
+
 
-    processor = PassiveBluetoothDataProcessor(
-        sensor_update_to_bluetooth_data_update)
+@callback
+def _async_setup_meter(
+    coordinator: ElehantCoordinator, async_add_entities: AddEntitiesCallback
+) -> CALLBACK_TYPE:
+    """Connect the sensors of one meter, return the callback that disconnects them."""
 
-    entry.async_on_unload(processor.async_add_entities_listener(
-        ElehantBluetoothSensorEntity, async_add_entities))
+    processor = PassiveBluetoothDataProcessor(ElehantSensorUpdater(coordinator.hub.stats))
+    unsubs = [
+        processor.async_add_entities_listener(
+            ElehantBluetoothSensorEntity, async_add_entities
+        ),
+        coordinator.async_register_processor(processor),
+    ]
 
-    entry.async_on_unload(coordinator.async_register_processor(processor))
+    if coordinator.stale and coordinator.restored is not None:
+        processor.async_handle_update(coordinator.restored, was_available=True)
+
+    @callback
+    def _async_remove() -> None:
+        for unsub in reversed(unsubs):
+            unsub()
+
+    return _async_remove
 
 
 class ElehantBluetoothSensorEntity(
@@ -213,6 +439,47 @@ class ElehantBluetoothSensorEntity(
 ):
     """Representation of an Elehant sensor."""
 
+    _last_write_value: Any = None
+    _last_write_time: float = float("-inf")
+    _last_write_available: bool | None = None
+
+    async def async_added_to_hass(self) -> None:
+        """Remember the state written when the entity is added."""
+        await super().async_added_to_hass()
+        self._last_write_value = self.native_value
+        self._last_write_time = time.monotonic()
+        self._last_write_available = self.available
+
+    @callback
+    def _handle_processor_update(
+        self, new_data: PassiveBluetoothDataUpdate | None
+    ) -> None:
+        """Queue a state write when the key's write policy allows it."""
+
+        value = self.native_value
+        now = time.monotonic()
+        available = self.available
+
+        # Смена доступности записывается всегда, ограничивается только запись значений
+        if new_data is not None and available == self._last_write_available:
+            policy = self.processor.coordinator.write_policies.get(self.entity_key.key)
+            if policy is not None and not policy.should_write(
+                self._last_write_value, self._last_write_time, value, now
+            ):
+                self.processor.coordinator.coalescer.throttled += 1
+                return
+
+        self._last_write_value = value
+        self._last_write_time = now
+        self._last_write_available = available
+        coordinator = self.processor.coordinator
+        coordinator.coalescer.async_schedule(self, coordinator.write_window)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Drop a pending coalesced write."""
+        self.processor.coordinator.coalescer.async_discard(self)
+        await super().async_will_remove_from_hass()
+
     @property
     def available(self) -> bool:
         """Return whether the entity was available in the last update."""
@@ -222,6 +489,13 @@ class ElehantBluetoothSensorEntity(
             and self.processor.entity_data.get(self.entity_key) is not None
         )
 
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Mark values restored from the snapshot."""
+        if self.processor.coordinator.stale:
+            return {"stale": True}
+        return None
+
     @property
     def native_value(self) -> int | float | None:
         """Return the native value."""
@@ -258,3 +532,132 @@ class ElehantBluetoothSensorEntity(
             return f"mdi:battery-{value}"
 
         return super().icon
+
+
+STATS_DEVICE_INFO = DeviceInfo(
+    identifiers={(DOMAIN, "pipeline")},
+    name="Элехант: обработка пакетов",
+    manufacturer="Элехант",
+    entry_type=DeviceEntryType.SERVICE,
+)
+
+STAGE_NAMES = {
+    "classify": "Разбор адреса",
+    "decode": "Декодирование",
+    "update": "Построение обновления",
+    "write": "Запись состояния",
+}
+
+
+class ElehantStageSensorEntity(SensorEntity):
+    """Среднее время этапа обработки, мкс; опрашивается раз в SCAN_INTERVAL."""
+
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_native_unit_of_measurement = "µs"
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 2
+    _attr_icon = "mdi:timer-outline"
+    _attr_device_info = STATS_DEVICE_INFO
+
+    def __init__(self, key: str, stage: StageStats) -> None:
+        self._stage = stage
+        self._attr_name = STAGE_NAMES[key]
+        self._attr_unique_id = f"pipeline-{key}"
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the mean stage time."""
+        return self._stage.mean_us
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the call count and percentiles."""
+        return self._stage.as_dict()
+
+
+class ElehantRejectsSensorEntity(SensorEntity):
+    """Отброшенные пакеты, по причинам в атрибутах."""
+
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_icon = "mdi:filter-remove-outline"
+    _attr_device_info = STATS_DEVICE_INFO
+    _attr_name = "Отброшено"
+    _attr_unique_id = "pipeline-rejects"
+
+    def __init__(self, stats: PipelineStats) -> None:
+        self._stats = stats
+
+    @property
+    def native_value(self) -> int:
+        """Return the total number of rejects."""
+        return sum(self._stats.rejects.values())
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return rejects by reason."""
+        return dict(self._stats.rejects)
+
+
+FLEET_DEVICE_INFO = DeviceInfo(
+    identifiers={(DOMAIN, "fleet")},
+    name="Элехант: все счетчики",
+    manufacturer="Элехант",
+    entry_type=DeviceEntryType.SERVICE,
+)
+
+GROUP_NAMES = {
+    GROUP_GAS: "Газ",
+    GROUP_COLD_WATER: "Холодная вода",
+    GROUP_HOT_WATER: "Горячая вода",
+    GROUP_WATER: "Вода",
+    GROUP_ELECTRIC: "Электричество",
+    GROUP_HEAT: "Тепло",
+}
+
+
+class ElehantFleetTotalSensorEntity(SensorEntity):
+    """Сумма показаний группы счетчиков, записывается при изменении суммы."""
+
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_device_info = FLEET_DEVICE_INFO
+
+    def __init__(
+        self, group: str, totals: FleetTotals, coalescer: StateWriteCoalescer
+    ) -> None:
+        self._group = group
+        self._totals = totals
+        self._coalescer = coalescer
+        self.entity_description = _meter_reading_description(METER_GROUPS[group])
+        self._attr_name = GROUP_NAMES[group]
+        self._attr_unique_id = f"fleet-{group}"
+
+    async def async_added_to_hass(self) -> None:
+        """Follow the group total."""
+        self.async_on_remove(self._totals.add_listener(self._group, self._async_total_changed))
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Drop a pending coalesced write."""
+        self._coalescer.async_discard(self)
+
+    @callback
+    def _async_total_changed(self) -> None:
+        self._coalescer.async_schedule(self, DEFAULT_WRITE_WINDOW)
+
+    @property
+    def available(self) -> bool:
+        """The group has at least one meter."""
+        return self._totals.value(self._group) is not None
+
+    @property
+    def native_value(self) -> Decimal | None:
+        """Return the exact group total."""
+        return self._totals.value(self._group)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        """Return the number of meters in the group."""
+        return {"meters": self._totals.meters.get(self._group, 0)}
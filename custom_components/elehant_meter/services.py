@@ -0,0 +1,290 @@
+"""Службы интеграции Элехант."""
+from __future__ import annotations
+
+import logging
+import time
+from typing import TYPE_CHECKING, Any
+
+import voluptuous as vol
+
+from homeassistant.config_entries import SOURCE_BLUETOOTH
+from homeassistant.const import CONF_ADDRESS
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+import homeassistant.util.dt as dt_util
+
+from .capture import CaptureReader, CaptureWriter, ReplayPipeline, async_replay
+from .const import (
+    BILLING_FILE,
+    CAPTURE_FILE,
+    DEFAULT_INGEST_BURST,
+    DEFAULT_INGEST_RATE,
+    DEFAULT_UNCHANGED_INTERVAL,
+    DOMAIN,
+    EVENT_REPLAY_FINISHED,
+    MANUFACTURER_ID,
+)
+from .discovery import async_get_discovery_filter, parse_serial_ranges
+from .export import (
+    DEFAULT_BACKUPS as BILLING_BACKUPS,
+    DEFAULT_MAX_SIZE as BILLING_MAX_SIZE,
+    PERIODS,
+    async_get_billing_exporter,
+)
+from .hub import async_get_hub
+
+if TYPE_CHECKING:
+    from . import ElehantCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_CAPTURE_START = "capture_start"
+SERVICE_CAPTURE_STOP = "capture_stop"
+SERVICE_REPLAY = "replay"
+SERVICE_SET_DISCOVERY_FILTER = "set_discovery_filter"
+SERVICE_DISMISS_DISCOVERY = "dismiss_discovery"
+SERVICE_RESTORE_DISCOVERY = "restore_discovery"
+SERVICE_GET_HISTORY = "get_history"
+SERVICE_SET_INGEST_BUDGET = "set_ingest_budget"
+SERVICE_EXPORT_READINGS = "export_readings"
+SERVICE_SET_BILLING_SCHEDULE = "set_billing_schedule"
+
+ATTR_MAX_SIZE = "max_size"
+ATTR_BACKUPS = "backups"
+ATTR_PATH = "path"
+ATTR_SPEED = "speed"
+ATTR_ALLOW_TYPES = "allow_types"
+ATTR_DENY_TYPES = "deny_types"
+ATTR_ALLOW_SERIALS = "allow_serials"
+ATTR_DENY_SERIALS = "deny_serials"
+ATTR_MIN_RSSI = "min_rssi"
+ATTR_HOURS = "hours"
+ATTR_RATE = "rate"
+ATTR_BURST = "burst"
+ATTR_UNCHANGED_INTERVAL = "unchanged_interval"
+ATTR_PERIOD = "period"
+
+
+def _serial_ranges(value: Any) -> str:
+    value = cv.string(value)
+    try:
+        parse_serial_ranges(value)
+    except ValueError as err:
+        raise vol.Invalid(f"Неверный диапазон номеров: {value}") from err
+    return value
+
+
+CAPTURE_START_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_MAX_SIZE, default=10): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Optional(ATTR_BACKUPS, default=3): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    }
+)
+
+REPLAY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_PATH): cv.string,
+        vol.Optional(ATTR_SPEED, default=1.0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }
+)
+
+SET_DISCOVERY_FILTER_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ALLOW_TYPES, default=[]): vol.All(cv.ensure_list, [vol.Coerce(int)]),
+        vol.Optional(ATTR_DENY_TYPES, default=[]): vol.All(cv.ensure_list, [vol.Coerce(int)]),
+        vol.Optional(ATTR_ALLOW_SERIALS, default=""): _serial_ranges,
+        vol.Optional(ATTR_DENY_SERIALS, default=""): _serial_ranges,
+        vol.Optional(ATTR_MIN_RSSI): vol.All(vol.Coerce(int), vol.Range(min=-127, max=0)),
+    }
+)
+
+ADDRESSES_SCHEMA = vol.Schema(
+    {vol.Optional(CONF_ADDRESS): vol.All(cv.ensure_list, [cv.string])}
+)
+
+GET_HISTORY_SCHEMA = ADDRESSES_SCHEMA.extend(
+    {vol.Optional(ATTR_HOURS, default=24): vol.All(vol.Coerce(float), vol.Range(min=0))}
+)
+
+SET_INGEST_BUDGET_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_RATE, default=DEFAULT_INGEST_RATE): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(ATTR_BURST, default=DEFAULT_INGEST_BURST): vol.All(
+            vol.Coerce(float), vol.Range(min=1)
+        ),
+        vol.Optional(ATTR_UNCHANGED_INTERVAL, default=DEFAULT_UNCHANGED_INTERVAL): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+    }
+)
+
+SET_BILLING_SCHEDULE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_PERIOD): vol.In(PERIODS),
+        vol.Optional(ATTR_MAX_SIZE, default=BILLING_MAX_SIZE): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Optional(ATTR_BACKUPS, default=BILLING_BACKUPS): vol.All(
+            vol.Coerce(int), vol.Range(min=0)
+        ),
+    }
+)
+
+
+def _coordinator_history(coordinator: ElehantCoordinator, start: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "time": dt_util.utc_from_timestamp(reading.time).isoformat(),
+            "meter_reading": reading.count / 10000,
+            "temperature": reading.temperature / 100,
+        }
+        for reading in coordinator.history.window(start)
+    ]
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Регистрация служб интеграции."""
+
+    async def _async_capture_start(call: ServiceCall) -> None:
+        writer = CaptureWriter(
+            hass.config.path(CAPTURE_FILE),
+            call.data[ATTR_MAX_SIZE] * 1024 * 1024,
+            call.data[ATTR_BACKUPS],
+        )
+        await async_get_hub(hass).async_start_capture(writer)
+
+    async def _async_capture_stop(call: ServiceCall) -> None:
+        await async_get_hub(hass).async_stop_capture()
+
+    async def _async_replay(call: ServiceCall) -> None:
+        path = call.data.get(ATTR_PATH, hass.config.path(CAPTURE_FILE))
+        if not hass.config.is_allowed_path(path):
+            raise ServiceValidationError(f"Путь недоступен: {path}")
+
+        try:
+            reader = await hass.async_add_executor_job(CaptureReader, path)
+        except (OSError, ValueError) as err:
+            raise ServiceValidationError(str(err)) from err
+
+        # Записи разбираются отдельно от хаба, старые показания не попадают
+        # в сенсоры, снимки, историю, суммы и выгрузку
+        pipeline = ReplayPipeline(MANUFACTURER_ID)
+
+        async def _async_run() -> None:
+            try:
+                count = await async_replay(reader, pipeline.handle, call.data[ATTR_SPEED])
+            finally:
+                reader.close()
+            _LOGGER.info("Воспроизведено записей из %s: %s", path, count)
+            hass.bus.async_fire(EVENT_REPLAY_FINISHED, {"path": path, **pipeline.summary()})
+
+        hass.async_create_background_task(_async_run(), f"{DOMAIN} replay {path}")
+
+    async def _async_set_discovery_filter(call: ServiceCall) -> None:
+        discovery_filter = await async_get_discovery_filter(hass)
+        discovery_filter.async_set_rules(dict(call.data))
+
+    async def _async_dismiss_discovery(call: ServiceCall) -> None:
+        discovery_filter = await async_get_discovery_filter(hass)
+        addresses = call.data.get(CONF_ADDRESS)
+
+        for flow in hass.config_entries.flow.async_progress_by_handler(DOMAIN):
+            context = flow["context"]
+            if context.get("source") != SOURCE_BLUETOOTH:
+                continue
+            if addresses is None or context.get("unique_id") in addresses:
+                discovery_filter.async_dismiss(context["unique_id"])
+                hass.config_entries.flow.async_abort(flow["flow_id"])
+
+        for address in addresses or []:
+            discovery_filter.async_dismiss(address)
+
+    async def _async_restore_discovery(call: ServiceCall) -> None:
+        discovery_filter = await async_get_discovery_filter(hass)
+        if (addresses := call.data.get(CONF_ADDRESS)) is None:
+            discovery_filter.async_restore()
+        else:
+            for address in addresses:
+                discovery_filter.async_restore(address)
+
+    @callback
+    def _async_get_history(call: ServiceCall) -> ServiceResponse:
+        addresses = call.data.get(CONF_ADDRESS)
+        start = int(time.time() - call.data[ATTR_HOURS] * 3600)
+        coordinators: dict[str, ElehantCoordinator] = hass.data.get(DOMAIN, {})
+        return {
+            "meters": {
+                coordinator.address: _coordinator_history(coordinator, start)
+                for coordinator in coordinators.values()
+                if addresses is None or coordinator.address in addresses
+            }
+        }
+
+    async def _async_set_ingest_budget(call: ServiceCall) -> None:
+        async_get_hub(hass).scheduler.configure(
+            call.data[ATTR_RATE], call.data[ATTR_BURST], call.data[ATTR_UNCHANGED_INTERVAL]
+        )
+
+    async def _async_export_readings(call: ServiceCall) -> ServiceResponse:
+        exporter = await async_get_billing_exporter(hass)
+        rows = await exporter.async_export()
+        return {"path": hass.config.path(BILLING_FILE), "rows": rows}
+
+    async def _async_set_billing_schedule(call: ServiceCall) -> None:
+        exporter = await async_get_billing_exporter(hass)
+        exporter.async_configure(
+            call.data[ATTR_PERIOD], call.data[ATTR_MAX_SIZE], call.data[ATTR_BACKUPS]
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_CAPTURE_START, _async_capture_start, schema=CAPTURE_START_SCHEMA
+    )
+    hass.services.async_register(DOMAIN, SERVICE_CAPTURE_STOP, _async_capture_stop)
+    hass.services.async_register(DOMAIN, SERVICE_REPLAY, _async_replay, schema=REPLAY_SCHEMA)
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_DISCOVERY_FILTER,
+        _async_set_discovery_filter,
+        schema=SET_DISCOVERY_FILTER_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_DISMISS_DISCOVERY, _async_dismiss_discovery, schema=ADDRESSES_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_RESTORE_DISCOVERY, _async_restore_discovery, schema=ADDRESSES_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_HISTORY,
+        _async_get_history,
+        schema=GET_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_INGEST_BUDGET,
+        _async_set_ingest_budget,
+        schema=SET_INGEST_BUDGET_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT_READINGS,
+        _async_export_readings,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_BILLING_SCHEDULE,
+        _async_set_billing_schedule,
+        schema=SET_BILLING_SCHEDULE_SCHEMA,
+    )
@@ -0,0 +1,94 @@
+"""Последние пакеты счетчиков Элехант для восстановления после перезапуска."""
+from __future__ import annotations
+
+import time
+from typing import Any, NamedTuple
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.singleton import singleton
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_SNAPSHOT, DOMAIN
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.snapshot"
+
+# Не чаще одной записи за SAVE_DELAY секунд
+SAVE_DELAY = 300
+
+# Более старые снимки не восстанавливаются
+MAX_AGE = 24 * 3600
+
+
+class Snapshot(NamedTuple):
+    """Последний пакет счетчика."""
+
+    time: float
+    rssi: int
+    payload: bytes
+
+
+class SnapshotStore:
+    """Снимки последних пакетов всех счетчиков в одном файле.
+
+    Хранятся исходные данные производителя, показания восстанавливаются
+    тем же декодером, что и для живых пакетов.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._snapshots: dict[str, Snapshot] = {}
+        self._save_scheduled = False
+
+    async def async_load(self) -> None:
+        """Загрузка сохраненных снимков."""
+
+        if (data := await self._store.async_load()) is None:
+            return
+        for address, (payload, packet_time, rssi) in data.items():
+            self._snapshots[address] = Snapshot(packet_time, rssi, bytes.fromhex(payload))
+
+    @callback
+    def async_get(self, address: str) -> Snapshot | None:
+        """Снимок счетчика, если он не старше MAX_AGE."""
+
+        snapshot = self._snapshots.get(address)
+        if snapshot is None or time.time() - snapshot.time > MAX_AGE:
+            return None
+        return snapshot
+
+    @callback
+    def async_record(self, address: str, packet_time: float, rssi: int, payload: bytes) -> None:
+        """Запомнить пакет, запись на диск откладывается."""
+
+        self._snapshots[address] = Snapshot(packet_time, rssi, payload)
+        if not self._save_scheduled:
+            # async_delay_save переносит запись при каждом вызове, поэтому
+            # планируется один раз до сохранения
+            self._save_scheduled = True
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def async_remove(self, address: str) -> None:
+        """Удалить снимок счетчика."""
+
+        if self._snapshots.pop(address, None) is not None and not self._save_scheduled:
+            self._save_scheduled = True
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self) -> dict[str, Any]:
+        self._save_scheduled = False
+        return {
+            address: [snapshot.payload.hex(), snapshot.time, snapshot.rssi]
+            for address, snapshot in self._snapshots.items()
+        }
+
+
+@singleton(DATA_SNAPSHOT)
+async def async_get_snapshot_store(hass: HomeAssistant) -> SnapshotStore:
+    """Общее хранилище снимков, загружается при первом обращении."""
+
+    store = SnapshotStore(hass)
+    await store.async_load()
+    return store
@@ -0,0 +1,74 @@
+"""Поиск замолчавших счетчиков Элехант."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from datetime import datetime, timedelta
+import time
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import STALE_TICK, STALE_WHEEL_SLOTS
+from .wheel import TimerWheel
+
+
+class StalenessTracker:
+    """Сроки молчания всех счетчиков на одном колесе таймеров и одном тике."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._wheel = TimerWheel(STALE_TICK, STALE_WHEEL_SLOTS, time.monotonic())
+        self._timeouts: dict[str, float] = {}
+        self._callbacks: dict[str, Callable[[], None]] = {}
+        self._unsub: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_track(
+        self, address: str, timeout: float, on_silent: Callable[[], None]
+    ) -> CALLBACK_TYPE:
+        """Вызвать on_silent, если счетчик молчит timeout секунд; 0 - не отслеживать."""
+
+        self._callbacks[address] = on_silent
+        self.async_set_timeout(address, timeout)
+
+        if self._unsub is None:
+            self._unsub = async_track_time_interval(
+                self.hass, self._async_tick, timedelta(seconds=STALE_TICK)
+            )
+
+        @callback
+        def _async_untrack() -> None:
+            if self._callbacks.get(address) is not on_silent:
+                return
+            del self._callbacks[address]
+            self._timeouts.pop(address, None)
+            self._wheel.cancel(address)
+            if not self._callbacks and self._unsub is not None:
+                self._unsub()
+                self._unsub = None
+
+        return _async_untrack
+
+    @callback
+    def async_set_timeout(self, address: str, timeout: float) -> None:
+        """Новый срок молчания, отсчет начинается заново."""
+
+        self._wheel.cancel(address)
+        if timeout:
+            self._timeouts[address] = timeout
+            self._wheel.schedule(address, time.monotonic() + timeout)
+        else:
+            self._timeouts.pop(address, None)
+
+    @callback
+    def async_touch(self, address: str) -> None:
+        """Счетчик передал пакет."""
+
+        if (timeout := self._timeouts.get(address)) is not None:
+            self._wheel.schedule(address, time.monotonic() + timeout)
+
+    @callback
+    def _async_tick(self, _now: datetime) -> None:
+        for address in self._wheel.advance(time.monotonic()):
+            if (on_silent := self._callbacks.get(address)) is not None:
+                on_silent()
@@ -0,0 +1,101 @@
+"""Счетчики и гистограммы времени этапов обработки пакетов."""
+from __future__ import annotations
+
+from array import array
+from typing import Any
+
+# Ячейка гистограммы i - время от 2**(i-1) до 2**i нс
+HISTOGRAM_BUCKETS = 32
+
+# Время замеряется у каждого SAMPLE_MASK + 1 вызова, вызовы считаются все
+SAMPLE_MASK = 15
+
+
+class StageStats:
+    """Число вызовов этапа, время выборки вызовов и гистограмма по степеням двойки.
+
+    Замер времени стоит дороже самого учета, поэтому вызывающий код
+    замеряет только вызовы, для которых sample() вернул True.
+    """
+
+    __slots__ = ("calls", "count", "total_ns", "max_ns", "buckets")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = array("Q", bytes(8 * HISTOGRAM_BUCKETS))
+
+    def sample(self) -> bool:
+        """Учесть вызов; True - время вызова нужно замерить."""
+        self.calls += 1
+        return not self.calls & SAMPLE_MASK
+
+    def record(self, ns: int) -> None:
+        """Учесть замер длительностью ns наносекунд."""
+
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        bucket = ns.bit_length()
+        self.buckets[bucket if bucket < HISTOGRAM_BUCKETS else HISTOGRAM_BUCKETS - 1] += 1
+
+    @property
+    def mean_us(self) -> float | None:
+        """Среднее время, мкс."""
+        return self.total_ns / self.count / 1000 if self.count else None
+
+    def percentile_us(self, fraction: float) -> float | None:
+        """Верхняя граница ячейки гистограммы с долей вызовов fraction, мкс."""
+
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return (1 << bucket) / 1000
+        return self.max_ns / 1000
+
+    def as_dict(self) -> dict[str, Any]:
+        """Сводка для диагностики."""
+
+        def _round(value: float | None) -> float | None:
+            return round(value, 3) if value is not None else None
+
+        return {
+            "calls": self.calls,
+            "sampled": self.count,
+            "mean_us": _round(self.mean_us),
+            "p50_us": _round(self.percentile_us(0.5)),
+            "p99_us": _round(self.percentile_us(0.99)),
+            "max_us": round(self.max_ns / 1000, 3),
+        }
+
+
+class PipelineStats:
+    """Этапы обработки пакетов и причины отказа."""
+
+    __slots__ = ("classify", "decode", "update", "rejects")
+
+    def __init__(self) -> None:
+        self.classify = StageStats()
+        self.decode = StageStats()
+        self.update = StageStats()
+        self.rejects: dict[str, int] = {}
+
+    def reject(self, reason: str) -> None:
+        """Учесть отброшенный пакет."""
+        self.rejects[reason] = self.rejects.get(reason, 0) + 1
+
+    def as_dict(self) -> dict[str, Any]:
+        """Сводка для диагностики."""
+        return {
+            "classify": self.classify.as_dict(),
+            "decode": self.decode.as_dict(),
+            "update": self.update.as_dict(),
+            "rejects": dict(self.rejects),
+        }
@@ -0,0 +1,58 @@
+"""Ограничение записи состояний сенсоров Элехант."""
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from .const import (
+    CONF_MIN_INTERVAL,
+    CONF_RSSI_DEADBAND,
+    CONF_TEMPERATURE_DEADBAND,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_RSSI_DEADBAND,
+    DEFAULT_TEMPERATURE_DEADBAND,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class WritePolicy:
+    """Условия записи состояния: минимальное изменение значения и интервал между записями."""
+
+    deadband: float | None = None
+    min_interval: float = 0
+
+    def should_write(
+        self, last_value: Any, last_time: float, value: Any, now: float
+    ) -> bool:
+        """Нужно ли записать новое значение после last_value, записанного в last_time."""
+
+        if value == last_value:
+            return False
+        if now - last_time < self.min_interval:
+            return False
+        if self.deadband and last_value is not None and value is not None:
+            return abs(float(value) - float(last_value)) >= self.deadband
+        return True
+
+
+def build_write_policies(options: Mapping[str, Any]) -> dict[str, WritePolicy]:
+    """Политики записи по ключам сенсоров из параметров записи конфигурации."""
+
+    min_interval = options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL)
+
+    return {
+        "meter_reading": WritePolicy(),
+        "temperature": WritePolicy(
+            deadband=options.get(CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND)
+        ),
+        "rssi": WritePolicy(
+            deadband=options.get(CONF_RSSI_DEADBAND, DEFAULT_RSSI_DEADBAND),
+            min_interval=min_interval,
+        ),
+        "battery": WritePolicy(min_interval=min_interval),
+        "timestamp": WritePolicy(min_interval=min_interval),
+        "flow_rate": WritePolicy(min_interval=min_interval),
+        "rate_average": WritePolicy(min_interval=min_interval),
+        "leak_flow": WritePolicy(),
+    }
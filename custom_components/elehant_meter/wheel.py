@@ -0,0 +1,83 @@
+"""Хешированное колесо таймеров."""
+from __future__ import annotations
+
+from collections.abc import Hashable
+import math
+
+
+class TimerWheel:
+    """Таймеры многих ключей на одном периодическом тике.
+
+    Ключ лежит в ячейке первого тика не раньше своего срока. Продление срока меняет только
+    словарь сроков, ключ переносится в нужную ячейку, когда колесо доходит
+    до старой. Поэтому продление - O(1), а тик проверяет одну ячейку.
+    Срок можно только отодвигать; для более раннего срока нужен cancel.
+    """
+
+    __slots__ = ("tick", "_slots", "_deadlines", "_slot_of", "_cursor")
+
+    def __init__(self, tick: float, slots: int, now: float = 0.0) -> None:
+        self.tick = tick
+        self._slots: list[set[Hashable]] = [set() for _ in range(slots)]
+        self._deadlines: dict[Hashable, float] = {}
+        self._slot_of: dict[Hashable, int] = {}
+        self._cursor = int(now // tick)
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Срок ключа; для ключа в колесе срок только продлевается."""
+
+        if key in self._deadlines:
+            self._deadlines[key] = deadline
+            return
+        self._deadlines[key] = deadline
+        self._insert(key, deadline)
+
+    def cancel(self, key: Hashable) -> None:
+        """Снять таймер ключа."""
+
+        if self._deadlines.pop(key, None) is not None:
+            self._slots[self._slot_of.pop(key)].discard(key)
+
+    def advance(self, now: float) -> list[Hashable]:
+        """Провернуть колесо до now, ключи с истекшим сроком снимаются и возвращаются."""
+
+        target = int(now // self.tick)
+        size = len(self._slots)
+        # При пропуске больше оборота достаточно проверить каждую ячейку раз
+        first = max(self._cursor + 1, target - size + 1)
+        self._cursor = target
+
+        expired = []
+        for tick in range(first, target + 1):
+            index = tick % size
+            slot = self._slots[index]
+            if not slot:
+                continue
+            for key in list(slot):
+                deadline = self._deadlines[key]
+                if deadline <= now:
+                    slot.discard(key)
+                    del self._deadlines[key]
+                    del self._slot_of[key]
+                    expired.append(key)
+                elif (new_index := self._index(deadline)) != index:
+                    slot.discard(key)
+                    self._slots[new_index].add(key)
+                    self._slot_of[key] = new_index
+        return expired
+
+    def _index(self, deadline: float) -> int:
+        # Тик, на котором срок уже наступил: ячейка тика внутри срока
+        # проверялась бы раньше него и откладывала ключ на оборот
+        return max(math.ceil(deadline / self.tick), self._cursor + 1) % len(self._slots)
+
+    def _insert(self, key: Hashable, deadline: float) -> None:
+        index = self._index(deadline)
+        self._slots[index].add(key)
+        self._slot_of[key] = index
@@ -0,0 +1,29 @@
+"""Запуск шлюза Элехант без Home Assistant.
+
+Пакет интеграции загружается без выполнения __init__.py, который
+импортирует homeassistant; используются только модули ядра.
+
+    python elehant_gateway.py --capture elehant_capture.bin > readings.ndjson
+    python elehant_gateway.py --batch 500 | mosquitto_pub -l -t elehant
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+import types
+
+COMPONENT = Path(__file__).resolve().parent / "custom_components" / "elehant_meter"
+
+
+def load_gateway():
+    package = types.ModuleType("elehant_meter")
+    package.__path__ = [str(COMPONENT)]
+    sys.modules["elehant_meter"] = package
+
+    from elehant_meter import gateway
+
+    return gateway
+
+
+if __name__ == "__main__":
+    load_gateway().main()
@@ -0,0 +1,24 @@
+"""Общие настройки тестов модулей интеграции Элехант.
+
+Модули без импортов Home Assistant тестируются и без него: пакет интеграции
+регистрируется без выполнения __init__, как в benchmarks/bench_pipeline.py.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+import types
+
+ROOT = Path(__file__).resolve().parents[1]
+
+sys.path.insert(0, str(ROOT))
+
+try:
+    import homeassistant  # noqa: F401
+except ImportError:
+    _components = types.ModuleType("custom_components")
+    _components.__path__ = [str(ROOT / "custom_components")]
+    _package = types.ModuleType("custom_components.elehant_meter")
+    _package.__path__ = [str(ROOT / "custom_components" / "elehant_meter")]
+    sys.modules.setdefault("custom_components", _components)
+    sys.modules.setdefault("custom_components.elehant_meter", _package)
@@ -0,0 +1,18 @@
+"""Пакеты счетчиков Элехант для тестов."""
+from __future__ import annotations
+
+
+def build_payload(
+    mtype: int, model: int, num: int, count: int, temp: int, battery: int = 100, fw: int = 12
+) -> bytes:
+    """Данные производителя версии 1."""
+
+    return (
+        b"\x80\x00\x00\x01"
+        + bytes((mtype, model))
+        + num.to_bytes(3, "little")
+        + count.to_bytes(4, "little")
+        + bytes((battery,))
+        + temp.to_bytes(2, "little")
+        + bytes((fw,))
+    )
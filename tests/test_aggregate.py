@@ -0,0 +1,74 @@
+"""Тесты сумм показаний парка."""
+from __future__ import annotations
+
+from decimal import Decimal
+
+from custom_components.elehant_meter.aggregate import FleetTotals
+
+
+def make_totals() -> FleetTotals:
+    return FleetTotals({"hot_water": "water", "cold_water": "water"})
+
+
+def test_sum_is_exact() -> None:
+    totals = make_totals()
+    # 0.1 + 0.2 без ошибки двоичной плавающей точки
+    totals.update("a", "gas", 1000)
+    totals.update("b", "gas", 2000)
+
+    assert totals.value("gas") == Decimal("0.3")
+    assert totals.meters["gas"] == 2
+    assert totals.value("water") is None
+
+
+def test_update_applies_difference() -> None:
+    totals = make_totals()
+    totals.update("a", "gas", 1000)
+    totals.update("b", "gas", 2000)
+    totals.update("a", "gas", 1500)
+
+    assert totals.value("gas") == Decimal("0.35")
+    assert totals.meters["gas"] == 2
+
+
+def test_child_groups_add_to_parent() -> None:
+    totals = make_totals()
+    totals.update("a", "hot_water", 10000)
+    totals.update("b", "cold_water", 25000)
+    totals.update("c", "water", 5000)
+
+    assert totals.value("hot_water") == Decimal("1")
+    assert totals.value("cold_water") == Decimal("2.5")
+    assert totals.value("water") == Decimal("4")
+    assert totals.meters["water"] == 3
+
+
+def test_group_change_and_remove() -> None:
+    totals = make_totals()
+    totals.update("a", "hot_water", 10000)
+    totals.update("a", "cold_water", 12000)
+
+    assert totals.value("hot_water") is None
+    assert totals.value("cold_water") == Decimal("1.2")
+    assert totals.value("water") == Decimal("1.2")
+
+    totals.remove("a")
+    totals.remove("a")
+    assert totals.value("cold_water") is None
+    assert totals.value("water") is None
+
+
+def test_listeners_of_group_and_parent() -> None:
+    totals = make_totals()
+    calls: list[str] = []
+    remove = totals.add_listener("water", lambda: calls.append("water"))
+    totals.add_listener("hot_water", lambda: calls.append("hot_water"))
+
+    totals.update("a", "hot_water", 100)
+    # Без изменения показания слушатели не вызываются
+    totals.update("a", "hot_water", 100)
+    assert calls == ["hot_water", "water"]
+
+    remove()
+    totals.update("a", "hot_water", 200)
+    assert calls == ["hot_water", "water", "hot_water"]
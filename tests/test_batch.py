@@ -0,0 +1,113 @@
+"""Тесты пакетного разбора на NumPy против ElehantData."""
+from __future__ import annotations
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from custom_components.elehant_meter.batch import decode_batch, decode_capture  # noqa: E402
+from custom_components.elehant_meter.capture import (  # noqa: E402
+    CaptureWriter,
+    ReplayAdvertisement,
+    ReplayDevice,
+)
+from custom_components.elehant_meter.const import MANUFACTURER_ID, ElehantData  # noqa: E402
+
+from .payloads import build_payload  # noqa: E402
+
+GAS = "B0:01:01:00:00:05"
+WATER = "B0:02:02:00:00:07"
+GAS_PAYLOAD = build_payload(1, 1, 5, 123456, 2150)
+
+# Адрес, данные производителя и ожидаемая причина отказа
+ARCHIVE = [
+    (GAS, GAS_PAYLOAD, None),
+    (WATER, build_payload(2, 2, 7, 2**32 - 1, 65535, battery=255, fw=1), None),
+    (GAS, GAS_PAYLOAD[:16], "payload"),
+    (GAS, GAS_PAYLOAD[:3], "payload"),
+    (GAS, b"", "payload"),
+    (GAS, GAS_PAYLOAD[:3] + b"\x07" + GAS_PAYLOAD[4:], "payload"),
+    (GAS, GAS_PAYLOAD + b"\x00\x00", None),
+    (WATER, GAS_PAYLOAD, "mismatch"),
+    ("B1" + GAS[2:], GAS_PAYLOAD, "mac"),
+    ("B0:7F:7F:00:00:01", GAS_PAYLOAD, "mac"),
+]
+
+FIELDS = ("packet_ver", "mtype", "model", "serial", "count", "battery", "temperature", "fw")
+
+
+def scalar(address: str, payload: bytes) -> ElehantData:
+    return ElehantData(
+        ReplayDevice(address), ReplayAdvertisement({MANUFACTURER_ID: payload}, -70)
+    )
+
+
+def scalar_fields(data: ElehantData) -> tuple:
+    if data.reject is not None:
+        return (0,) * len(FIELDS)
+    return (
+        data.packet_ver,
+        data.mtype,
+        data.model,
+        data.serial,
+        data.count,
+        data.battery,
+        data.raw_temperature,
+        data.fw,
+    )
+
+
+def assert_matches_scalar(readings, archive) -> None:
+    reasons = readings.reasons()
+    columns = [getattr(readings, name).tolist() for name in FIELDS]
+    for index, (address, payload, reject) in enumerate(archive):
+        data = scalar(address, payload)
+        assert data.reject == reject
+        assert reasons[index] == reject
+        assert tuple(column[index] for column in columns) == scalar_fields(data)
+
+
+def test_decode_batch_matches_scalar_decoder() -> None:
+    addresses, payloads, _ = zip(*ARCHIVE)
+    readings = decode_batch(addresses, payloads)
+
+    assert_matches_scalar(readings, ARCHIVE)
+    assert readings.valid.tolist() == [reject is None for *_, reject in ARCHIVE]
+    # Батарея ограничена 100 %, как в ElehantData
+    assert readings.battery[1] == 100
+
+
+def test_decode_batch_missing_payload() -> None:
+    readings = decode_batch([GAS, GAS], [None, GAS_PAYLOAD])
+
+    assert readings.reasons() == ["payload", None]
+    assert readings.count.tolist() == [0, 123456]
+
+
+def test_decode_batch_checks_lengths() -> None:
+    with pytest.raises(ValueError):
+        decode_batch([GAS], [])
+
+
+def test_decode_capture_matches_scalar_decoder(tmp_path) -> None:
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path, 1 << 20, 0)
+    for index, (address, payload, _) in enumerate(ARCHIVE):
+        writer.append(float(index), address, -60 - index, "local", payload)
+    writer.write(writer.take())
+    writer.close()
+
+    times, addresses, rssi, readings = decode_capture(path)
+
+    assert times.tolist() == [float(index) for index in range(len(ARCHIVE))]
+    assert rssi.tolist() == [-60 - index for index in range(len(ARCHIVE))]
+    assert bytes(addresses[0]) == bytes.fromhex(GAS.replace(":", ""))
+    assert_matches_scalar(readings, ARCHIVE)
+
+
+def test_decode_capture_rejects_foreign_file(tmp_path) -> None:
+    path = tmp_path / "foreign.bin"
+    path.write_bytes(b"not a capture")
+
+    with pytest.raises(ValueError):
+        decode_capture(str(path))
@@ -0,0 +1,80 @@
+"""Тесты буферов фиксированного размера."""
+from __future__ import annotations
+
+from custom_components.elehant_meter.buffers import (
+    PacketRecord,
+    PacketRing,
+    Reading,
+    ReadingHistory,
+)
+
+
+def test_packet_ring_keeps_order_before_wrap() -> None:
+    ring = PacketRing(4)
+    assert list(ring) == []
+
+    ring.append(1.0, -70, "proxy1", b"a")
+    ring.append(2.0, -60, None, None)
+
+    assert len(ring) == 2
+    assert list(ring) == [
+        PacketRecord(1.0, -70, "proxy1", b"a"),
+        PacketRecord(2.0, -60, None, None),
+    ]
+
+
+def test_packet_ring_overwrites_oldest() -> None:
+    ring = PacketRing(3)
+    for number in range(7):
+        ring.append(float(number), -number, f"proxy{number}", bytes([number]))
+
+    assert len(ring) == 3
+    assert [record.time for record in ring] == [4.0, 5.0, 6.0]
+    assert [record.payload for record in ring] == [b"\x04", b"\x05", b"\x06"]
+    assert [record.rssi for record in ring] == [-4, -5, -6]
+
+
+def make_history(size: int, times: range) -> ReadingHistory:
+    history = ReadingHistory(size)
+    for time in times:
+        history.append(time, time * 10, 2000 + time)
+    return history
+
+
+def test_history_grows_to_size() -> None:
+    history = ReadingHistory(5)
+    assert history.latest() is None
+    assert list(history) == []
+
+    history.append(100, 1000, 2150)
+    history.append(160, 1010, 2140)
+
+    assert len(history) == 2
+    assert history.latest() == Reading(160, 1010, 2140)
+    assert list(history) == [Reading(100, 1000, 2150), Reading(160, 1010, 2140)]
+
+
+def test_history_wraps_and_keeps_newest() -> None:
+    history = make_history(4, range(10))
+
+    assert len(history) == 4
+    assert [reading.time for reading in history] == [6, 7, 8, 9]
+    assert history.latest() == Reading(9, 90, 2009)
+
+
+def test_history_window_across_wrap() -> None:
+    history = make_history(5, range(0, 80, 10))
+
+    # В истории 30..70, начало кольца в середине массивов
+    assert [reading.time for reading in history.window(45)] == [50, 60, 70]
+    assert [reading.time for reading in history.window(30, 50)] == [30, 40, 50]
+    assert [reading.time for reading in history.window(0, 35)] == [30]
+    assert list(history.window(71)) == []
+    assert list(history.window(0, 20)) == []
+
+
+def test_history_of_one() -> None:
+    history = make_history(1, range(3))
+
+    assert list(history) == [Reading(2, 20, 2002)]
+    assert history.latest() == Reading(2, 20, 2002)
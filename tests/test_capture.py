@@ -0,0 +1,106 @@
+"""Тесты записи и воспроизведения потока объявлений."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from custom_components.elehant_meter.capture import (
+    CAPTURE_MAGIC,
+    RECORD,
+    CaptureReader,
+    CaptureRecord,
+    CaptureWriter,
+    ReplayPipeline,
+    async_replay,
+    pack_record,
+    unpack_record,
+)
+from custom_components.elehant_meter.const import MANUFACTURER_ID
+
+from .payloads import build_payload
+
+ADDRESS = "B0:01:01:00:00:05"
+
+
+def test_record_round_trip():
+    payload = build_payload(1, 1, 5, 1000, 1500)
+    packed = pack_record(12.5, ADDRESS, -200, "proxy-with-a-long-name", payload)
+    assert len(packed) == RECORD.size
+
+    record = unpack_record(packed)
+    assert record == CaptureRecord(12.5, ADDRESS, -128, "proxy-with-a-long", payload)
+
+
+def test_writer_reader_round_trip(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path, 1024 * 1024, 1)
+    expected = []
+    for index in range(10):
+        payload = build_payload(1, 1, 5, 1000 + index, 1500)
+        writer.append(float(index), ADDRESS, -60, "local", payload)
+        expected.append(CaptureRecord(float(index), ADDRESS, -60, "local", payload))
+    # Адрес не в формате MAC пропускается
+    writer.append(99.0, "not-a-mac", -60, "local", b"")
+    assert writer.records == 10
+
+    writer.write(writer.take())
+    assert writer.take() == b""
+    writer.close()
+
+    with CaptureReader(path) as reader:
+        assert len(reader) == 10
+        assert list(reader) == expected
+
+
+def test_writer_rotates_by_size(tmp_path):
+    path = tmp_path / "capture.bin"
+    writer = CaptureWriter(str(path), len(CAPTURE_MAGIC) + RECORD.size, 2)
+    for index in range(3):
+        writer.append(float(index), ADDRESS, -60, "local", b"\x80")
+        writer.write(writer.take())
+    writer.close()
+
+    assert not path.exists()
+    for suffix, time in ((".1", 2.0), (".2", 1.0)):
+        with CaptureReader(f"{path}{suffix}") as reader:
+            assert [record.time for record in reader] == [time]
+
+
+def test_reader_rejects_foreign_file(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a capture file")
+    with pytest.raises(ValueError):
+        CaptureReader(str(path))
+
+
+def test_replay_pipeline_keeps_last_reading_per_meter():
+    pipeline = ReplayPipeline(MANUFACTURER_ID)
+    first = build_payload(1, 1, 5, 1000, 1500)
+    second = build_payload(1, 1, 5, 1200, 1500)
+    records = [
+        CaptureRecord(1.0, ADDRESS, -60, "a", first),
+        # Копия того же пакета с другого прокси
+        CaptureRecord(1.1, ADDRESS, -70, "b", first),
+        CaptureRecord(20.0, ADDRESS, -60, "a", second),
+        CaptureRecord(21.0, "B0:01:01:00:00:06", -60, "a", b"\x00\x01"),
+    ]
+    for record in records:
+        pipeline.handle(record)
+
+    summary = pipeline.summary()
+    assert summary["records"] == 4
+    assert summary["pipeline"]["rejects"] == {"duplicate": 1, "payload": 1}
+    assert summary["meters"] == {
+        ADDRESS: {"name": "Счетчик газа СГБ-1.8: 0000005", "meter_reading": "0.12", "time": 20.0}
+    }
+
+
+def test_replay_without_pauses_counts_records():
+    records = [CaptureRecord(float(index), ADDRESS, -60, "a", b"") for index in range(2500)]
+    handled: list[CaptureRecord] = []
+
+    count = asyncio.run(async_replay(records, handled.append, 0))
+
+    assert count == 2500
+    assert handled == records
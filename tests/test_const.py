@@ -0,0 +1,72 @@
+"""Тесты разбора адреса и показаний пакета."""
+from __future__ import annotations
+
+from custom_components.elehant_meter.capture import ReplayAdvertisement, ReplayDevice
+from custom_components.elehant_meter.const import (
+    MAC_INVALID,
+    MANUFACTURER_ID,
+    ElehantData,
+    parse_mac,
+)
+
+from .payloads import build_payload
+
+ADDRESS = "B0:01:01:00:00:05"
+
+
+def decode(address: str, payload: bytes, rssi: int = -70) -> ElehantData:
+    return ElehantData(ReplayDevice(address), ReplayAdvertisement({MANUFACTURER_ID: payload}, rssi))
+
+
+def test_parse_mac() -> None:
+    macdata = parse_mac(ADDRESS)
+    assert macdata.signValid
+    assert (macdata.mtype, macdata.model) == (1, 1)
+    # Регистр не важен, результат общий для адресов одной модели
+    assert parse_mac("b0:01:01:aa:bb:cc") is macdata
+
+    assert parse_mac("B1:01:01:00:00:05") is MAC_INVALID
+    assert parse_mac("B0:7F:7F:00:00:05") is MAC_INVALID
+
+
+def test_reading_values() -> None:
+    data = decode(ADDRESS, build_payload(1, 1, 5, 123456, 2150, battery=250, fw=12), -65)
+
+    assert data.reject is None
+    assert data.address == ADDRESS
+    assert (data.mtype, data.model, data.packet_ver) == (1, 1, 1)
+    assert data.id_meter == "0000005"
+    assert data.name == "Счетчик газа СГБ-1.8: 0000005"
+    assert data.meter_reading == "12.3456"
+    assert data.temperature == "21.5"
+    assert data.battery == 100
+    assert data.frimware == 1.2
+    assert data.rssi == -65
+    assert not hasattr(data, "__dict__")
+
+
+def test_seen_keeps_reading() -> None:
+    data = decode(ADDRESS, build_payload(1, 1, 5, 1000, 2150))
+
+    seen = data.seen(-50, 100.0)
+
+    assert seen[:10] == data[:10]
+    assert (seen.rssi, seen.time) == (-50, 100.0)
+    assert seen.timestamp.timestamp() == 100.0
+    assert type(seen) is ElehantData
+
+
+def test_rejects() -> None:
+    payload = build_payload(1, 1, 5, 1000, 2150)
+
+    assert decode("B1:01:01:00:00:05", payload).reject == "mac"
+    assert decode(ADDRESS, payload[:10]).reject == "payload"
+    assert decode(ADDRESS, build_payload(2, 2, 5, 1000, 2150)).reject == "mismatch"
+
+    rejected = decode(ADDRESS, payload[:10])
+    assert rejected.address == ADDRESS
+    assert rejected.name is None
+    assert rejected.meter_reading is None
+    assert not rejected.macdata.signValid
+    assert ElehantData().reject is None
+    assert ElehantData().address is None
@@ -0,0 +1,68 @@
+"""Тесты отсева копий пакета от нескольких прокси."""
+from __future__ import annotations
+
+from custom_components.elehant_meter.dedup import Deduplicator
+
+ADDRESS = "B0:01:01:00:00:05"
+
+
+def make_dedup() -> Deduplicator:
+    return Deduplicator(window=2.0, alpha=0.5, source_timeout=60.0)
+
+
+def test_copy_from_other_proxy_dropped_within_window() -> None:
+    dedup = make_dedup()
+
+    assert dedup.accept(ADDRESS, b"a", "proxy1", -70, 0.0)
+    assert not dedup.accept(ADDRESS, b"a", "proxy2", -60, 0.5)
+    assert dedup.duplicates == 1
+    assert dedup.address_duplicates(ADDRESS) == 1
+    # Окно отсчитывается от принятого пакета
+    assert dedup.accept(ADDRESS, b"a", "proxy1", -70, 2.0)
+    assert dedup.accepted == 2
+
+
+def test_new_payload_accepted_at_once() -> None:
+    dedup = make_dedup()
+
+    assert dedup.accept(ADDRESS, b"a", "proxy1", -70, 0.0)
+    assert dedup.accept(ADDRESS, b"b", "proxy1", -70, 0.1)
+    assert dedup.accept("B0:01:01:00:00:06", b"b", "proxy1", -70, 0.1)
+    assert dedup.duplicates == 0
+
+
+def test_best_source_uses_smoothed_rssi_of_all_copies() -> None:
+    dedup = make_dedup()
+
+    dedup.accept(ADDRESS, b"a", "proxy1", -70, 0.0)
+    assert dedup.best(ADDRESS) == ("proxy1", -70)
+
+    # Копия отсеяна, но ее сигнал учтен: среднее proxy2 выше на следующем пакете
+    dedup.accept(ADDRESS, b"a", "proxy2", -50, 0.5)
+    dedup.accept(ADDRESS, b"b", "proxy1", -80, 5.0)
+    assert dedup.best(ADDRESS) == ("proxy2", -50)
+    assert dedup.sources(ADDRESS)["proxy1"].rssi == -75
+    assert dedup.sources(ADDRESS)["proxy1"].packets == 2
+
+
+def test_silent_source_expires() -> None:
+    dedup = make_dedup()
+
+    dedup.accept(ADDRESS, b"a", "proxy2", -40, 0.0)
+    dedup.accept(ADDRESS, b"b", "proxy1", -70, 100.0)
+
+    assert dedup.best(ADDRESS) == ("proxy1", -70)
+    assert list(dedup.sources(ADDRESS)) == ["proxy1"]
+
+
+def test_forget_resets_address() -> None:
+    dedup = make_dedup()
+    dedup.accept(ADDRESS, b"a", None, -70, 0.0)
+    assert dedup.best(ADDRESS) == ("", -70)
+
+    dedup.forget(ADDRESS)
+
+    assert dedup.best(ADDRESS) is None
+    assert dedup.sources(ADDRESS) == {}
+    assert dedup.address_duplicates(ADDRESS) == 0
+    assert dedup.accept(ADDRESS, b"a", None, -70, 0.5)
@@ -0,0 +1,88 @@
+"""Тесты потоковых оценок расхода и утечки."""
+from __future__ import annotations
+
+import pytest
+
+from custom_components.elehant_meter.estimators import FlowEstimator
+
+# Отсчет в секунду - 0.36 единицы показаний в час
+RATE = 0.36
+
+
+def feed(estimator: FlowEstimator, start: float, end: float, count: int, step: int = 1) -> int:
+    """Отсчеты раз в минуту, step единиц счетчика в секунду; возвращает следующий отсчет."""
+
+    now = start
+    while now <= end:
+        estimator.update(count, now)
+        now += 60
+        count += 60 * step
+    return count
+
+
+def test_no_readings() -> None:
+    estimator = FlowEstimator()
+
+    assert estimator.rate is None
+    assert estimator.rate_average is None
+    assert estimator.leak_flow is None
+    assert not estimator.leak
+
+
+def test_constant_flow() -> None:
+    estimator = FlowEstimator()
+    feed(estimator, 0, 7200, 1000)
+
+    assert estimator.rate == RATE
+    assert estimator.rate_average == pytest.approx(RATE, abs=1e-3)
+
+
+def test_window_forgets_old_flow() -> None:
+    estimator = FlowEstimator()
+    count = feed(estimator, 0, 3600, 0)
+    feed(estimator, 3660, 3 * 3600, count, step=0)
+
+    assert estimator.rate == 0.0
+    assert estimator.rate_average == pytest.approx(0, abs=1e-4)
+
+
+def test_leak_after_continuous_flow() -> None:
+    estimator = FlowEstimator()
+    count = feed(estimator, 0, 5 * 3600, 0)
+
+    assert not estimator.leak
+    assert estimator.leak_flow == 0.0
+
+    feed(estimator, 5 * 3600 + 60, 7 * 3600, count)
+    assert estimator.leak
+    assert estimator.leak_flow == RATE
+
+
+def test_idle_gap_ends_leak() -> None:
+    estimator = FlowEstimator()
+    count = feed(estimator, 0, 7 * 3600, 0)
+    assert estimator.leak
+
+    feed(estimator, 7 * 3600 + 60, 7 * 3600 + 1200, count, step=0)
+    assert not estimator.leak
+    assert estimator.leak_flow == 0.0
+
+
+def test_counter_reset_restarts_estimates() -> None:
+    estimator = FlowEstimator()
+    feed(estimator, 0, 7 * 3600, 100000)
+
+    estimator.update(5, 7 * 3600 + 60)
+
+    assert estimator.rate == 0.0
+    assert estimator.rate_average == 0.0
+    assert not estimator.leak
+
+
+def test_repeated_time_ignored() -> None:
+    estimator = FlowEstimator()
+    estimator.update(0, 0)
+    estimator.update(60, 60)
+    estimator.update(500, 60)
+
+    assert estimator.rate == RATE
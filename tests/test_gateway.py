@@ -0,0 +1,87 @@
+"""Тесты шлюза без Home Assistant."""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import sys
+from types import SimpleNamespace
+
+from custom_components.elehant_meter.capture import CaptureWriter
+from custom_components.elehant_meter.gateway import Advertisement, Gateway, async_main
+
+from .payloads import build_payload
+
+ADDRESS = "B0:01:01:00:00:05"
+
+
+def test_decode_batch_emits_json_lines() -> None:
+    gateway = Gateway(io.StringIO())
+    payload = build_payload(1, 1, 5, 123456, 2150, battery=90, fw=12)
+
+    lines = gateway.decode_batch(
+        [
+            Advertisement(10.0, ADDRESS, -70, payload),
+            Advertisement(11.0, "B1:01:01:00:00:05", -70, payload),
+            Advertisement(12.0, ADDRESS, -70, payload[:5]),
+        ]
+    )
+
+    assert len(lines) == 1
+    assert json.loads(lines[0]) == {
+        "time": 10.0,
+        "address": ADDRESS,
+        "id": "0000005",
+        "type": 1,
+        "model": 1,
+        "name": "Счетчик газа СГБ-1.8: 0000005",
+        "meter_reading": 12.3456,
+        "temperature": 21.5,
+        "battery": 90,
+        "rssi": -70,
+        "firmware": 1.2,
+    }
+
+
+def test_decode_batch_dedup() -> None:
+    gateway = Gateway(io.StringIO(), dedup=True)
+    first = build_payload(1, 1, 5, 1000, 2150)
+    second = build_payload(1, 1, 5, 1001, 2150)
+
+    lines = gateway.decode_batch(
+        [
+            Advertisement(float(time), ADDRESS, -70, payload)
+            for time, payload in enumerate((first, first, second, second))
+        ]
+    )
+
+    assert [json.loads(line)["meter_reading"] for line in lines] == [0.1, 0.1001]
+
+
+def test_offer_drops_oldest_when_full() -> None:
+    gateway = Gateway(io.StringIO(), queue_size=2)
+    for time in range(5):
+        gateway.offer(Advertisement(float(time), ADDRESS, -70, b""))
+
+    assert (gateway.received, gateway.dropped) == (5, 3)
+    assert [gateway.queue.get_nowait().time for _ in range(2)] == [3.0, 4.0]
+
+
+def test_capture_to_output(tmp_path, monkeypatch) -> None:
+    path = str(tmp_path / "capture.bin")
+    writer = CaptureWriter(path, 1 << 20, 0)
+    for count in range(250):
+        writer.append(float(count), ADDRESS, -60, "local", build_payload(1, 1, 5, count, 2150))
+    writer.write(writer.take())
+    writer.close()
+
+    output = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", output)
+    args = SimpleNamespace(
+        capture=path, stdin=False, adapter=None, speed=0, queue=100, batch=100, flush_interval=0.01, dedup=False
+    )
+    gateway = asyncio.run(async_main(args))
+
+    assert (gateway.received, gateway.emitted, gateway.dropped) == (250, 250, 0)
+    lines = output.getvalue().splitlines()
+    assert [json.loads(line)["time"] for line in lines] == [float(count) for count in range(250)]
@@ -0,0 +1,141 @@
+"""Тесты бюджета приема пакетов."""
+from __future__ import annotations
+
+from custom_components.elehant_meter.scheduler import IngestScheduler
+
+
+class FakeHandle:
+    def __init__(self, when: float, callback) -> None:
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class FakeLoop:
+    """Цикл событий с управляемыми часами."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.handles: list[FakeHandle] = []
+
+    def time(self) -> float:
+        return self.now
+
+    def call_later(self, delay: float, callback, *args) -> FakeHandle:
+        handle = FakeHandle(self.now + delay, callback)
+        self.handles.append(handle)
+        return handle
+
+    def call_soon(self, callback, *args) -> FakeHandle:
+        return self.call_later(0, callback)
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+        while due := [h for h in self.handles if h.when <= self.now and not h.cancelled]:
+            handle = min(due, key=lambda h: h.when)
+            self.handles.remove(handle)
+            handle.callback()
+
+
+def make_scheduler(rate: float = 1, burst: float = 1, unchanged_interval: float = 10):
+    loop = FakeLoop()
+    delivered: list[str] = []
+    scheduler = IngestScheduler(loop, delivered.append, 0, burst, unchanged_interval)
+    return loop, scheduler, delivered, rate
+
+
+def prime(scheduler: IngestScheduler, addresses, rate: float) -> None:
+    """Первые пакеты счетчиков принимаются без ограничения."""
+    for address in addresses:
+        scheduler.offer(address, b"old", address)
+    scheduler.configure(rate, scheduler.burst, scheduler.unchanged_interval)
+
+
+def test_unlimited_admits_everything():
+    loop, scheduler, delivered, _ = make_scheduler()
+    for index in range(5):
+        scheduler.offer("m", bytes([index]), f"m{index}")
+    assert delivered == [f"m{index}" for index in range(5)]
+    assert scheduler.pending == 0
+
+
+def test_unchanged_frame_sampled_until_interval():
+    loop, scheduler, delivered, _ = make_scheduler()
+    scheduler.offer("m", b"same", "first")
+    loop.advance(5)
+    scheduler.offer("m", b"same", "early")
+    loop.advance(5)
+    scheduler.offer("m", b"same", "due")
+    assert delivered == ["first", "due"]
+    assert scheduler.dropped["sampled"] == 1
+
+
+def test_changed_frame_admitted_ahead_of_unchanged_backlog():
+    loop, scheduler, delivered, rate = make_scheduler()
+    meters = [f"m{index}" for index in range(6)]
+    prime(scheduler, meters, rate)
+    delivered.clear()
+
+    loop.advance(10)
+    # Жетон есть: первый повтор принимается сразу, остальные ждут
+    for address in meters[1:]:
+        scheduler.offer(address, b"old", f"{address}-unchanged")
+    scheduler.offer("m0", b"new", "m0-changed")
+    assert delivered == ["m1-unchanged"]
+    assert scheduler.pending == 5
+
+    loop.advance(1)
+    assert delivered == ["m1-unchanged", "m0-changed"]
+    for _ in range(4):
+        loop.advance(1)
+    assert delivered[2:] == [f"m{index}-unchanged" for index in range(2, 6)]
+
+
+def test_changed_payload_promotes_queued_unchanged_frame():
+    loop, scheduler, delivered, rate = make_scheduler()
+    meters = ["a", "b", "c"]
+    prime(scheduler, meters, rate)
+    delivered.clear()
+
+    loop.advance(10)
+    for address in meters:
+        scheduler.offer(address, b"old", f"{address}-unchanged")
+    assert delivered == ["a-unchanged"]
+
+    # Пакет c изменился, пока повтор c ждал за повтором b
+    scheduler.offer("c", b"new", "c-changed")
+    assert scheduler.superseded == 1
+    loop.advance(1)
+    loop.advance(1)
+    assert delivered == ["a-unchanged", "c-changed", "b-unchanged"]
+
+
+def test_pending_frame_replaced_by_latest():
+    loop, scheduler, delivered, rate = make_scheduler()
+    prime(scheduler, ["a", "b"], rate)
+    delivered.clear()
+
+    scheduler.offer("a", b"1", "a1")
+    scheduler.offer("b", b"1", "b1")
+    scheduler.offer("b", b"2", "b2")
+    loop.advance(1)
+    loop.advance(1)
+    assert delivered == ["a1", "b2"]
+    assert scheduler.superseded == 1
+    assert scheduler.pending == 0
+
+
+def test_forget_drops_queued_frames():
+    loop, scheduler, delivered, rate = make_scheduler()
+    prime(scheduler, ["a", "b"], rate)
+    delivered.clear()
+
+    scheduler.offer("a", b"1", "a1")
+    scheduler.offer("b", b"1", "b1")
+    scheduler.forget("b")
+    for _ in range(5):
+        loop.advance(1)
+    assert delivered == ["a1"]
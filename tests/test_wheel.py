@@ -0,0 +1,105 @@
+"""Тесты колеса таймеров и сроков молчания по типам счетчиков."""
+from __future__ import annotations
+
+from custom_components.elehant_meter.const import (
+    CONF_STALE_TIMEOUT,
+    CONF_STALE_TIMEOUTS,
+    MeterType,
+    stale_timeout_option,
+)
+from custom_components.elehant_meter.wheel import TimerWheel
+
+
+def make_wheel(now: float = 0.0) -> TimerWheel:
+    return TimerWheel(5, 8, now)
+
+
+def test_key_expires_on_first_tick_after_deadline() -> None:
+    wheel = make_wheel()
+    wheel.schedule("a", 12)
+
+    # Срок внутри тика: ключ снимается первым тиком после срока, а не оборотом позже
+    assert wheel.advance(10) == []
+    assert wheel.advance(12) == []
+    assert "a" in wheel
+    assert wheel.advance(15) == ["a"]
+    assert "a" not in wheel
+    assert len(wheel) == 0
+
+
+def test_rearm_moves_deadline_forward() -> None:
+    wheel = make_wheel()
+    wheel.schedule("a", 12)
+    wheel.schedule("a", 30)
+
+    # Старая ячейка пройдена, ключ переносится в ячейку нового срока
+    assert wheel.advance(15) == []
+    assert wheel.advance(25) == []
+    assert wheel.advance(30) == ["a"]
+
+
+def test_rearm_across_many_turns() -> None:
+    wheel = make_wheel()
+    wheel.schedule("a", 10)
+    now = 0
+    # Каждое продление до срока держит ключ в колесе дольше оборота
+    for _ in range(20):
+        now += 5
+        wheel.schedule("a", now + 10)
+        assert wheel.advance(now) == []
+    assert wheel.advance(now + 10) == ["a"]
+
+
+def test_deadline_beyond_one_turn() -> None:
+    wheel = make_wheel()
+    # Оборот колеса - 40 с, срок через два оборота
+    wheel.schedule("a", 95)
+
+    for now in range(5, 95, 5):
+        assert wheel.advance(now) == []
+    assert wheel.advance(95) == ["a"]
+
+
+def test_skip_more_than_one_turn_checks_every_slot() -> None:
+    wheel = make_wheel(100)
+    wheel.schedule("a", 105)
+    wheel.schedule("b", 130)
+    wheel.schedule("c", 500)
+
+    assert sorted(wheel.advance(400)) == ["a", "b"]
+    assert wheel.advance(500) == ["c"]
+
+
+def test_cancel_and_schedule_again() -> None:
+    wheel = make_wheel()
+    wheel.schedule("a", 20)
+    wheel.cancel("a")
+    wheel.cancel("a")
+
+    assert wheel.advance(25) == []
+    wheel.schedule("a", 30)
+    assert wheel.advance(30) == ["a"]
+
+
+def test_past_deadline_expires_on_next_tick() -> None:
+    wheel = make_wheel(50)
+    wheel.schedule("a", 10)
+
+    assert wheel.advance(55) == ["a"]
+
+
+def test_stale_timeout_option_per_type() -> None:
+    options = {CONF_STALE_TIMEOUTS[MeterType.WATER]: 15}
+
+    assert stale_timeout_option(options, MeterType.WATER) == 15
+    assert stale_timeout_option(options, MeterType.GAS) == 60
+    assert stale_timeout_option(options, MeterType.HEAT) == 180
+    assert stale_timeout_option({CONF_STALE_TIMEOUTS[MeterType.GAS]: 0}, MeterType.GAS) == 0
+
+
+def test_stale_timeout_option_legacy_value() -> None:
+    # Общий срок записей прежних версий уступает сроку типа
+    options = {CONF_STALE_TIMEOUT: 30, CONF_STALE_TIMEOUTS[MeterType.HEAT]: 240}
+
+    assert stale_timeout_option(options, MeterType.GAS) == 30
+    assert stale_timeout_option(options, MeterType.HEAT) == 240